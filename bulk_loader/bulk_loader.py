@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Parallel bulk seed loader for the tinyinsta schemas (yuga, cockroach, tidb)
+
+Generates the same deterministic dataset as the init scripts (users 1..N, posts with
+id = author*1000 + seq, each user following the next K users in a ring) but at scale:
+- rows are produced in fixed-size chunks, so memory stays flat for tens of millions of rows,
+- chunks run in a process pool; each worker keeps one connection open for the whole load
+  (the pool of connections is one per worker) and writes with COPY or multi-row INSERTs,
+- chunks are dispatched interleaved across the key space (one stripe per worker), so
+  concurrent writers never pile onto the last range of a monotonically increasing key,
+- optional pre-split: SPLIT AT statements at the stripe boundaries before loading,
+- reports rows/s per table.
+Chunk contents only depend on the parameters (never on scheduling), so any --workers value
+loads identical data; `--sink memory` prints a checksum to verify it (for a given --chunk-rows).
+
+Requires psycopg2 (yuga, cockroach) or pymysql (tidb) for real clusters; the sqlite and
+memory sinks use only the standard library.
+
+Usage examples:
+  python3 bulk_loader.py --target cockroach --users 1000000 --posts-per-user 10 --workers 8 --presplit 16
+  python3 bulk_loader.py --target yuga --users 100000 --method insert
+  python3 bulk_loader.py --target tidb --sink sqlite --dsn /tmp/tinyinsta.db --users 50000
+  python3 bulk_loader.py --sink memory --users 2000000 --workers 4
+
+"""
+import argparse
+import csv
+import datetime
+import io
+import random
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import psycopg2
+    from psycopg2.extras import execute_values
+except ImportError:  # only needed for the postgres sink (yuga, cockroach)
+    psycopg2 = None
+
+try:
+    import pymysql
+except ImportError:  # only needed for the mysql sink (tidb)
+    pymysql = None
+
+
+POST_ID_STRIDE = 1000  # post id = author * 1000 + seq, as in the init scripts
+BASE_TIME = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+# created_at = BASE_TIME - (id % 50) minutes, as in the init scripts; preformatted once since
+# every engine (COPY text, INSERT literals, sqlite) accepts the ISO string
+CREATED_AT = [(BASE_TIME - datetime.timedelta(minutes=m)).isoformat(sep=" ") for m in range(50)]
+
+# ---------------------------------------------------------------------------
+# Schemas: logical entities (user, post, follow) mapped onto each engine's tables
+# ---------------------------------------------------------------------------
+
+USER_FIELDS = ("id", "username", "password", "full_name")
+POST_FIELDS = ("id", "user_id", "image_path", "description", "caption", "created_at")
+FOLLOW_FIELDS = ("follower_id", "followee_id")
+
+
+class TableSpec(NamedTuple):
+    entity: str  # users | posts | follows
+    name: str
+    columns: Tuple[str, ...]
+    fields: Tuple[str, ...]  # logical field feeding each column
+    primary_key: Tuple[str, ...]
+    split_column: Optional[str]  # leading key column usable in SPLIT statements (None: not splittable)
+
+
+class Schema(NamedTuple):
+    tables: Dict[str, TableSpec]  # by entity, in load order
+    cleanup: Tuple[str, ...]  # tables to empty with --truncate, FK-safe order
+    split_style: Optional[str]  # "cockroach" | "tidb" | None (hash-sharded, nothing to pre-split)
+
+
+SCHEMAS: Dict[str, Schema] = {
+    "yuga": Schema({
+        "users": TableSpec("users", "users", ("id", "username", "password"), ("id", "username", "password"), ("id",), "id"),
+        "posts": TableSpec("posts", "post", ("id", "user_id", "image_path", "description", "created_at"),
+                           ("id", "user_id", "image_path", "description", "created_at"), ("id",), "id"),
+        "follows": TableSpec("follows", "follower_followee", ("follower_id", "followee_id"), FOLLOW_FIELDS,
+                             ("follower_id", "followee_id"), "follower_id"),
+    }, ("follower_followee", "post", "users"), None),
+    "cockroach": Schema({
+        "users": TableSpec("users", "users", ("id", "username", "full_name"), ("id", "username", "full_name"), ("id",), "id"),
+        "posts": TableSpec("posts", "posts", ("id", "author_id", "caption", "created_at"),
+                           ("id", "user_id", "caption", "created_at"), ("id",), "id"),
+        "follows": TableSpec("follows", "follows", ("follower_id", "followee_id"), FOLLOW_FIELDS,
+                             ("follower_id", "followee_id"), "follower_id"),
+    }, ("likes", "follows", "posts", "users"), "cockroach"),
+    "tidb": Schema({
+        "users": TableSpec("users", "users", ("id", "username"), ("id", "username"), ("id",), "id"),
+        "posts": TableSpec("posts", "post", ("id", "user_id", "description", "image_path", "created_at"),
+                           ("id", "user_id", "description", "image_path", "created_at"), ("id",), "id"),
+        # composite PK is non-clustered in TiDB (rows keyed by _tidb_rowid): no key-based split
+        "follows": TableSpec("follows", "follower_followee", ("follower_id", "followee_id"), FOLLOW_FIELDS,
+                             ("follower_id", "followee_id"), None),
+    }, ("follower_followee", "post", "users"), "tidb"),
+}
+
+# ---------------------------------------------------------------------------
+# Deterministic row generation
+# ---------------------------------------------------------------------------
+
+
+class Params(NamedTuple):
+    users: int
+    posts_per_user: int
+    follows_per_user: int
+    follow_mode: str  # ring | random
+    seed: int
+
+
+def user_rows(lo: int, hi: int, p: Params) -> Iterator[Tuple]:
+    for i in range(lo, hi):
+        yield (i, f"user_{i}", "pwd", f"User {i}")
+
+
+def post_rows(lo: int, hi: int, p: Params) -> Iterator[Tuple]:
+    for a in range(lo, hi):
+        for s in range(1, p.posts_per_user + 1):
+            pid = a * POST_ID_STRIDE + s
+            yield (pid, a, f"/img/{pid}.jpg", f"desc {pid}", f"Post #{pid} by user {a}", CREATED_AT[pid % 50])
+
+
+def follow_rows(lo: int, hi: int, p: Params) -> Iterator[Tuple]:
+    u, k = p.users, min(p.follows_per_user, p.users - 1)
+    if p.follow_mode == "ring":
+        for i in range(lo, hi):
+            for s in range(1, k + 1):
+                yield (i, (i + s - 1) % u + 1)
+        return
+    rng = random.Random(p.seed * 1_000_003 + lo)  # per-chunk stream: independent of scheduling
+    for i in range(lo, hi):
+        picks = [j for j in rng.sample(range(1, u + 1), k + 1) if j != i][:k]
+        yield from ((i, j) for j in sorted(picks))
+
+
+GENERATORS: Dict[str, Tuple[Callable[[int, int, Params], Iterator[Tuple]], Tuple[str, ...]]] = {
+    "users": (user_rows, USER_FIELDS),
+    "posts": (post_rows, POST_FIELDS),
+    "follows": (follow_rows, FOLLOW_FIELDS),
+}
+
+
+def rows_per_driver(entity: str, p: Params) -> int:
+    """Rows produced per driving user id (the unit chunks are cut on)."""
+    return {"users": 1, "posts": p.posts_per_user, "follows": min(p.follows_per_user, p.users - 1)}[entity]
+
+
+def split_key(entity: str, driver_id: int) -> int:
+    """Value of the table's leading key column at the first row of driver_id."""
+    return driver_id * POST_ID_STRIDE if entity == "posts" else driver_id
+
+
+def project(table: TableSpec, rows: Iterator[Tuple]) -> List[Tuple]:
+    idx = [GENERATORS[table.entity][1].index(f) for f in table.fields]
+    return [tuple(row[i] for i in idx) for row in rows]
+
+
+# ---------------------------------------------------------------------------
+# Chunk planning (interleaved dispatch across the key space)
+# ---------------------------------------------------------------------------
+
+def plan_chunks(n_users: int, per_chunk: int) -> List[Tuple[int, int]]:
+    """[lo, hi) ranges of driving user ids covering 1..n_users."""
+    return [(lo, min(lo + per_chunk, n_users + 1)) for lo in range(1, n_users + 1, per_chunk)]
+
+
+def interleave(chunks: List[Tuple[int, int]], stripes: int) -> List[Tuple[int, int]]:
+    """Reorder chunks so consecutive ones come from `stripes` distant parts of the key space:
+    with one stripe per worker, the chunks in flight at any time write to different ranges.
+    """
+    if stripes <= 1 or len(chunks) <= 1:
+        return list(chunks)
+    size = -(-len(chunks) // stripes)
+    parts = [chunks[i:i + size] for i in range(0, len(chunks), size)]
+    return [part[j] for j in range(size) for part in parts if j < len(part)]
+
+
+def split_points(n_users: int, ranges: int) -> List[int]:
+    """Driving user ids at which to cut 1..n_users into `ranges` even ranges."""
+    return sorted({1 + (n_users * r) // ranges for r in range(1, ranges)} - {1})
+
+
+def presplit_statements(schema: Schema, entity: str, n_users: int, ranges: int) -> List[str]:
+    table = schema.tables[entity]
+    if ranges <= 1 or table.split_column is None or schema.split_style is None:
+        return []
+    points = [split_key(entity, b) for b in split_points(n_users, ranges)]
+    if schema.split_style == "cockroach":  # same statements as cockroach/init/init.sh
+        return [f"ALTER TABLE {table.name} SPLIT AT VALUES ({v});" for v in points] + [f"ALTER TABLE {table.name} SCATTER;"]
+    lo, hi = split_key(entity, 1), split_key(entity, n_users + 1)
+    return [f"SPLIT TABLE {table.name} BETWEEN ({lo}) AND ({hi}) REGIONS {ranges};"]
+
+
+# ---------------------------------------------------------------------------
+# Sinks: one instance (one connection) per worker process
+# ---------------------------------------------------------------------------
+
+class SinkSpec(NamedTuple):
+    kind: str  # postgres | mysql | sqlite | memory
+    dsn: str
+    method: str  # copy | insert
+    batch_rows: int
+
+
+class MemorySink:
+    """Discards rows; keeps counts and an order-independent checksum of the CSV encoding."""
+    supports_sql = False
+
+    def __init__(self, spec: SinkSpec):
+        self.spec = spec
+
+    def write(self, table: TableSpec, rows: List[Tuple]) -> Tuple[int, int]:
+        data = to_csv(rows).encode()
+        return len(data), zlib.crc32(data)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteSink:
+    """Local stand-in backend: same tables, INSERT OR IGNORE in one transaction per chunk."""
+    supports_sql = False
+
+    def __init__(self, spec: SinkSpec):
+        self.spec = spec
+        self.conn = sqlite3.connect(spec.dsn, timeout=120.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+
+    def create(self, schema: Schema) -> None:
+        with self.conn:
+            for t in schema.tables.values():
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {t.name} ({', '.join(t.columns)}, "
+                                  f"PRIMARY KEY ({', '.join(t.primary_key)}))")
+
+    def write(self, table: TableSpec, rows: List[Tuple]) -> Tuple[int, int]:
+        sql = f"INSERT OR IGNORE INTO {table.name} ({', '.join(table.columns)}) VALUES ({', '.join('?' * len(table.columns))})"
+        with self.conn:
+            for i in range(0, len(rows), self.spec.batch_rows):
+                self.conn.executemany(sql, rows[i:i + self.spec.batch_rows])
+        return 0, 0
+
+    def execute(self, sql: str) -> None:
+        with self.conn:
+            self.conn.execute(sql)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class PostgresSink:
+    """YSQL / CockroachDB over psycopg2: COPY ... FROM STDIN (CSV) or multi-row INSERT ... ON CONFLICT DO NOTHING."""
+    supports_sql = True
+
+    def __init__(self, spec: SinkSpec):
+        if psycopg2 is None:
+            raise SystemExit("psycopg2 is not installed (pip install psycopg2-binary), or use --sink sqlite/memory")
+        self.spec = spec
+        self.conn = psycopg2.connect(spec.dsn)
+
+    def write(self, table: TableSpec, rows: List[Tuple]) -> Tuple[int, int]:
+        cols = ", ".join(table.columns)
+        with self.conn.cursor() as cur:
+            for i in range(0, len(rows), self.spec.batch_rows):
+                batch = rows[i:i + self.spec.batch_rows]
+                if self.spec.method == "copy":
+                    cur.copy_expert(f"COPY {table.name} ({cols}) FROM STDIN WITH CSV", io.StringIO(to_csv(batch)))
+                else:
+                    execute_values(cur, f"INSERT INTO {table.name} ({cols}) VALUES %s ON CONFLICT DO NOTHING",
+                                   batch, page_size=len(batch))
+        self.conn.commit()
+        return 0, 0
+
+    def execute(self, sql: str) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+        self.conn.commit()
+
+    def has_rows(self, name: str) -> bool:
+        with self.conn.cursor() as cur:
+            cur.execute(f"SELECT 1 FROM {name} LIMIT 1")
+            found = cur.fetchone() is not None
+        self.conn.commit()
+        return found
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class MySQLSink:
+    """TiDB over pymysql: executemany of INSERT IGNORE is sent as multi-row INSERT statements."""
+    supports_sql = True
+
+    def __init__(self, spec: SinkSpec):
+        if pymysql is None:
+            raise SystemExit("pymysql is not installed (pip install pymysql), or use --sink sqlite/memory")
+        self.spec = spec
+        self.conn = pymysql.connect(**mysql_kwargs(spec.dsn))
+
+    def write(self, table: TableSpec, rows: List[Tuple]) -> Tuple[int, int]:
+        sql = f"INSERT IGNORE INTO {table.name} ({', '.join(table.columns)}) VALUES ({', '.join(['%s'] * len(table.columns))})"
+        with self.conn.cursor() as cur:
+            for i in range(0, len(rows), self.spec.batch_rows):
+                cur.executemany(sql, rows[i:i + self.spec.batch_rows])
+        self.conn.commit()
+        return 0, 0
+
+    def execute(self, sql: str) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+SINKS = {"memory": MemorySink, "sqlite": SQLiteSink, "postgres": PostgresSink, "mysql": MySQLSink}
+
+DEFAULT_DSN = {
+    ("yuga", "postgres"): "host=localhost port=5433 user=yugabyte dbname=tinyinsta",
+    ("cockroach", "postgres"): "postgresql://root@localhost:26257/tinyinsta?sslmode=disable",
+    ("tidb", "mysql"): "root@127.0.0.1:4000/tinyinsta",
+}
+
+
+def mysql_kwargs(dsn: str) -> Dict[str, object]:
+    """user[:password]@host[:port]/database -> pymysql.connect keyword arguments."""
+    creds, _, rest = dsn.rpartition("@")
+    hostport, _, db = rest.partition("/")
+    host, _, port = hostport.partition(":")
+    user, _, password = creds.partition(":")
+    return {"host": host, "port": int(port or 3306), "user": user or "root", "password": password, "database": db}
+
+
+def to_csv(rows: Sequence[Tuple]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+
+def resolve_method(spec: SinkSpec, admin, tables: Sequence[TableSpec]) -> Tuple[SinkSpec, List[str]]:
+    """COPY has no conflict handling: if a table already has rows (e.g. the docker-compose seed),
+    load with INSERT ... ON CONFLICT DO NOTHING instead. Returns the spec to use and those tables.
+    """
+    if spec.kind != "postgres" or spec.method != "copy":
+        return spec, []
+    loaded = [t.name for t in tables if admin.has_rows(t.name)]
+    return (spec._replace(method="insert") if loaded else spec), loaded
+
+
+_SINK = None  # per worker process
+
+
+def _init_worker(spec: SinkSpec) -> None:
+    global _SINK
+    _SINK = SINKS[spec.kind](spec)
+
+
+def _load_chunk(task: Tuple) -> Tuple[int, int, int]:
+    """Worker: generate one chunk and write it; returns (rows, csv bytes, crc32)."""
+    table, lo, hi, params = task
+    rows = project(table, GENERATORS[table.entity][0](lo, hi, params))
+    nbytes, crc = _SINK.write(table, rows)
+    return len(rows), nbytes, crc
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+class TableReport(NamedTuple):
+    table: str
+    rows: int
+    seconds: float
+    checksum: int  # sum of per-chunk crc32 (memory sink): identical for any --workers at the same --chunk-rows
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+
+def load_table(table: TableSpec, params: Params, spec: SinkSpec, workers: int, chunk_rows: int,
+               order: str = "interleaved") -> TableReport:
+    per_chunk = max(1, chunk_rows // max(1, rows_per_driver(table.entity, params)))
+    chunks = plan_chunks(params.users, per_chunk)
+    if order == "interleaved":
+        chunks = interleave(chunks, workers)
+    tasks = [(table, lo, hi, params) for lo, hi in chunks]
+    t0 = time.perf_counter()
+    if workers <= 1 or len(tasks) <= 1:
+        _init_worker(spec)
+        try:
+            results = [_load_chunk(t) for t in tasks]
+        finally:
+            _SINK.close()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec,)) as ex:
+            results = list(ex.map(_load_chunk, tasks))
+    seconds = time.perf_counter() - t0
+    return TableReport(table.name, sum(r[0] for r in results), seconds, sum(r[2] for r in results) & 0xFFFFFFFF)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parallel deterministic bulk loader for the tinyinsta schemas")
+    ap.add_argument("--target", choices=sorted(SCHEMAS), default="cockroach", help="Schema (and default sink) to load")
+    ap.add_argument("--sink", choices=["auto"] + sorted(SINKS), default="auto",
+                    help="auto = postgres for yuga/cockroach, mysql for tidb")
+    ap.add_argument("--dsn", type=str, default="", help="Connection string (sqlite: database file path)")
+    ap.add_argument("--method", choices=["copy", "insert"], default="copy",
+                    help="postgres sink: COPY or multi-row INSERT; COPY switches to INSERT if a table already has rows")
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--posts-per-user", type=int, default=10)
+    ap.add_argument("--follows-per-user", type=int, default=20)
+    ap.add_argument("--follow-mode", choices=["ring", "random"], default="ring",
+                    help="ring = follow the next K users (as init.sh), random = K seeded random users")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--tables", type=str, default="users,posts,follows", help="Entities to load, in this order")
+    ap.add_argument("--workers", type=int, default=4, help="Worker processes (one connection each)")
+    ap.add_argument("--chunk-rows", type=int, default=50_000, help="Rows generated per chunk")
+    ap.add_argument("--batch-rows", type=int, default=5_000, help="Rows per COPY / INSERT round trip")
+    ap.add_argument("--order", choices=["interleaved", "sequential"], default="interleaved",
+                    help="Chunk dispatch order: interleaved spreads concurrent writers across the key space")
+    ap.add_argument("--presplit", type=int, default=0, help="Pre-split each table into N ranges at the stripe boundaries")
+    ap.add_argument("--print-splits", action="store_true", help="Only print the pre-split statements")
+    ap.add_argument("--truncate", action="store_true", help="Delete existing rows first (FK-safe order)")
+    args = ap.parse_args()
+
+    if not 0 <= args.posts_per_user < POST_ID_STRIDE:
+        raise SystemExit(f"--posts-per-user must be below {POST_ID_STRIDE} (post id = author*{POST_ID_STRIDE} + seq)")
+    schema = SCHEMAS[args.target]
+    entities = [e.strip() for e in args.tables.split(",") if e.strip()]
+    unknown = [e for e in entities if e not in schema.tables]
+    if unknown:
+        raise SystemExit(f"unknown table(s): {', '.join(unknown)} (choose from {', '.join(schema.tables)})")
+    kind = args.sink if args.sink != "auto" else ("mysql" if args.target == "tidb" else "postgres")
+    dsn = args.dsn or DEFAULT_DSN.get((args.target, kind), "tinyinsta.db" if kind == "sqlite" else "")
+    spec = SinkSpec(kind, dsn, args.method, args.batch_rows)
+    params = Params(args.users, args.posts_per_user, args.follows_per_user, args.follow_mode, args.seed)
+
+    splits = [s for e in entities for s in presplit_statements(schema, e, args.users, args.presplit)]
+    if args.print_splits:
+        print("\n".join(splits) if splits else f"-- nothing to pre-split for {args.target}")
+        return
+
+    admin = SINKS[kind](spec)
+    if isinstance(admin, SQLiteSink):
+        admin.create(schema)
+    if args.truncate:
+        if isinstance(admin, MemorySink):
+            raise SystemExit("--truncate needs a database sink")
+        # the sqlite stand-in only has the loaded tables (no likes)
+        names = schema.cleanup if admin.supports_sql else [t.name for t in reversed(schema.tables.values())]
+        for name in names:
+            admin.execute(f"DELETE FROM {name}")
+    if splits:
+        if admin.supports_sql:
+            print(f"Pre-splitting ({len(splits)} statements)...")
+            for sql in splits:
+                admin.execute(sql)
+        else:
+            print(f"[{kind} sink] pre-split not applicable; would run {len(splits)} statements (see --print-splits)")
+    spec, loaded = resolve_method(spec, admin, [schema.tables[e] for e in entities])
+    if loaded:
+        print(f"[copy] {', '.join(loaded)} already have rows and COPY fails on duplicate keys: "
+              f"loading with INSERT ... ON CONFLICT DO NOTHING (--truncate to COPY into empty tables)")
+    admin.close()
+
+    print(f"Loading {args.target} schema into {kind} sink: users={args.users:,} posts/user={args.posts_per_user} "
+          f"follows/user={args.follows_per_user} ({args.follow_mode}), workers={args.workers}, order={args.order}")
+    reports = []
+    for entity in entities:
+        rep = load_table(schema.tables[entity], params, spec, args.workers, args.chunk_rows, args.order)
+        reports.append(rep)
+        extra = f"  crc={rep.checksum:08x}" if kind == "memory" else ""
+        print(f"  {rep.table:<18} {rep.rows:>12,} rows in {rep.seconds:8.2f}s  {rep.rows_per_s:>12,.0f} rows/s{extra}", flush=True)
+    total_rows, total_s = sum(r.rows for r in reports), sum(r.seconds for r in reports)
+    print(f"  {'total':<18} {total_rows:>12,} rows in {total_s:8.2f}s  {total_rows / total_s if total_s else 0:>12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Bulk loader against the memory and SQLite sinks (no cluster, no database driver).
+
+  python -m pytest -q bulk_loader
+"""
+import sqlite3
+import sys
+
+import pytest
+
+import bulk_loader as bl
+
+PARAMS = bl.Params(users=300, posts_per_user=3, follows_per_user=4, follow_mode="random", seed=5)
+
+
+def load(schema, spec, workers=1, chunk_rows=200, order="interleaved"):
+    return {e: bl.load_table(t, PARAMS, spec, workers, chunk_rows, order) for e, t in schema.tables.items()}
+
+
+def test_memory_checksum_independent_of_workers_and_order():
+    spec = bl.SinkSpec("memory", "", "copy", 50)
+    serial = load(bl.SCHEMAS["cockroach"], spec)
+    for workers, order in ((2, "interleaved"), (1, "sequential")):
+        reports = load(bl.SCHEMAS["cockroach"], spec, workers, order=order)
+        assert [(r.rows, r.checksum) for r in reports.values()] == [(r.rows, r.checksum) for r in serial.values()]
+    assert [r.rows for r in serial.values()] == [300, 900, 1200]
+
+
+def test_sqlite_sink_loads_the_dataset_once(tmp_path):
+    spec = bl.SinkSpec("sqlite", str(tmp_path / "t.db"), "copy", 64)
+    schema = bl.SCHEMAS["yuga"]
+    admin = bl.SQLiteSink(spec)
+    admin.create(schema)
+    admin.close()
+    for _ in range(2):  # the second load hits every key again: INSERT OR IGNORE keeps one copy
+        load(schema, spec)
+    conn = sqlite3.connect(spec.dsn)
+    counts = {t: conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0] for t in ("users", "post", "follower_followee")}
+    assert counts == {"users": 300, "post": 900, "follower_followee": 1200}
+    assert conn.execute("SELECT user_id, image_path FROM post WHERE id = 42003").fetchone() == (42, "/img/42003.jpg")
+    assert conn.execute("SELECT count(*) FROM follower_followee WHERE follower_id = followee_id").fetchone()[0] == 0
+    conn.close()
+
+
+class Tables:
+    def __init__(self, loaded):
+        self.loaded = loaded
+
+    def has_rows(self, name):
+        return name in self.loaded
+
+
+def test_copy_switches_to_insert_when_tables_have_rows():
+    tables = list(bl.SCHEMAS["yuga"].tables.values())
+    copy = bl.SinkSpec("postgres", "", "copy", 10)
+    assert bl.resolve_method(copy, Tables(set()), tables) == (copy, [])
+    spec, loaded = bl.resolve_method(copy, Tables({"post"}), tables)
+    assert spec.method == "insert" and loaded == ["post"]
+    mysql = copy._replace(kind="mysql")
+    assert bl.resolve_method(mysql, Tables({"post"}), tables) == (mysql, [])
+
+
+def test_truncate_needs_a_database_sink(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["bulk_loader.py", "--sink", "memory", "--truncate", "--users", "10"])
+    with pytest.raises(SystemExit, match="--truncate"):
+        bl.main()
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Timeline / follower / likes query load driver for the tinyinsta schemas (yuga, cockroach, tidb)
+
+Runs the read-path queries of the repo (timeline as in query_example.sql, followers of a
+user, likes of a post) under the same closed-loop load on each engine:
+- `--concurrency` worker threads share a pool of `--pool-size` connections,
+- each operation picks a query from `--mix` (weights) with random user / post parameters,
+- latencies go into log-linear (HdrHistogram-style) histograms, one per worker and query,
+  merged at the end: throughput, p50/p95/p99/p999 and max per query.
+Backends are pluggable: psycopg2 (yuga, cockroach), pymysql (tidb) or an in-process fake
+engine with a latency model and a bounded number of server slots, for offline runs.
+
+Usage examples:
+  python3 load_driver.py --engine fake --duration 5 --concurrency 32
+  python3 load_driver.py --engine yuga,cockroach,tidb --duration 30 --concurrency 16 --mix timeline=80,followers=15,likes=5
+  python3 load_driver.py --engine cockroach --ops 20000 --pool-size 4 --concurrency 32 --hdr
+
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import psycopg2
+except ImportError:  # only needed for yuga / cockroach
+    psycopg2 = None
+
+try:
+    import pymysql
+except ImportError:  # only needed for tidb
+    pymysql = None
+
+
+POST_ID_STRIDE = 1000  # post id = author * 1000 + seq (seed scripts and bulk_loader)
+
+# ---------------------------------------------------------------------------
+# Queries per engine schema (None: not available in that schema)
+# ---------------------------------------------------------------------------
+
+YSQL_TIMELINE = """
+    SELECT p.* FROM post p
+    WHERE p.user_id = %(user)s
+       OR p.user_id IN (SELECT followee_id FROM follower_followee WHERE follower_id = %(user)s)
+    ORDER BY p.created_at DESC LIMIT 50
+"""
+
+QUERIES: Dict[str, Dict[str, Optional[str]]] = {
+    "yuga": {
+        "timeline": YSQL_TIMELINE,
+        "followers": "SELECT follower_id FROM follower_followee WHERE followee_id = %(user)s LIMIT 100",
+        "likes": None,
+    },
+    "cockroach": {
+        "timeline": """
+            SELECT p.* FROM posts p JOIN follows f ON f.followee_id = p.author_id
+            WHERE f.follower_id = %(user)s ORDER BY p.created_at DESC LIMIT 50
+        """,
+        "followers": "SELECT follower_id FROM follows WHERE followee_id = %(user)s LIMIT 100",
+        "likes": "SELECT count(*) FROM likes WHERE post_id = %(post)s",
+    },
+    "tidb": {
+        "timeline": YSQL_TIMELINE,
+        "followers": "SELECT follower_id FROM follower_followee WHERE followee_id = %(user)s LIMIT 100",
+        "likes": None,
+    },
+}
+QUERIES["fake"] = QUERIES["cockroach"]
+
+DEFAULT_DSN = {
+    "yuga": "host=localhost port=5433 user=yugabyte dbname=tinyinsta",
+    "cockroach": "postgresql://root@localhost:26257/tinyinsta?sslmode=disable",
+    "tidb": "root@127.0.0.1:4000/tinyinsta",
+}
+
+
+def query_params(rng: random.Random, users: int, posts_per_user: int) -> Dict[str, int]:
+    user = rng.randint(1, users)
+    return {"user": user, "post": rng.randint(1, users) * POST_ID_STRIDE + rng.randint(1, max(1, posts_per_user))}
+
+
+# ---------------------------------------------------------------------------
+# HdrHistogram-style latency recording
+# ---------------------------------------------------------------------------
+
+class LatencyHistogram:
+    """Log-linear histogram of integer microseconds (HdrHistogram layout).
+
+    Values below 2^sub_bits are counted exactly; above, each power-of-two range is cut into
+    2^(sub_bits-1) equal buckets, so any recorded value is known within 2^(1-sub_bits)
+    (0.8% with the default 8 bits) whatever its magnitude, in a few KB of counters.
+    """
+
+    def __init__(self, sub_bits: int = 8):
+        self.sub_bits = sub_bits
+        self.sub_count = 1 << sub_bits
+        self.half = self.sub_count >> 1
+        self.counts: List[int] = [0] * (self.sub_count + 24 * self.half)  # up to ~1 hour before growing
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def index(self, value: int) -> int:
+        if value < self.sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half + (value >> shift) - self.half
+
+    def value_at(self, idx: int) -> int:
+        """Highest value that lands in bucket idx."""
+        if idx < self.sub_count:
+            return idx
+        shift, m = divmod(idx - self.sub_count, self.half)
+        shift += 1
+        return ((m + self.half) << shift) + (1 << shift) - 1
+
+    def record(self, value_us: int) -> None:
+        value_us = max(0, int(value_us))
+        idx = self.index(value_us)
+        if idx >= len(self.counts):
+            self.counts.extend([0] * (idx + 1 - len(self.counts)))
+        self.counts[idx] += 1
+        self.total += 1
+        self.sum += value_us
+        self.max = max(self.max, value_us)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile_index(self, q: float) -> Tuple[int, int]:
+        """(bucket holding the q-th percentile, count of values in buckets up to it)."""
+        target = max(1, math.ceil(q / 100.0 * self.total))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return idx, seen
+        return len(self.counts) - 1, self.total
+
+    def percentile(self, q: float) -> int:
+        if self.total == 0:
+            return 0
+        return min(self.value_at(self.percentile_index(q)[0]), self.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def distribution(self, ticks_per_half: int = 5) -> Iterator[Tuple[int, float, int]]:
+        """(value, percentile, count at or below) at HdrHistogram's percentile ticks: the step
+        halves each time the distance to 100% halves (0, 10, ..., 50, 55, ..., 75, 77.5, ...).
+        """
+        q = 0.0
+        while self.total:
+            idx, below = self.percentile_index(q)
+            yield min(self.value_at(idx), self.max), q, below
+            if below >= self.total:
+                return
+            level = int(math.log2(100.0 / (100.0 - q)))
+            q += 100.0 / (ticks_per_half * 2 ** (level + 1))
+
+
+# ---------------------------------------------------------------------------
+# Backends and connection pool
+# ---------------------------------------------------------------------------
+
+class PostgresBackend:
+    """YSQL / CockroachDB over psycopg2 (autocommit, one statement per operation)."""
+
+    def __init__(self, dsn: str):
+        if psycopg2 is None:
+            raise SystemExit("psycopg2 is not installed (pip install psycopg2-binary), or use --engine fake")
+        self.dsn = dsn
+
+    def connect(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    @staticmethod
+    def execute(conn, sql: str, params: Dict[str, int]) -> int:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return len(cur.fetchall())
+
+
+class MySQLBackend:
+    """TiDB over pymysql (autocommit)."""
+
+    def __init__(self, dsn: str):
+        if pymysql is None:
+            raise SystemExit("pymysql is not installed (pip install pymysql), or use --engine fake")
+        creds, _, rest = dsn.rpartition("@")
+        hostport, _, db = rest.partition("/")
+        host, _, port = hostport.partition(":")
+        user, _, password = creds.partition(":")
+        self.kwargs = {"host": host, "port": int(port or 3306), "user": user or "root", "password": password,
+                       "database": db, "autocommit": True}
+
+    def connect(self):
+        return pymysql.connect(**self.kwargs)
+
+    @staticmethod
+    def execute(conn, sql: str, params: Dict[str, int]) -> int:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return len(cur.fetchall())
+
+
+class FifoSlots:
+    """Counting semaphore that hands a released slot to the oldest waiter (threading.Semaphore lets
+    the releasing thread barge back in, which starves waiters for seconds under a closed loop).
+    """
+
+    def __init__(self, n: int):
+        self.free = n
+        self.waiters: "deque[threading.Event]" = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            if self.free > 0:
+                self.free -= 1
+                return
+            ready = threading.Event()
+            self.waiters.append(ready)
+        ready.wait()
+
+    def release(self) -> None:
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().set()
+            else:
+                self.free += 1
+
+    def __enter__(self) -> "FifoSlots":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class FakeEngine:
+    """In-process engine: each query takes a lognormal service time around its mean and holds one of
+    `slots` server slots while running, so throughput saturates and latency queues like a real server.
+    A fraction `tail_rate` of queries is `tail_factor` times slower (GC pause, leader move, ...).
+    """
+
+    MEAN_MS = {"timeline": 4.0, "followers": 1.0, "likes": 2.0}
+
+    def __init__(self, slots: int = 16, scale: float = 1.0, sigma: float = 0.5, tail_rate: float = 0.001,
+                 tail_factor: float = 20.0, seed: Optional[int] = None):
+        self.slots = FifoSlots(slots)
+        self.scale = scale
+        self.sigma = sigma
+        self.tail_rate = tail_rate
+        self.tail_factor = tail_factor
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.names = {sql: name for name, sql in QUERIES["fake"].items() if sql}
+
+    def connect(self):
+        return self
+
+    def service_time(self, name: str) -> float:
+        mean = self.MEAN_MS.get(name, 1.0) * self.scale / 1000.0
+        with self.rng_lock:
+            t = mean * self.rng.lognormvariate(-self.sigma ** 2 / 2, self.sigma)  # E[t] = mean
+            if self.rng.random() < self.tail_rate:
+                t *= self.tail_factor
+        return t
+
+    def execute(self, conn, sql: str, params: Dict[str, int]) -> int:
+        with self.slots:
+            time.sleep(self.service_time(self.names.get(sql, "")))
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+def backend_for(engine: str, dsn: str, args) -> Any:
+    if engine == "fake":
+        return FakeEngine(args.fake_slots, args.fake_scale, seed=args.seed)
+    if engine == "tidb":
+        return MySQLBackend(dsn or DEFAULT_DSN[engine])
+    return PostgresBackend(dsn or DEFAULT_DSN[engine])
+
+
+class ConnectionPool:
+    """Fixed set of connections opened up front; borrowing blocks while all are in use, and
+    waiting workers are served in arrival order.
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int):
+        self.all = [connect() for _ in range(size)]
+        self.idle = deque(self.all)
+        self.slots = FifoSlots(size)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        with self.slots:
+            conn = self.idle.popleft()  # a slot guarantees an idle connection
+            try:
+                yield conn
+            finally:
+                self.idle.append(conn)
+
+    def close(self) -> None:
+        for conn in self.all:
+            conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+class QueryStats(NamedTuple):
+    name: str
+    ops: int
+    errors: int
+    ops_per_s: float
+    mean_us: float
+    p50_us: int
+    p95_us: int
+    p99_us: int
+    p999_us: int
+    max_us: int
+
+
+class RunReport(NamedTuple):
+    engine: str
+    seconds: float
+    concurrency: int
+    pool_size: int
+    queries: List[QueryStats]
+    total: QueryStats
+    histograms: Dict[str, LatencyHistogram]
+    first_errors: Dict[str, str]  # query -> first exception raised by it ("Type: message")
+
+
+def parse_mix(text: str, available: Dict[str, Optional[str]]) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in available:
+            raise SystemExit(f"unknown query {name!r} in --mix (choose from {', '.join(available)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def stats_of(name: str, hist: LatencyHistogram, errors: int, seconds: float) -> QueryStats:
+    return QueryStats(name, hist.total, errors, hist.total / seconds if seconds > 0 else 0.0, hist.mean,
+                      hist.percentile(50), hist.percentile(95), hist.percentile(99), hist.percentile(99.9), hist.max)
+
+
+def run_load(engine: str, backend, mix: Dict[str, float], concurrency: int, pool_size: int, duration: float,
+             ops: int, warmup: float, users: int, posts_per_user: int, seed: int) -> RunReport:
+    """Closed loop: each worker issues its next operation as soon as the previous one returns.
+    Latency is measured from before borrowing a connection, so pool waits are included.
+    """
+    sqls = QUERIES[engine]
+    names = [n for n in mix if sqls.get(n) and mix[n] > 0]
+    if not names:
+        raise SystemExit(f"no query of --mix is available on {engine}")
+    cum = list(itertools.accumulate(mix[n] for n in names))
+    pool = ConnectionPool(backend.connect, pool_size)
+    budget = itertools.count()  # next() is atomic under the GIL
+    start = time.perf_counter()
+    record_from = start + warmup
+    stop_at = record_from + duration if duration > 0 else math.inf
+    hists = [{n: LatencyHistogram() for n in names} for _ in range(concurrency)]
+    errors = [dict.fromkeys(names, 0) for _ in range(concurrency)]
+    firsts: List[Dict[str, Tuple[int, str]]] = [{} for _ in range(concurrency)]  # query -> (ns, message)
+
+    def worker(w: int) -> None:
+        rng = random.Random(seed * 7919 + w)
+        mine, errs, first = hists[w], errors[w], firsts[w]
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at or (ops > 0 and now >= record_from and next(budget) >= ops):
+                return
+            name = rng.choices(names, cum_weights=cum, k=1)[0]
+            params = query_params(rng, users, posts_per_user)
+            t0 = time.perf_counter_ns()
+            try:
+                with pool.connection() as conn:
+                    backend.execute(conn, sqls[name], params)
+            except Exception as e:
+                errs[name] += 1
+                if name not in first:
+                    first[name] = (time.perf_counter_ns(), f"{type(e).__name__}: {e}".strip())
+                continue
+            if t0 >= record_from * 1e9:
+                mine[name].record((time.perf_counter_ns() - t0) // 1000)
+
+    threads = [threading.Thread(target=worker, args=(w,), daemon=True) for w in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - max(start, record_from) if warmup else time.perf_counter() - start
+    pool.close()
+
+    merged = {n: LatencyHistogram() for n in names}
+    total = LatencyHistogram()
+    for per_worker in hists:
+        for n, h in per_worker.items():
+            merged[n].merge(h)
+            total.merge(h)
+    errs = {n: sum(e[n] for e in errors) for n in names}
+    first_errors = {n: min(f[n] for f in firsts if n in f)[1] for n in names if errs[n]}
+    queries = [stats_of(n, merged[n], errs[n], seconds) for n in names]
+    return RunReport(engine, seconds, concurrency, pool_size, queries, stats_of("total", total, sum(errs.values()), seconds),
+                     merged, first_errors)
+
+
+def fmt_us(us: float) -> str:
+    return f"{us / 1000.0:.2f}"
+
+
+def print_report(rep: RunReport, hdr: bool = False) -> None:
+    print(f"\n== {rep.engine}: {rep.seconds:.1f}s, concurrency={rep.concurrency}, pool={rep.pool_size} (latency in ms)")
+    print(f"{'query':<10} {'ops':>9} {'err':>5} {'ops/s':>10} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'p999':>8} {'max':>8}")
+    for q in rep.queries + [rep.total]:
+        print(f"{q.name:<10} {q.ops:>9} {q.errors:>5} {q.ops_per_s:>10,.0f} {fmt_us(q.mean_us):>8} {fmt_us(q.p50_us):>8} "
+              f"{fmt_us(q.p95_us):>8} {fmt_us(q.p99_us):>8} {fmt_us(q.p999_us):>8} {fmt_us(q.max_us):>8}")
+    for name, message in rep.first_errors.items():
+        print(f"first error in {name}: {message}")
+    if hdr:
+        for name, hist in rep.histograms.items():
+            print(f"\n{name}: {'Value(ms)':>10} {'Percentile':>12} {'TotalCount':>11} {'1/(1-Percentile)':>17}")
+            for value, q, below in hist.distribution():
+                inv = f"{1.0 / (1.0 - q / 100.0):.2f}" if q < 100.0 else "inf"
+                print(f"{'':<{len(name) + 1}} {fmt_us(value):>10} {q / 100.0:>12.6f} {below:>11} {inv:>17}")
+
+
+def print_comparison(reports: List[RunReport]) -> None:
+    print(f"\n{'engine':<10} {'ops/s':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'p999':>8}  (all queries, ms)")
+    for rep in reports:
+        t = rep.total
+        print(f"{rep.engine:<10} {t.ops_per_s:>10,.0f} {fmt_us(t.p50_us):>8} {fmt_us(t.p95_us):>8} {fmt_us(t.p99_us):>8} {fmt_us(t.p999_us):>8}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Closed-loop query load driver with latency percentiles (yuga, cockroach, tidb, fake)")
+    ap.add_argument("--engine", type=str, default="fake", help="Comma-separated: yuga, cockroach, tidb, fake (run one after the other)")
+    ap.add_argument("--dsn", type=str, default="", help="Connection string (single engine only; defaults per engine)")
+    ap.add_argument("--mix", type=str, default="timeline=70,followers=20,likes=10",
+                    help="Query weights; queries missing from a schema (likes on yuga/tidb) are skipped")
+    ap.add_argument("--concurrency", type=int, default=16, help="Worker threads")
+    ap.add_argument("--pool-size", type=int, default=0, help="Pooled connections (default: one per worker)")
+    ap.add_argument("--duration", type=float, default=10.0, help="Measured seconds (0 = until --ops)")
+    ap.add_argument("--ops", type=int, default=0, help="Stop after this many measured operations")
+    ap.add_argument("--warmup", type=float, default=0.0, help="Seconds of load before recording")
+    ap.add_argument("--users", type=int, default=100, help="User ids drawn from 1..users (match the seed)")
+    ap.add_argument("--posts-per-user", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--hdr", action="store_true", help="Print the HDR percentile distribution of each query")
+    ap.add_argument("--save", type=str, default="", help="Write the reports to this JSON file")
+    ap.add_argument("--fake-slots", type=int, default=16, help="Fake engine: concurrent queries it serves")
+    ap.add_argument("--fake-scale", type=float, default=1.0, help="Fake engine: latency multiplier")
+    args = ap.parse_args()
+
+    engines = [e.strip() for e in args.engine.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in QUERIES]
+    if unknown:
+        raise SystemExit(f"unknown engine(s): {', '.join(unknown)} (choose from {', '.join(QUERIES)})")
+    if args.duration <= 0 and args.ops <= 0:
+        raise SystemExit("set --duration or --ops")
+    pool_size = args.pool_size or args.concurrency
+    reports = []
+    for engine in engines:
+        backend = backend_for(engine, args.dsn if len(engines) == 1 else "", args)
+        mix = parse_mix(args.mix, QUERIES[engine])
+        skipped = [n for n in mix if not QUERIES[engine][n]]
+        if skipped:
+            print(f"[{engine}] skipping {', '.join(skipped)} (not in this schema)")
+        rep = run_load(engine, backend, mix, args.concurrency, pool_size, args.duration, args.ops,
+                       args.warmup, args.users, args.posts_per_user, args.seed)
+        reports.append(rep)
+        print_report(rep, args.hdr)
+    if len(reports) > 1:
+        print_comparison(reports)
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump([{"engine": r.engine, "seconds": r.seconds, "concurrency": r.concurrency, "pool_size": r.pool_size,
+                        "queries": [q._asdict() for q in r.queries + [r.total]], "first_errors": r.first_errors}
+                       for r in reports], fh, indent=2)
+        print(f"\nSaved {len(reports)} report(s) to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
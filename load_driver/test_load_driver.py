@@ -0,0 +1,36 @@
+"""
+Load driver against the in-process fake engine (no cluster, no database driver).
+
+  python -m pytest -q load_driver
+"""
+import load_driver as ld
+
+
+class FailingEngine(ld.FakeEngine):
+    """Fake engine on which the followers query always fails."""
+
+    def execute(self, conn, sql, params):
+        if self.names.get(sql) == "followers":
+            raise RuntimeError(f"relation does not exist (user {params['user']})")
+        return super().execute(conn, sql, params)
+
+
+def test_first_error_is_kept_per_query(capsys):
+    engine = FailingEngine(slots=4, scale=0.01, seed=1)
+    rep = ld.run_load("fake", engine, {"timeline": 1, "followers": 1}, concurrency=4, pool_size=2, duration=0,
+                      ops=200, warmup=0, users=10, posts_per_user=2, seed=3)
+    stats = {q.name: q for q in rep.queries}
+    assert stats["followers"].ops == 0 and stats["followers"].errors > 0 and stats["timeline"].errors == 0
+    assert list(rep.first_errors) == ["followers"]
+    assert rep.first_errors["followers"].startswith("RuntimeError: relation does not exist (user ")
+    ld.print_report(rep)
+    assert "first error in followers: RuntimeError: relation does not exist" in capsys.readouterr().out
+
+
+def test_histogram_percentiles_within_one_percent():
+    hist = ld.LatencyHistogram()
+    for us in range(1, 100_001):
+        hist.record(us)
+    for q in (50, 95, 99, 99.9):
+        assert abs(hist.percentile(q) - q * 1000) <= q * 10
+    assert hist.max == 100_000 and hist.total == 100_000
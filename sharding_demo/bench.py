@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark and regression suite for the sharding_demo hot paths (no database required)
+
+Times each routing function and each simulator at several key counts, shard counts and
+split counts, and reports keys/s, peak RSS and peak traced allocations. Every case runs
+in its own forked process, so peak RSS is not polluted by earlier cases. Results can be
+saved as a JSON baseline; later runs compare against it and exit with status 1 when a
+case got slower than the tolerance allows.
+
+Usage examples:
+  python3 sharding_demo/bench.py
+  python3 sharding_demo/bench.py --sizes 1e4,1e5,1e6,1e7 --filter simulate --save baseline.json
+  python3 sharding_demo/bench.py --compare baseline.json --tolerance 0.15
+  python -m sharding_demo.bench --quick   (from the repository root)
+
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from sharding_demo import sharding_demo as sd  # python -m sharding_demo.bench
+except ImportError:
+    import sharding_demo as sd  # python3 sharding_demo/bench.py
+
+try:
+    import resource
+except ImportError:  # not available on Windows: peak RSS is not reported
+    resource = None
+
+
+class Case(NamedTuple):
+    """One benchmark: setup(n) builds the inputs (not timed), run(state) is timed; keys/s = n / seconds."""
+    name: str
+    setup: Callable[[int], Any]
+    run: Callable[[Any], Any]
+
+
+def _keys(n: int) -> range:
+    return range(1, n + 1)
+
+
+def build_cases(shard_counts: List[int], split_counts: List[int]) -> List[Case]:
+    cases: List[Case] = []
+    for shards in shard_counts:
+        cases.append(Case(f"sha1_mod[shards={shards}]", _keys,
+                          lambda keys, s=shards: [sd.sha1_mod(k, s) for k in keys]))
+        cases.append(Case(f"histogram[shards={shards}]", lambda n, s=shards: [k % s for k in _keys(n)],
+                          lambda assigns, s=shards: sd.histogram(assigns, s)))
+        for scheme in sd.PARTITIONERS:
+            if scheme != "sha1":
+                cases.append(Case(f"hash_shard[{scheme},shards={shards}]", _keys,
+                                  lambda keys, s=shards, h=scheme: [sd.hash_shard(k, s, h) for k in keys]))
+    for m in split_counts:
+        cases.append(Case(f"assign_range[splits={m}]", lambda n, m=m: (_keys(n), sd.even_splits(m + 1, n)),
+                          lambda st: [sd.assign_range(k, st[1]) for k in st[0]]))
+        if sd.np is not None:
+            cases.append(Case(f"assign_range_batch[splits={m}]", lambda n, m=m: (sd.np.arange(1, n + 1), sd.even_splits(m + 1, n)),
+                              lambda st: sd.assign_range_batch(*st)))
+    cases.append(Case("even_splits[shards=n]", lambda n: n, lambda n: sd.even_splits(n, 10 * n)))
+
+    shards = shard_counts[0]
+    for strategy in ("hash", "range"):
+        cases.append(Case(f"simulate[{strategy},shards={shards}]", lambda n: n,
+                          lambda n, st=strategy: sd.simulate(st, shards, n, sd.even_splits(shards, n) if st == "range" else None)))
+        cases.append(Case(f"simulate_progress[{strategy},shards={shards}]", lambda n: n,
+                          lambda n, st=strategy: sd.simulate_progress(st, shards, n, sd.even_splits(shards, n) if st == "range" else None, steps=10)))
+        if sd.np is not None:
+            cases.append(Case(f"simulate[{strategy},shards={shards},numpy]", lambda n: n,
+                              lambda n, st=strategy: sd.simulate(st, shards, n, sd.even_splits(shards, n) if st == "range" else None, engine="numpy")))
+    cases.append(Case("simulate_progress_range_autosplit", lambda n: n,
+                      lambda n: sd.simulate_progress_range_autosplit(n, [], steps=10, threshold=0.2)))
+    cases.append(Case("simulate_progress_range_autosplit_with_nodes[nodes=8]", lambda n: n,
+                      lambda n: sd.simulate_progress_range_autosplit_with_nodes(n, [], steps=10, threshold=0.2, nodes=8, rebalance_after_split=True)))
+    cases.append(Case("simulate_progress_range_loadsplit_with_nodes[nodes=8]", lambda n: n,
+                      lambda n: sd.simulate_progress_range_loadsplit_with_nodes(n, [], steps=10, nodes=8, arrival_rate=max(1000.0, n / 20), key_mode="random", seed=0)))
+    cases.append(Case("simulate_range_with_salt[buckets=16]", lambda n: n,
+                      lambda n: sd.simulate_range_with_salt(n, sd.even_splits(shards, n), 16)))
+    cases.append(Case("simulate_progress_range_with_salt[buckets=16]", lambda n: n,
+                      lambda n: sd.simulate_progress_range_with_salt(n, sd.even_splits(shards, n), 16, steps=10)))
+    return cases
+
+
+def measure(case: Case, n: int, repeat: int, trace_alloc: bool) -> Dict[str, Any]:
+    """Best-of-`repeat` throughput, then one traced run for the allocation peak."""
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        random.seed(0)
+        state = case.setup(n)
+        t0 = time.perf_counter()
+        case.run(state)
+        best = min(best, time.perf_counter() - t0)
+    alloc_peak = None
+    if trace_alloc:
+        random.seed(0)
+        state = case.setup(n)
+        tracemalloc.start()
+        case.run(state)
+        alloc_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    rss = None
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = rss if sys.platform == "darwin" else rss * 1024  # Linux reports KiB
+    return {
+        "n": n,
+        "seconds": best,
+        "keys_per_s": n / best if best > 0 else float("inf"),
+        "peak_rss_bytes": rss,
+        "alloc_peak_bytes": alloc_peak,
+    }
+
+
+def _child(conn, case: Case, n: int, repeat: int, trace_alloc: bool) -> None:
+    try:
+        conn.send(measure(case, n, repeat, trace_alloc))
+    except Exception as exc:  # report the failure instead of hanging the parent
+        conn.send({"error": repr(exc)})
+    finally:
+        conn.close()
+
+
+def run_isolated(case: Case, n: int, repeat: int, trace_alloc: bool) -> Dict[str, Any]:
+    """Run one case in a forked process (in-process where fork is unavailable)."""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return measure(case, n, repeat, trace_alloc)
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(child, case, n, repeat, trace_alloc))
+    proc.start()
+    child.close()
+    result = parent.recv()
+    proc.join()
+    if "error" in result:
+        raise RuntimeError(f"{case.name} @ {n}: {result['error']}")
+    return result
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[Tuple[str, float]]:
+    """Cases whose keys/s dropped below baseline * (1 - tolerance), with their relative change."""
+    regressions = []
+    for key, res in results.items():
+        base = baseline.get(key)
+        if not base or not base.get("keys_per_s"):
+            continue
+        change = res["keys_per_s"] / base["keys_per_s"] - 1.0
+        if change < -tolerance:
+            regressions.append((key, change))
+    return regressions
+
+
+def fmt_size(n: Optional[int]) -> str:
+    return "n/a" if n is None else sd.fmt_bytes(n)
+
+
+def parse_ints(text: str) -> List[int]:
+    return [int(float(p)) for p in text.split(",") if p.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark and regression suite for sharding_demo")
+    ap.add_argument("--sizes", type=str, default="1e4,1e5,1e6", help="Comma-separated key counts (e.g. 1e4,1e5,1e6,1e7)")
+    ap.add_argument("--shards", type=str, default="4,64", help="Comma-separated shard counts for the routing cases (the first one is used by the simulators)")
+    ap.add_argument("--splits", type=str, default="4,64,1024", help="Comma-separated split counts for the range routing cases")
+    ap.add_argument("--filter", type=str, default="", help="Only run cases whose name contains this substring")
+    ap.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the best one is kept")
+    ap.add_argument("--quick", action="store_true", help="Shortcut for --sizes 1e4 --repeat 1")
+    ap.add_argument("--no-alloc", action="store_true", help="Skip the tracemalloc run (allocation peak)")
+    ap.add_argument("--save", type=str, default="", help="Write results to this JSON baseline file")
+    ap.add_argument("--compare", type=str, default="", help="Compare against this JSON baseline and exit 1 on slowdowns")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="Allowed keys/s drop vs the baseline before failing (fraction, default 0.2)")
+    args = ap.parse_args()
+
+    sizes = [10_000] if args.quick else parse_ints(args.sizes)
+    repeat = 1 if args.quick else args.repeat
+    cases = [c for c in build_cases(parse_ints(args.shards), parse_ints(args.splits)) if args.filter in c.name]
+    if not cases:
+        raise SystemExit(f"no benchmark case matches --filter {args.filter!r}")
+    baseline: Dict[str, Dict[str, Any]] = {}
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)["results"]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'case':<58} {'n':>10} {'keys/s':>14} {'peak RSS':>10} {'alloc peak':>11} {'vs base':>8}")
+    for case in cases:
+        for n in sizes:
+            key = f"{case.name}@{n}"
+            res = run_isolated(case, n, repeat, trace_alloc=not args.no_alloc)
+            results[key] = res
+            base = baseline.get(key)
+            delta = f"{100.0 * (res['keys_per_s'] / base['keys_per_s'] - 1.0):+7.1f}%" if base else ""
+            print(f"{case.name:<58} {n:>10} {res['keys_per_s']:>14,.0f} {fmt_size(res['peak_rss_bytes']):>10} "
+                  f"{fmt_size(res['alloc_peak_bytes']):>11} {delta:>8}", flush=True)
+
+    if args.save:
+        meta = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": getattr(sd.np, "__version__", None),
+            "repeat": repeat,
+        }
+        with open(args.save, "w") as fh:
+            json.dump({"meta": meta, "results": results}, fh, indent=2, sort_keys=True)
+        print(f"\nSaved {len(results)} results to {args.save}")
+
+    if args.compare:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {100 * args.tolerance:.0f}% tolerance:")
+            for key, change in regressions:
+                print(f"  {key}: {100 * change:+.1f}% keys/s")
+            raise SystemExit(1)
+        print(f"\nNo regression beyond {100 * args.tolerance:.0f}% tolerance ({len(results)} cases)")
+
+
+if __name__ == "__main__":
+    main()
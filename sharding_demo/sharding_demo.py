@@ -12,18 +12,173 @@ Usage examples:
   python3 sharding_demo.py --strategy range --shards 4 --n-keys 1000 --splits 250,500,750
   python3 sharding_demo.py --strategy hash  --shards 4 --n-keys 1000
   python3 sharding_demo.py --compare --shards 5 --n-keys 500
+  python3 sharding_demo.py --strategy hash  --shards 8 --n-keys 10000000 --engine numpy
+  python3 sharding_demo.py --compare --shards 8 --n-keys 1000000 --format json --profile
+  python3 sharding_demo.py --compare --shards 8 --trace post_ids.bin --engine numpy
+  python3 sharding_demo.py --compare --shards 8 --n-keys 10000000 --workload zipf --hot-keys 10 --engine numpy
+  python3 sharding_demo.py --plan-splits --shards 16 --trace post_ids.bin --sql-dialect cockroach --sql-out splits.sql
 
 """
 import argparse
+import bisect
+import contextlib
+import csv
+import functools
 import hashlib
+import heapq
+import json
 import math
+import mmap
+import os
 import random
-from typing import List, Dict, Iterable, Tuple
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import accumulate, chain, compress, islice
+from typing import Any, Callable, List, Dict, Iterable, Iterator, NamedTuple, TextIO, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: the pure-Python engine is always available
+    np = None
+
+try:
+    import resource
+except ImportError:  # not available on Windows: peak RSS is reported as None
+    resource = None
+
+
+ENGINES = ("python", "numpy")
+BATCH_SIZE = 1 << 16  # keys per array batch for the numpy engine
+PARALLEL_CHUNK = 1 << 20  # keys per work unit with --workers (fixed, so results do not depend on N)
+FORMATS = ("text", "json", "csv")
+
+
+def peak_rss_bytes() -> int | None:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # Linux reports KiB
+
+
+class PhaseStats(NamedTuple):
+    """Profile of one phase. seconds is exclusive: time spent in nested phases is charged to them."""
+    phase: str
+    calls: int
+    keys: int
+    seconds: float
+    peak_rss_bytes: int | None  # process high-water mark when the phase last ended
+    alloc_peak_bytes: int | None  # largest traced Python heap inside the phase (--profile-alloc)
+
+    @property
+    def keys_per_s(self) -> float | None:
+        if not self.keys:
+            return None
+        return self.keys / self.seconds if self.seconds > 0 else float("inf")
+
+
+class Profiler:
+    """Wall time, keys and memory per named phase (hashing, routing, histogram, autosplit, ...).
+
+    Phases nest, and a phase's seconds exclude its nested phases, so the per-phase times add up
+    to the profiled total. Instrumented code opens phases per batch or per split, never per key,
+    so profiling does not change the cost it measures. With trace_alloc, tracemalloc also records
+    the Python heap peak of each phase (much slower).
+    """
+
+    def __init__(self, trace_alloc: bool = False):
+        self.trace_alloc = trace_alloc
+        self.stats: Dict[str, List[Any]] = {}  # phase -> [calls, keys, seconds, rss, alloc peak]
+        self._stack: List[List[Any]] = []  # open phases: [start, nested seconds, nested alloc peak]
+        if trace_alloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def enter(self) -> None:
+        if self.trace_alloc:
+            self._fold_alloc(tracemalloc.get_traced_memory()[1])
+        self._stack.append([time.perf_counter(), 0.0, 0])
+
+    def exit(self, name: str, keys: int = 0) -> None:
+        start, nested, nested_alloc = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][1] += elapsed
+        st = self.stats.setdefault(name, [0, 0, 0.0, None, None])
+        st[0] += 1
+        st[1] += keys
+        st[2] += elapsed - nested
+        st[3] = peak_rss_bytes()
+        if self.trace_alloc:
+            peak = max(nested_alloc, tracemalloc.get_traced_memory()[1])
+            st[4] = max(st[4] or 0, peak)
+            self._fold_alloc(peak)
+
+    def _fold_alloc(self, peak: int) -> None:
+        # tracemalloc has a single peak counter: hand it to the enclosing phase, then restart it
+        if self._stack:
+            self._stack[-1][2] = max(self._stack[-1][2], peak)
+        tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, keys: int = 0) -> Iterator[None]:
+        self.enter()
+        try:
+            yield
+        finally:
+            self.exit(name, keys)
+
+    def report(self) -> List[PhaseStats]:
+        """Phases by decreasing exclusive time."""
+        rows = [PhaseStats(name, *st) for name, st in self.stats.items()]
+        return sorted(rows, key=lambda r: -r.seconds)
+
+
+PROFILER: Profiler | None = None  # set by --profile
+
+
+def profile_phase(name: str, keys: int = 0):
+    """Context manager charging its body to phase `name` when profiling, else a no-op."""
+    return PROFILER.phase(name, keys) if PROFILER is not None else contextlib.nullcontext()
+
+
+def profiled(fn: Callable) -> Callable:
+    """Run fn as a phase named after it (its own work outside the nested phases)."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if PROFILER is None:
+            return fn(*args, **kwargs)
+        with PROFILER.phase(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def profile_batches(batches: Iterator[Any], name: str = "keygen") -> Iterator[Any]:
+    """Yield from batches, charging the time to produce each batch (and its length) to `name`."""
+    if PROFILER is None:
+        return batches
+
+    def timed() -> Iterator[Any]:
+        while True:
+            PROFILER.enter()
+            batch = next(batches, None)
+            PROFILER.exit(name, len(batch) if batch is not None else 0)
+            if batch is None:
+                return
+            yield batch
+    return timed()
+
+
+def sha1_digest(key: int) -> int:
+    return int.from_bytes(hashlib.sha1(str(key).encode("utf-8")).digest(), "big")
 
 
 def sha1_mod(key: int, shards: int) -> int:
-    h = hashlib.sha1(str(key).encode("utf-8")).hexdigest()
-    return int(h, 16) % shards
+    # int.from_bytes(digest) == int(hexdigest, 16), without the hex round-trip
+    return sha1_digest(key) % shards
 
 
 def assign_range(key: int, splits: List[int]) -> int:
@@ -32,21 +187,112 @@ def assign_range(key: int, splits: List[int]) -> int:
     shard 0: (-inf, s1], shard 1: (s1, s2], ..., last: (s_{n-1}, +inf)
     We'll treat as left-closed for 0 and right-closed for others for simplicity.
     """
-    for i, s in enumerate(splits):
-        if key <= s:
-            return i
-    return len(splits)  # last shard
-
-
-def salt_of(key: int, buckets: int) -> int:
+    # First split point >= key (binary search; splits are ascending)
+    return bisect.bisect_left(splits, key)
+
+
+MASK32 = (1 << 32) - 1
+MASK64 = (1 << 64) - 1
+XXH_P1, XXH_P2, XXH_P3 = 0x9E3779B185EBCA87, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9
+XXH_P4, XXH_P5 = 0x85EBCA77C2B2AE63, 0x27D4EB2F165667C5
+MURMUR_C1, MURMUR_C2 = 0xCC9E2D51, 0x1B873593
+JUMP_LCG = 2862933555777941757
+YB_HASH_SPACE = 0x10000  # YugabyteDB hash codes are 16-bit: 0..65535
+
+
+def xxh64_digest(key: int) -> int:
+    """XXH64 (seed 0) of the key as 8 little-endian bytes, in integer arithmetic only."""
+    k1 = (((key & MASK64) * XXH_P2) & MASK64)
+    k1 = (((k1 << 31) | (k1 >> 33)) & MASK64) * XXH_P1 & MASK64
+    h = ((XXH_P5 + 8) & MASK64) ^ k1
+    h = ((((h << 27) | (h >> 37)) & MASK64) * XXH_P1 + XXH_P4) & MASK64
+    h ^= h >> 33
+    h = (h * XXH_P2) & MASK64
+    h ^= h >> 29
+    h = (h * XXH_P3) & MASK64
+    return h ^ (h >> 32)
+
+
+def murmur3_digest(key: int) -> int:
+    """MurmurHash3 x86_32 (seed 0) of the key as 8 little-endian bytes."""
+    key &= MASK64
+    h = 0
+    for block in (key & MASK32, key >> 32):
+        k = (block * MURMUR_C1) & MASK32
+        k = ((k << 15) | (k >> 17)) & MASK32
+        k = (k * MURMUR_C2) & MASK32
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & MASK32
+        h = (h * 5 + 0xE6546B64) & MASK32
+    h ^= 8
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & MASK32
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & MASK32
+    return h ^ (h >> 16)
+
+
+def yb16_digest(key: int) -> int:
+    """YugabyteDB-style 16-bit hash code: a 64-bit key hash XOR-folded into 0..65535."""
+    h = xxh64_digest(key)
+    return (h ^ (h >> 16) ^ (h >> 32) ^ (h >> 48)) & 0xFFFF
+
+
+def mod_place(h: int, shards: int) -> int:
+    return h % shards
+
+
+def yb16_place(h: int, shards: int) -> int:
+    """Tablet owning hash code h when the 16-bit space is pre-split into `shards` equal tablets
+    (tablet i starts at i * (0xFFFF // shards); the last tablet runs to 0xFFFF)."""
+    interval = 0xFFFF // shards
+    if interval == 0:
+        raise ValueError(f"yb16 supports at most {0xFFFF} tablets")
+    return min(h // interval, shards - 1)
+
+
+def jump_hash(h: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): bucket of a 64-bit key hash."""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        h = (h * JUMP_LCG + 1) & MASK64
+        j = int((b + 1) * (float(1 << 31) / float((h >> 33) + 1)))
+    return b
+
+
+class Partitioner(NamedTuple):
+    """Hash partitioning scheme: digest(key) is computed once per key, then reused by
+    place(digest, shards) for the shard and by digest % buckets for the salt."""
+    digest: Callable[[int], int]
+    place: Callable[[int, int], int]
+    description: str
+
+
+PARTITIONERS: Dict[str, Partitioner] = {
+    "sha1": Partitioner(sha1_digest, mod_place, "SHA-1(str(key)) % N (original demo)"),
+    "murmur3": Partitioner(murmur3_digest, mod_place, "MurmurHash3 x86_32 of the int64 key % N"),
+    "xxhash-style": Partitioner(xxh64_digest, mod_place, "XXH64 of the int64 key % N"),
+    "yb16": Partitioner(yb16_digest, yb16_place, "16-bit hash code, space pre-split into N equal tablets (YugabyteDB)"),
+    "jump": Partitioner(xxh64_digest, jump_hash, "jump consistent hash of XXH64(key)"),
+}
+
+
+def hash_shard(key: int, shards: int, hash_scheme: str = "sha1") -> int:
+    p = PARTITIONERS[hash_scheme]
+    return p.place(p.digest(key), shards)
+
+
+def salt_of(key: int, buckets: int, hash_scheme: str = "sha1") -> int:
     if buckets <= 1:
         return 0
     # Deterministic bucket from hash(key)
-    h = hashlib.sha1(str(key).encode("utf-8")).hexdigest()
-    return int(h, 16) % buckets
+    return PARTITIONERS[hash_scheme].digest(key) % buckets
 
 
 def histogram(assignments: Iterable[int], shards: int) -> List[int]:
+    if np is not None and isinstance(assignments, np.ndarray):
+        return np.bincount(assignments, minlength=shards).tolist()
     counts = [0] * shards
     for s in assignments:
         counts[s] += 1
@@ -60,24 +306,786 @@ def ascii_bar(count: int, max_count: int, width: int = 40) -> str:
     return "#" * filled + "." * (width - filled)
 
 
-def print_hist(title: str, counts: List[int], label: str = "shard"):
+def format_hist(title: str, counts: List[int], label: str = "shard") -> Iterator[str]:
+    """Lines (with newlines) of the ASCII histogram, generated as they are written."""
     total = sum(counts)
     max_c = max(counts) if counts else 0
-    print(f"\n{title}")
+    yield f"\n{title}\n"
     for i, c in enumerate(counts):
         pct = (100.0 * c / total) if total else 0.0
-        print(f"  {label} {i:02d}: {c:6d} ({pct:5.1f}%) |{ascii_bar(c, max_c)}|")
+        yield f"  {label} {i:02d}: {c:6d} ({pct:5.1f}%) |{ascii_bar(c, max_c)}|\n"
 
 
-def gen_keys(n: int, mode: str = "sequential", key_min: int = 1) -> List[int]:
+def random_chunk_seeds(n: int) -> List[int]:
+    """Seeds of a random key stream: one per PARALLEL_CHUNK keys, drawn in order from `random`."""
+    return [random.getrandbits(64) for _ in range(0, n, PARALLEL_CHUNK)]
+
+
+def seeded_keys(seed: int, size: int, key_min: int, key_max: int) -> Iterator[int]:
+    randint = random.Random(seed).randint
+    return (randint(key_min, key_max) for _ in range(size))
+
+
+def iter_keys(n: int, mode: str = "sequential", key_min: int = 1) -> Iterator[int]:
+    """Lazy key stream (same keys, in the same order, as gen_keys) so simulators run in O(1) memory.
+    Random keys come from one seeded generator per PARALLEL_CHUNK keys, so a --workers chunk
+    draws exactly the keys of the serial stream.
+    """
     if mode == "sequential":
-        return list(range(key_min, key_min + n))
+        return iter(range(key_min, key_min + n))
     elif mode == "random":
-        return [random.randint(key_min, key_min + n - 1) for _ in range(n)]
+        hi = key_min + n - 1
+        return chain.from_iterable(seeded_keys(seed, min(PARALLEL_CHUNK, n - start), key_min, hi)
+                                   for start, seed in zip(range(0, n, PARALLEL_CHUNK), random_chunk_seeds(n)))
     else:
         raise ValueError("mode must be 'sequential' or 'random'")
 
 
+def gen_keys(n: int, mode: str = "sequential", key_min: int = 1) -> List[int]:
+    return list(iter_keys(n, mode=mode, key_min=key_min))
+
+
+def progress_checkpoints(n_keys: int, steps: int) -> List[int]:
+    """Key counts at which progression simulators snapshot their counters."""
+    return [max(1, (n_keys * frac) // steps) for frac in range(1, steps + 1)]
+
+
+def router_for(strategy: str, shards: int, splits: List[int] | None, hash_scheme: str = "sha1") -> Callable[[int], int]:
+    """Per-key routing function for a static strategy."""
+    if strategy == "hash":
+        if hash_scheme == "sha1":
+            return lambda k: sha1_mod(k, shards)
+        digest, place = PARTITIONERS[hash_scheme].digest, PARTITIONERS[hash_scheme].place
+        return lambda k: place(digest(k), shards)
+    assert splits is not None
+    return lambda k: assign_range(k, splits)
+
+
+def resolve_engine(engine: str) -> str:
+    """Return the engine usable in this environment ('numpy' falls back to 'python' without NumPy)."""
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {', '.join(ENGINES)}")
+    if engine == "numpy" and np is None:
+        return "python"
+    return engine
+
+
+def gen_key_batches(n: int, mode: str = "sequential", key_min: int = 1, batch_size: int = BATCH_SIZE) -> Iterator["np.ndarray"]:
+    """Array counterpart of gen_keys: yields int64 arrays of at most batch_size keys.
+    Random keys are the keys of iter_keys, so seeded runs match.
+    """
+    if mode not in ("sequential", "random"):
+        raise ValueError("mode must be 'sequential' or 'random'")
+    keys = iter_keys(n, mode, key_min) if mode == "random" else None
+    for start in range(0, n, batch_size):
+        size = min(batch_size, n - start)
+        if keys is None:
+            yield np.arange(key_min + start, key_min + start + size, dtype=np.int64)
+        else:
+            yield np.fromiter(keys, dtype=np.int64, count=size)
+
+
+TRACE_FORMATS = ("auto", "bin", "csv")
+
+
+class TraceStats(NamedTuple):
+    """Summary of a key trace, from one streaming pass."""
+    keys: int
+    min_key: int
+    max_key: int
+    first_time: float | None  # seconds, when the trace has a time field
+    last_time: float | None
+
+
+def parse_trace_time(text: str) -> float:
+    """Trace timestamp: a number, or an ISO 8601 date/time (as Unix seconds)."""
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+class KeyTrace:
+    """Captured key stream (e.g. exported posts.id or posts.author_id) replayed instead of 1..N.
+
+    - bin: headerless little-endian int64 records of len(fields) values each (e.g. key,ts,op),
+      read through mmap (np.memmap for the numpy engine) one BATCH_SIZE chunk at a time
+    - csv: streamed row by row; columns are named by a header row, or numbered 0, 1, ... without one
+    The key field defaults to the first field when no field is called `key_field`. Keys replay in
+    file order; with `ops`, only records whose op field is one of them are kept. Times (seconds
+    times time_scale; CSV also takes ISO 8601) pace --load-sim. Nothing is read whole, so traces
+    larger than RAM replay in O(BATCH_SIZE) memory. The object only holds the path and options,
+    so it pickles to --workers processes, which replay slices of a binary trace.
+    """
+
+    kind = label = "trace"
+
+    def __init__(self, path: str, fmt: str = "auto", fields: Iterable[str] = ("key",), key_field: str = "key",
+                 time_field: str | None = None, op_field: str = "op", ops: Iterable[str] = (), time_scale: float = 1.0):
+        if fmt == "auto":
+            fmt = "csv" if path.lower().endswith(".csv") else "bin"
+        if fmt not in TRACE_FORMATS[1:]:
+            raise ValueError(f"trace format must be one of {', '.join(TRACE_FORMATS)}")
+        self.path, self.fmt = path, fmt
+        self.key_field, self.time_field, self.op_field = key_field, time_field, op_field
+        self.time_scale = time_scale
+        self._stats: TraceStats | None = None
+        if fmt == "csv":
+            self.ops: Tuple[Any, ...] = tuple(ops)
+            with open(path, newline="") as f:
+                first = next(csv.reader(f), [])
+            self.has_header = not all(_is_number(cell) for cell in first)
+            self.fields = tuple(first) if self.has_header else tuple(str(i) for i in range(len(first)))
+            self.records = -1  # unknown until counted
+        else:
+            self.ops = tuple(int(op) for op in ops)
+            self.fields = tuple(fields)
+            self.has_header = False
+            size = os.path.getsize(path)
+            if size % (8 * len(self.fields)):
+                raise ValueError(f"{path}: {size} bytes is not a whole number of {8 * len(self.fields)}-byte records ({','.join(self.fields)})")
+            self.records = size // (8 * len(self.fields))
+        self._key = self._column(key_field, fallback=0)
+        self._time = self._column(time_field) if time_field else None
+        self._op = self._column(op_field) if self.ops else None
+
+    def _column(self, name: str, fallback: int | None = None) -> int:
+        if name in self.fields:
+            return self.fields.index(name)
+        if fallback is not None and name == "key" and self.fields:
+            return fallback
+        raise ValueError(f"{self.path}: no field {name!r} (fields: {', '.join(self.fields) or 'none'})")
+
+    @property
+    def sliceable(self) -> bool:
+        """Record i holds key i (binary, unfiltered): chunks can be replayed independently."""
+        return self.fmt == "bin" and not self.ops
+
+    def __len__(self) -> int:
+        return self.records if self.sliceable else self.stats().keys
+
+    def stats(self) -> TraceStats:
+        """Key count and range (and time span), from one streaming pass on first use."""
+        if self._stats is None:
+            n, lo, hi = 0, 0, 0
+            batches = self.batches() if np is not None else (keys for keys, _ in self._chunks())
+            for keys in batches:
+                if not len(keys):
+                    continue
+                b_lo, b_hi = (int(keys.min()), int(keys.max())) if np is not None else (min(keys), max(keys))
+                lo, hi = (b_lo, b_hi) if not n else (min(lo, b_lo), max(hi, b_hi))
+                n += len(keys)
+            first = last = None
+            if self._time is not None:
+                for t in self.times():
+                    if first is None:
+                        first = t
+                    last = t
+            self._stats = TraceStats(n, lo, hi, first, last)
+        return self._stats
+
+    def _bin_records(self, start: int, stop: int) -> Iterator[array]:
+        """Records [start, stop) as flat int64 arrays of at most BATCH_SIZE records."""
+        if stop <= start:
+            return
+        rec = 8 * len(self.fields)
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for lo in range(start, stop, BATCH_SIZE):
+                chunk = array("q", mm[lo * rec:min(stop, lo + BATCH_SIZE) * rec])
+                if sys.byteorder == "big":
+                    chunk.byteswap()
+                yield chunk
+
+    def _chunks(self, start: int = 0, stop: int | None = None, times: bool = False) -> Iterator[Tuple[Any, Any]]:
+        """(keys, raw times or None) per chunk, in file order and after the op filter."""
+        if self.fmt == "csv":
+            yield from self._csv_chunks(times)
+            return
+        width = len(self.fields)
+        for chunk in self._bin_records(start, self.records if stop is None else stop):
+            keys = chunk if width == 1 else chunk[self._key::width]
+            ts = chunk[self._time::width] if times else None
+            if self.ops:
+                keep = [op in self.ops for op in chunk[self._op::width]]
+                keys = list(compress(keys, keep))
+                ts = list(compress(ts, keep)) if times else None
+            yield keys, ts
+
+    def _csv_chunks(self, times: bool) -> Iterator[Tuple[List[int], List[float] | None]]:
+        key, t, op, ops = self._key, self._time, self._op, self.ops
+        with open(self.path, newline="") as f:
+            rows = csv.reader(f)
+            if self.has_header:
+                next(rows, None)
+            while True:
+                line = rows.line_num + 1
+                raw = list(islice(rows, BATCH_SIZE))
+                if not raw:
+                    return
+                try:
+                    chunk = [row for row in raw if row and (not ops or row[op] in ops)]
+                    yield [int(row[key]) for row in chunk], ([parse_trace_time(row[t]) for row in chunk] if times else None)
+                except (IndexError, ValueError):
+                    raise self._bad_row(raw, line, times) from None
+
+    def _bad_row(self, raw: List[List[str]], line: int, times: bool) -> ValueError:
+        """Error naming the first row of a CSV chunk (starting at `line`) that cannot be replayed."""
+        cols = [self._key] + ([self._op] if self.ops else []) + ([self._time] if times else [])
+        parsers = [(self._key, int)] + ([(self._time, parse_trace_time)] if times else [])
+        for i, row in enumerate(raw):
+            if not row:
+                continue
+            if len(row) <= max(cols):
+                return ValueError(f"{self.path}:{line + i}: {len(row)} column(s), field {self.fields[max(cols)]!r} needs {max(cols) + 1}")
+            if self.ops and row[self._op] not in self.ops:
+                continue
+            for col, parse in parsers:
+                try:
+                    parse(row[col])
+                except ValueError:
+                    return ValueError(f"{self.path}:{line + i}: bad {self.fields[col]!r} value {row[col]!r}")
+        return ValueError(f"{self.path}: unreadable rows from line {line}")
+
+    def keys(self, start: int = 0, stop: int | None = None) -> Iterator[int]:
+        """Keys in file order; start/stop are record offsets (binary traces only)."""
+        return chain.from_iterable(keys for keys, _ in self._chunks(start, stop))
+
+    def times(self) -> Iterator[float]:
+        """Time of each replayed key, in seconds."""
+        if self._time is None:
+            raise ValueError("trace has no time field")
+        scale = self.time_scale
+        return (t * scale for _, ts in self._chunks(times=True) for t in ts)
+
+    def batches(self, start: int = 0, stop: int | None = None) -> Iterator["np.ndarray"]:
+        """Array counterpart of keys(): int64 arrays of at most BATCH_SIZE keys."""
+        if self.fmt == "csv":
+            for keys, _ in self._chunks():
+                yield np.array(keys, dtype=np.int64)
+            return
+        stop = self.records if stop is None else stop
+        if stop <= start:
+            return
+        rows = np.memmap(self.path, dtype="<i8", mode="r").reshape(-1, len(self.fields))
+        for lo in range(start, stop, BATCH_SIZE):
+            block = rows[lo:min(stop, lo + BATCH_SIZE)]
+            keys = block[:, self._key]
+            if self.ops:
+                keys = keys[np.isin(block[:, self._op], self.ops)]
+            yield keys.astype(np.int64)
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+WORKLOADS = ("zipf", "hotspot", "decay")
+ZIPF_HEAD = 1024  # hottest zipf ranks drawn from exact cumulative weights
+GOLDEN64 = 0x9E3779B97F4A7C15
+
+
+class Workload:
+    """Skewed synthetic key stream over 1..n_keys (one op per key), replayed like a KeyTrace.
+
+    - zipf: rank r is drawn with probability ~ 1/r^s: exact cumulative weights for the first
+      ZIPF_HEAD ranks, the integral of t^-s (inverted in closed form) for the tail. Ranks are
+      scattered over the key space by a fixed affine permutation, so the celebrity keys do not
+      all land in the first range
+    - hotspot: `hot_share` of the ops hit a window of `hot_fraction` * n_keys consecutive keys
+      (e.g. a viral thread) at a seeded offset; the rest are uniform
+    - decay: op i reads a key created an Exp(`decay_keys`) number of keys before key i, so
+      recent posts are hot and interest fades with age (ages beyond key 1 wrap around)
+    Batch b (BATCH_SIZE ops) takes its uniforms from one getrandbits call of a generator
+    seeded with (seed, b): there is no RNG call per key, the python and numpy engines see
+    the same keys, every replay repeats the stream, and chunks can be replayed by --workers.
+    """
+
+    time_field = None
+    sliceable = True
+
+    def __init__(self, kind: str, n_keys: int, seed: int | None = None, zipf_s: float = 1.1,
+                 hot_fraction: float = 0.001, hot_share: float = 0.5, decay_keys: float = 1000.0):
+        if kind not in WORKLOADS:
+            raise ValueError(f"workload must be one of {', '.join(WORKLOADS)}")
+        if n_keys < 1:
+            raise ValueError("a workload needs n_keys >= 1")
+        self.kind, self.n_keys = kind, n_keys
+        self.seed = random.getrandbits(64) if seed is None else seed
+        if kind == "zipf":
+            if zipf_s <= 0:
+                raise ValueError("zipf exponent must be > 0")
+            if n_keys >= 1 << 32:
+                raise ValueError("zipf workloads support fewer than 2^32 keys")
+            self.label = f"zipf(s={zipf_s:g})"
+            self._head = list(accumulate(r ** -zipf_s for r in range(1, min(n_keys, ZIPF_HEAD) + 1)))
+            # Tail ranks: x solves integral of t^-s from a to x = v - head mass, rank = round(x)
+            a, end = len(self._head) + 0.5, n_keys + 0.5
+            if zipf_s == 1.0:
+                self._one_s, self._power = 0.0, 0.0
+                self._z_lo, self._z_hi, tail = a, end, math.log(end / a)
+            else:
+                self._one_s, self._power = 1.0 - zipf_s, 1.0 / (1.0 - zipf_s)
+                za, zend = a ** self._one_s, end ** self._one_s
+                self._z_lo, self._z_hi, tail = min(za, zend), max(za, zend), (zend - za) / self._one_s
+            self._z_a = a if zipf_s == 1.0 else za
+            self._total = self._head[-1] + tail
+            self._step = max(1, int(n_keys * 0.6180339887498949))  # golden-ratio stride
+            while math.gcd(self._step, n_keys) != 1:
+                self._step += 1
+        elif kind == "hotspot":
+            if not 0 < hot_fraction <= 1 or not 0 <= hot_share < 1:
+                raise ValueError("hot_fraction must be in (0, 1] and hot_share in [0, 1)")
+            self.label = f"hotspot({hot_share:.0%} of ops on {hot_fraction:g} of keys)"
+            self._width = max(1, int(n_keys * hot_fraction))
+            self._start = 1 + random.Random(self.seed).randrange(n_keys - self._width + 1)
+            self._share = hot_share
+        else:
+            if decay_keys <= 0:
+                raise ValueError("decay_keys must be > 0")
+            self.label = f"decay(mean age {decay_keys:g} keys)"
+            self._mean = decay_keys
+
+    def __len__(self) -> int:
+        return self.n_keys
+
+    def stats(self) -> TraceStats:
+        return TraceStats(self.n_keys, 1, self.n_keys, None, None)
+
+    def _uniforms(self, b: int, size: int) -> bytes:
+        """8 little-endian random bytes per op of batch b (53 of their bits make a uniform)."""
+        return random.Random(self.seed ^ (b * GOLDEN64)).getrandbits(64 * size).to_bytes(8 * size, "little")
+
+    def _pieces(self, start: int, stop: int | None) -> Iterator[Tuple[int, int, int, int]]:
+        """(batch, batch start, lo, hi): the part [lo, hi) of each batch overlapping [start, stop)."""
+        stop = self.n_keys if stop is None else min(stop, self.n_keys)
+        for b in range(start // BATCH_SIZE, -(-stop // BATCH_SIZE)):
+            b_start = b * BATCH_SIZE
+            yield b, b_start, max(start, b_start) - b_start, min(stop, b_start + BATCH_SIZE) - b_start
+
+    def _tail_x(self, y: Any) -> Any:
+        """Zipf tail: the x whose integral of t^-s from the head end is y (floats or arrays)."""
+        if not self._one_s:
+            return self._z_a * math.e ** y
+        z = self._z_a + y * self._one_s
+        z = np.clip(z, self._z_lo, self._z_hi) if np is not None and isinstance(z, np.ndarray) else min(self._z_hi, max(self._z_lo, z))
+        return z ** self._power
+
+    def _batch_keys(self, b: int, b_start: int, size: int) -> List[int]:
+        words = array("Q", self._uniforms(b, size))
+        if sys.byteorder == "big":
+            words.byteswap()
+        us = [(w >> 11) * 2.0 ** -53 for w in words]
+        n = self.n_keys
+        if self.kind == "zipf":
+            head, total, step = self._head, self._total, self._step
+            mass, first_tail = head[-1], len(head) + 1
+            out = []
+            for u in us:
+                v = u * total
+                if v < mass:
+                    rank = bisect.bisect_right(head, v) + 1
+                else:
+                    rank = min(n, max(first_tail, int(self._tail_x(v - mass) + 0.5)))
+                out.append((rank - 1) * step % n + 1)
+            return out
+        if self.kind == "hotspot":
+            share, start = self._share, self._start
+            hot_c, cold_c = (self._width / share if share else 0.0), n / (1 - share)
+            return [start + int(u * hot_c) if u < share else min(n, 1 + int((u - share) * cold_c)) for u in us]
+        mean = self._mean
+        return [(i - 1 - int(-math.log1p(-u) * mean)) % i + 1 for i, u in zip(range(b_start + 1, b_start + size + 1), us)]
+
+    def _batch_array(self, b: int, b_start: int, size: int) -> "np.ndarray":
+        us = (np.frombuffer(self._uniforms(b, size), dtype="<u8") >> np.uint64(11)) * 2.0 ** -53
+        n = self.n_keys
+        if self.kind == "zipf":
+            head = np.array(self._head)
+            v = us * self._total
+            tail = np.clip((self._tail_x(np.maximum(v - head[-1], 0.0)) + 0.5).astype(np.int64), len(head) + 1, n)
+            ranks = np.where(v < head[-1], np.searchsorted(head, v, side="right") + 1, tail)
+            return ((ranks - 1).astype(np.uint64) * np.uint64(self._step) % np.uint64(n)).astype(np.int64) + 1
+        if self.kind == "hotspot":
+            share = self._share
+            hot_c = self._width / share if share else 0.0
+            hot = self._start + (us * hot_c).astype(np.int64)
+            cold = np.minimum(n, 1 + ((us - share) * (n / (1 - share))).astype(np.int64))
+            return np.where(us < share, hot, cold)
+        ops = np.arange(b_start + 1, b_start + size + 1, dtype=np.int64)
+        return (ops - 1 - (-np.log1p(-us) * self._mean).astype(np.int64)) % ops + 1
+
+    def keys(self, start: int = 0, stop: int | None = None) -> Iterator[int]:
+        """Keys of ops [start, stop), in op order."""
+        return chain.from_iterable(self._batch_keys(b, b_start, hi)[lo:hi] for b, b_start, lo, hi in self._pieces(start, stop))
+
+    def batches(self, start: int = 0, stop: int | None = None) -> Iterator["np.ndarray"]:
+        """Array counterpart of keys(): int64 arrays of at most BATCH_SIZE keys."""
+        for b, b_start, lo, hi in self._pieces(start, stop):
+            yield self._batch_array(b, b_start, hi)[lo:hi]
+
+
+KeySource = KeyTrace | Workload
+
+
+class HotKey(NamedTuple):
+    key: int
+    count: int  # count-min estimate: never below the true count
+    share: float  # of all ops seen
+
+
+class HeavyHitters:
+    """Streaming hot-key detection in bounded memory: count-min sketch plus a candidate table.
+
+    Every batch updates a depth x width count-min sketch (row r indexes h1 + r * h2 of the
+    key's xxh64 digest), whose estimates never undercount and overcount by at most
+    e / width of the stream with probability 1 - exp(-depth). Keys whose estimate beats the
+    smallest of the `capacity` best candidates join the candidate table, so memory stays
+    O(depth * width + capacity) whatever the number of distinct keys. Batches are counted
+    first (Counter, or np.unique with the numpy engine): a key repeated in a batch updates
+    the sketch once. Both engines give the same sketch and candidates.
+    """
+
+    def __init__(self, capacity: int = 1024, width: int = 1 << 16, depth: int = 4, engine: str = "python"):
+        self.capacity, self.width, self.depth = capacity, width, depth
+        self.engine = resolve_engine(engine)
+        if self.engine == "numpy":
+            self.table: Any = np.zeros((depth, width), dtype=np.int64)
+        else:
+            self.table = [array("q", [0]) * width for _ in range(depth)]
+        self.candidates: Dict[int, int] = {}
+        self.floor = 0  # smallest kept estimate once the table has been trimmed
+        self.total = 0
+
+    def _slots(self, key: int) -> List[int]:
+        h = xxh64_digest(key)
+        h1, h2 = h & MASK32, (h >> 32) | 1
+        return [(h1 + r * h2) % self.width for r in range(self.depth)]
+
+    def estimate(self, key: int) -> int:
+        return min(row[i] for row, i in zip(self.table, self._slots(key)))
+
+    def add(self, keys: Any) -> None:
+        """Count one batch of keys (a sequence, or an int64 array with the numpy engine)."""
+        if self.engine == "numpy":
+            self._add_numpy(np.asarray(keys, dtype=np.int64))
+            return
+        counts = Counter(keys)
+        slots = [(key, self._slots(key)) for key in counts]
+        for key, idx in slots:
+            c = counts[key]
+            for row, i in zip(self.table, idx):
+                row[i] += c
+        self.total += len(keys)
+        floor, cand = self.floor, self.candidates
+        for key, idx in slots:
+            est = min(row[i] for row, i in zip(self.table, idx))
+            if est > floor or key in cand:
+                cand[key] = est
+        self._trim()
+
+    def _add_numpy(self, keys: "np.ndarray") -> None:
+        uniq, counts = np.unique(keys, return_counts=True)
+        h = xxh64_batch(uniq)
+        h1, h2 = h & np.uint64(MASK32), (h >> np.uint64(32)) | np.uint64(1)
+        idx = [((h1 + np.uint64(r) * h2) % np.uint64(self.width)).astype(np.int64) for r in range(self.depth)]
+        with profile_phase("histogram", len(keys)):
+            for r in range(self.depth):
+                self.table[r] += np.bincount(idx[r], weights=counts, minlength=self.width).astype(np.int64)
+        self.total += len(keys)
+        est = self.table[0][idx[0]]
+        for r in range(1, self.depth):
+            est = np.minimum(est, self.table[r][idx[r]])
+        keep = est > self.floor
+        if self.candidates:
+            keep |= np.isin(uniq, np.fromiter(self.candidates, dtype=np.int64, count=len(self.candidates)))
+        self.candidates.update(zip(uniq[keep].tolist(), est[keep].tolist()))
+        self._trim()
+
+    def _trim(self) -> None:
+        # Amortized: let the table grow to twice its capacity, then keep the best `capacity`
+        if len(self.candidates) > 2 * self.capacity:
+            best = heapq.nsmallest(self.capacity, self.candidates.items(), key=lambda kv: (-kv[1], kv[0]))
+            self.candidates = dict(best)
+            self.floor = best[-1][1]
+
+    @property
+    def error_bound(self) -> int:
+        """Overcount bound of an estimate (holds with probability 1 - exp(-depth))."""
+        return math.ceil(math.e / self.width * self.total)
+
+    def top(self, k: int) -> List[HotKey]:
+        """The k hottest candidates, by current estimate (ties by key)."""
+        final = [(key, int(self.estimate(key))) for key in self.candidates]
+        best = heapq.nsmallest(k, final, key=lambda kc: (-kc[1], kc[0]))
+        return [HotKey(key, c, c / self.total if self.total else 0.0) for key, c in best]
+
+
+class QuantileSketch:
+    """Streaming quantiles of integer keys in bounded memory (KLL sketch).
+
+    Level h holds items standing for 2^h keys each, with a capacity of k at the top level,
+    shrinking by 2/3 per level below (at least 2). Compacting a level sorts it and moves every
+    other item, from a random offset, up one level. While the sketch holds more items than its
+    total capacity, the lowest level at or over its capacity is compacted (lazy KLL), so about
+    3 x k items are kept however many keys stream in, and ranks are off by O(n / k). A batch
+    lands whole on level 0, so a level holding more than twice its capacity is first compacted
+    in runs of k items, in arrival order (the numpy engine sorts them as rows of one array),
+    leaving its newest capacity to capacity + k items to the lazy rule. The offsets
+    come from a generator seeded from `random`, so both engines keep the same items. min and
+    max are exact.
+    """
+
+    def __init__(self, k: int = 200, engine: str = "python", seed: int | None = None):
+        if k < 8:
+            raise ValueError("sketch k must be >= 8")
+        self.k = k
+        self.engine = resolve_engine(engine)
+        self.levels: List[Any] = [self._empty()]
+        self.n = 0
+        self.min: int | None = None
+        self.max: int | None = None
+        self.rng = random.Random(random.getrandbits(64) if seed is None else seed)
+
+    def _empty(self) -> Any:
+        return np.empty(0, dtype=np.int64) if self.engine == "numpy" else []
+
+    def __len__(self) -> int:
+        """Items kept."""
+        return sum(len(level) for level in self.levels)
+
+    def capacity(self, h: int) -> int:
+        return max(2, int(self.k * (2 / 3) ** (len(self.levels) - 1 - h)))
+
+    def add(self, keys: Any) -> None:
+        """Add one batch of keys (a sequence, or an int64 array with the numpy engine)."""
+        if not len(keys):
+            return
+        if self.engine == "numpy":
+            keys = np.asarray(keys, dtype=np.int64)
+            lo, hi = int(keys.min()), int(keys.max())
+            self.levels[0] = np.concatenate((self.levels[0], keys))
+        else:
+            lo, hi = min(keys), max(keys)
+            self.levels[0].extend(keys)
+        self.n += len(keys)
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > 2 * self.capacity(h):
+                self._compact_runs(h)
+            h += 1
+        while len(self) > sum(map(self.capacity, range(len(self.levels)))):
+            self._compact(next(h for h, level in enumerate(self.levels) if len(level) >= self.capacity(h)))
+
+    def _compact(self, h: int) -> None:
+        if h + 1 == len(self.levels):
+            self.levels.append(self._empty())
+        items = np.sort(self.levels[h]) if self.engine == "numpy" else sorted(self.levels[h])
+        # An odd item out stays behind, so the total weight stays exactly n
+        stay, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+        promoted = items[self.rng.getrandbits(1)::2]
+        if self.engine == "numpy":
+            self.levels[h + 1] = np.concatenate((self.levels[h + 1], promoted))
+            self.levels[h] = stay
+        else:
+            self.levels[h + 1].extend(promoted)
+            self.levels[h] = list(stay)
+
+    def _compact_runs(self, h: int) -> None:
+        width = self.k + self.k % 2
+        items = self.levels[h]
+        runs = (len(items) - self.capacity(h)) // width
+        if runs <= 0:
+            return
+        if h + 1 == len(self.levels):
+            self.levels.append(self._empty())
+        bits = self.rng.getrandbits(runs)  # offset of run r: bit r
+        if self.engine == "numpy":
+            offsets = np.unpackbits(np.frombuffer(bits.to_bytes(-(-runs // 8), "little"), dtype=np.uint8),
+                                    count=runs, bitorder="little").astype(np.intp)
+            block = np.sort(items[:runs * width].reshape(runs, width), axis=1)
+            promoted = block[np.arange(runs)[:, None], offsets[:, None] + np.arange(0, width, 2)].ravel()
+            self.levels[h + 1] = np.concatenate((self.levels[h + 1], promoted))
+            self.levels[h] = items[runs * width:].copy()
+        else:
+            up = self.levels[h + 1]
+            for r in range(runs):
+                up.extend(sorted(items[r * width:(r + 1) * width])[(bits >> r) & 1::2])
+            self.levels[h] = items[runs * width:]
+
+    def _weighted(self) -> Tuple[List[int], List[int]]:
+        """Kept items in ascending order, with their cumulative weights."""
+        pairs = sorted((v, 1 << h) for h, level in enumerate(self.levels)
+                       for v in (level.tolist() if self.engine == "numpy" else level))
+        return [v for v, _ in pairs], list(accumulate(w for _, w in pairs))
+
+    def quantile(self, q: float) -> int:
+        """Smallest kept key with an estimated rank >= q * n."""
+        values, cum = self._weighted()
+        if not values:
+            raise ValueError("empty sketch")
+        return values[min(len(values) - 1, bisect.bisect_left(cum, q * self.n))]
+
+    def rank(self, key: int) -> int:
+        """Estimated number of keys <= key."""
+        values, cum = self._weighted()
+        i = bisect.bisect_right(values, key)
+        return cum[i - 1] if i else 0
+
+
+def key_orders(trace: KeySource | None) -> Tuple[Tuple[str, str], ...]:
+    """(result name, key mode) of the overall views: both synthetic orders, or the trace/workload stream."""
+    if trace is not None:
+        return (("trace_all", "trace"),)
+    return (("sequential_all", "sequential"), ("random_all", "random"))
+
+
+def key_stream(n_keys: int, mode: str = "sequential", trace: KeySource | None = None) -> Iterator[int]:
+    """iter_keys, or the keys of the trace or workload being replayed."""
+    return trace.keys() if trace is not None else iter_keys(n_keys, mode=mode)
+
+
+def key_batches(n_keys: int, mode: str = "sequential", trace: KeySource | None = None) -> Iterator["np.ndarray"]:
+    """gen_key_batches, or the key batches of the trace or workload being replayed."""
+    return trace.batches() if trace is not None else gen_key_batches(n_keys, mode=mode)
+
+
+def domain_splits(n_shards: int, n_keys: int, trace: KeySource | None = None) -> List[int]:
+    """even_splits over 1..n_keys, or over the key range of the trace or workload."""
+    if trace is None:
+        return even_splits(n_shards, n_keys)
+    st = trace.stats()
+    return even_splits(n_shards, st.max_key, st.min_key)
+
+
+def sha1_mod_batch(keys: "np.ndarray", shards: int) -> "np.ndarray":
+    """sha1_mod over an array: same values as [sha1_mod(k, shards) for k in keys]. hashlib is still
+    called once per key; only the modulo of the digests is vectorized."""
+    sha1 = hashlib.sha1
+    with profile_phase("hashing", len(keys)):
+        raw = b"".join(sha1(str(k).encode("utf-8")).digest() for k in keys.tolist())
+        digests = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 20)
+    # int(hexdigest, 16) % shards, reduced byte by byte (Horner) over the whole batch
+    with profile_phase("routing", len(keys)):
+        acc = np.zeros(len(digests), dtype=np.int64)
+        for col in range(digests.shape[1]):
+            acc = (acc * 256 + digests[:, col]) % shards
+    return acc
+
+
+def _rotl64(x: "np.ndarray", r: int) -> "np.ndarray":
+    return (x << np.uint64(r)) | (x >> np.uint64(64 - r))
+
+
+def xxh64_batch(keys: "np.ndarray") -> "np.ndarray":
+    """Vectorized xxh64_digest (uint64 arithmetic wraps like the masked Python version)."""
+    k = keys.astype(np.uint64)
+    with np.errstate(over="ignore"):
+        k1 = _rotl64(k * np.uint64(XXH_P2), 31) * np.uint64(XXH_P1)
+        h = np.uint64((XXH_P5 + 8) & MASK64) ^ k1
+        h = _rotl64(h, 27) * np.uint64(XXH_P1) + np.uint64(XXH_P4)
+        h ^= h >> np.uint64(33)
+        h *= np.uint64(XXH_P2)
+        h ^= h >> np.uint64(29)
+        h *= np.uint64(XXH_P3)
+        h ^= h >> np.uint64(32)
+    return h
+
+
+def murmur3_batch(keys: "np.ndarray") -> "np.ndarray":
+    """Vectorized murmur3_digest, widened to uint64."""
+    k64 = keys.astype(np.uint64)
+    h = np.zeros(len(k64), dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        for block in ((k64 & np.uint64(MASK32)).astype(np.uint32), (k64 >> np.uint64(32)).astype(np.uint32)):
+            k = block * np.uint32(MURMUR_C1)
+            k = (k << np.uint32(15)) | (k >> np.uint32(17))
+            k *= np.uint32(MURMUR_C2)
+            h ^= k
+            h = (h << np.uint32(13)) | (h >> np.uint32(19))
+            h = h * np.uint32(5) + np.uint32(0xE6546B64)
+        h ^= np.uint32(8)
+        h ^= h >> np.uint32(16)
+        h *= np.uint32(0x85EBCA6B)
+        h ^= h >> np.uint32(13)
+        h *= np.uint32(0xC2B2AE35)
+        h ^= h >> np.uint32(16)
+    return h.astype(np.uint64)
+
+
+def yb16_batch(keys: "np.ndarray") -> "np.ndarray":
+    h = xxh64_batch(keys)
+    return (h ^ (h >> np.uint64(16)) ^ (h >> np.uint64(32)) ^ (h >> np.uint64(48))) & np.uint64(0xFFFF)
+
+
+def jump_hash_batch(h: "np.ndarray", buckets: int) -> "np.ndarray":
+    """Vectorized jump_hash: iterate only the keys still jumping (O(log buckets) rounds)."""
+    key = h.astype(np.uint64)
+    b = np.full(len(key), -1, dtype=np.int64)
+    j = np.zeros(len(key), dtype=np.int64)
+    active = np.nonzero(j < buckets)[0]
+    with np.errstate(over="ignore"):
+        while len(active):
+            b[active] = j[active]
+            key[active] = key[active] * np.uint64(JUMP_LCG) + np.uint64(1)
+            denom = ((key[active] >> np.uint64(33)) + np.uint64(1)).astype(np.float64)
+            j[active] = ((b[active] + 1) * (float(1 << 31) / denom)).astype(np.int64)
+            active = active[j[active] < buckets]
+    return b
+
+
+DIGEST_BATCH: Dict[str, Callable[["np.ndarray"], "np.ndarray"]] = {
+    "murmur3": murmur3_batch,
+    "xxhash-style": xxh64_batch,
+    "yb16": yb16_batch,
+    "jump": xxh64_batch,
+}
+
+
+def hash_shard_batch(keys: "np.ndarray", shards: int, hash_scheme: str = "sha1") -> "np.ndarray":
+    """Vectorized hash_shard (sha1 digests exceed 64 bits and go through sha1_mod_batch)."""
+    if hash_scheme == "sha1":
+        return sha1_mod_batch(keys, shards)
+    with profile_phase("hashing", len(keys)):
+        h = DIGEST_BATCH[hash_scheme](keys)
+    with profile_phase("routing", len(keys)):
+        if hash_scheme == "jump":
+            return jump_hash_batch(h, shards)
+        if hash_scheme == "yb16":
+            yb16_place(0, shards)  # validates the tablet count
+            return np.minimum(h // np.uint64(0xFFFF // shards), np.uint64(shards - 1)).astype(np.int64)
+        return (h % np.uint64(shards)).astype(np.int64)
+
+
+def salt_batch(keys: "np.ndarray", buckets: int, hash_scheme: str = "sha1") -> "np.ndarray":
+    """Vectorized salt_of."""
+    if buckets <= 1:
+        return np.zeros(len(keys), dtype=np.int64)
+    if hash_scheme == "sha1":
+        return sha1_mod_batch(keys, buckets)
+    with profile_phase("hashing", len(keys)):
+        h = DIGEST_BATCH[hash_scheme](keys)
+    with profile_phase("routing", len(keys)):
+        return (h % np.uint64(buckets)).astype(np.int64)
+
+
+def assign_range_batch(keys: "np.ndarray", splits: List[int]) -> "np.ndarray":
+    """Vectorized assign_range: key <= s goes left, i.e. searchsorted(side='left') on the splits."""
+    with profile_phase("routing", len(keys)):
+        return np.searchsorted(np.asarray(splits, dtype=np.int64), keys, side="left")
+
+
+def route_batch(strategy: str, keys: "np.ndarray", shards: int, splits: List[int] | None, hash_scheme: str = "sha1") -> "np.ndarray":
+    if strategy == "hash":
+        return hash_shard_batch(keys, shards, hash_scheme)
+    assert splits is not None
+    return assign_range_batch(keys, splits)
+
+
 def even_splits(n_shards: int, max_key: int, min_key: int = 1) -> List[int]:
     if n_shards <= 1:
         return []
@@ -91,46 +1099,413 @@ def even_splits(n_shards: int, max_key: int, min_key: int = 1) -> List[int]:
     return splits
 
 
-def simulate(strategy: str, shards: int, n_keys: int, splits: List[int] | None) -> Dict[str, List[int]]:
+class RangeRouter:
+    """Dynamic range table: split points, per-range key counts and range -> node ownership.
+
+    Range i covers (splits[i-1], splits[i]] exactly like assign_range, and lookups are a
+    bisect over the split points (O(log ranges)). State lives in compact typed arrays:
+    - splits: ascending split points (len = ranges - 1)
+    - counts: keys per range
+    - owners: node owning each range (round-robin at start, all 0 when nodes == 0)
+    - node_counts: keys per node, always the sum of counts over the ranges each node owns
+    - hits: ops per range since the last reset_hits() (load, as opposed to size)
+    """
+
+    def __init__(self, splits: Iterable[int] = (), nodes: int = 0):
+        self.splits = array("q", splits)
+        if any(self.splits[i] <= self.splits[i - 1] for i in range(1, len(self.splits))):
+            raise ValueError("splits must be strictly ascending integers")
+        self.nodes = max(0, nodes)
+        ranges = len(self.splits) + 1
+        self.counts = array("q", [0] * ranges)
+        self.owners = array("i", [(i % self.nodes) if self.nodes else 0 for i in range(ranges)])
+        self.node_counts = array("q", [0] * self.nodes)
+        self.hits = array("q", [0] * ranges)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def lookup(self, key: int) -> int:
+        """Index of the range holding key."""
+        return bisect.bisect_left(self.splits, key)
+
+    def add(self, key: int, n: int = 1) -> int:
+        """Route key, count it on its range (and node), and return the range index."""
+        idx = bisect.bisect_left(self.splits, key)
+        self.counts[idx] += n
+        self.hits[idx] += n
+        if self.nodes:
+            self.node_counts[self.owners[idx]] += n
+        return idx
+
+    def lower(self, idx: int) -> int | None:
+        """Exclusive lower bound of range idx (None for the first range)."""
+        return self.splits[idx - 1] if idx > 0 else None
+
+    def upper(self, idx: int) -> int | None:
+        """Inclusive upper bound of range idx (None for the last range)."""
+        return self.splits[idx] if idx < len(self.splits) else None
+
+    def split(self, idx: int, key: int, node: int | None = None, right_count: int = 0, right_hits: int = 0) -> int:
+        """Split range idx at key into (lo, key] and (key, hi]; return the new right range index.
+        The right range is owned by `node` (default: the left range's node) and takes
+        `right_count` of the keys counted so far (default 0: counts are not redistributed)
+        and `right_hits` of the current load window.
+        """
+        lo, hi = self.lower(idx), self.upper(idx)
+        if (lo is not None and key <= lo) or (hi is not None and key >= hi):
+            raise ValueError(f"split key {key} is outside range {idx} ({lo}, {hi}]")
+        if not 0 <= right_count <= self.counts[idx]:
+            raise ValueError("right_count must be between 0 and the range count")
+        if not 0 <= right_hits <= self.hits[idx]:
+            raise ValueError("right_hits must be between 0 and the range hits")
+        left_node = self.owners[idx]
+        right_node = left_node if node is None else node
+        self.splits.insert(idx, key)
+        self.counts[idx] -= right_count
+        self.counts.insert(idx + 1, right_count)
+        self.owners.insert(idx + 1, right_node)
+        self.hits[idx] -= right_hits
+        self.hits.insert(idx + 1, right_hits)
+        if self.nodes:
+            self.node_counts[left_node] -= right_count
+            self.node_counts[right_node] += right_count
+        return idx + 1
+
+    def merge(self, idx: int) -> None:
+        """Merge range idx+1 into range idx; the merged range keeps the left range's node."""
+        if not 0 <= idx < len(self.splits):
+            raise ValueError(f"no range to the right of range {idx}")
+        moved = self.counts[idx + 1]
+        if self.nodes:
+            self.node_counts[self.owners[idx + 1]] -= moved
+            self.node_counts[self.owners[idx]] += moved
+        self.counts[idx] += moved
+        self.hits[idx] += self.hits[idx + 1]
+        del self.splits[idx]
+        del self.counts[idx + 1]
+        del self.owners[idx + 1]
+        del self.hits[idx + 1]
+
+    def move(self, idx: int, node: int) -> None:
+        """Reassign range idx (and its keys) to node."""
+        if self.nodes:
+            self.node_counts[self.owners[idx]] -= self.counts[idx]
+            self.node_counts[node] += self.counts[idx]
+        self.owners[idx] = node
+
+    def node_hits(self) -> List[int]:
+        """Ops per node in the current load window."""
+        out = [0] * self.nodes
+        for owner, h in zip(self.owners, self.hits):
+            out[owner] += h
+        return out
+
+    def reset_hits(self) -> None:
+        self.hits = array("q", [0] * len(self.counts))
+
+
+class NodeLoadHeap:
+    """Priority queues over node loads: lightest() and heaviest() in O(log nodes).
+    update() pushes a fresh entry; stale entries are skipped lazily when they reach the top.
+    Ties resolve to the lowest node index.
+    """
+
+    def __init__(self, loads: Iterable[float]):
+        self.loads = list(loads)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._min = [(load, n) for n, load in enumerate(self.loads)]
+        self._max = [(-load, n) for n, load in enumerate(self.loads)]
+        heapq.heapify(self._min)
+        heapq.heapify(self._max)
+
+    def update(self, node: int, load: float) -> None:
+        self.loads[node] = load
+        if len(self._min) > 4 * len(self.loads) + 64:
+            self._rebuild()
+            return
+        heapq.heappush(self._min, (load, node))
+        heapq.heappush(self._max, (-load, node))
+
+    def lightest(self) -> int:
+        while self._min[0][0] != self.loads[self._min[0][1]]:
+            heapq.heappop(self._min)
+        return self._min[0][1]
+
+    def refresh_lightest(self, loads: List[int] | array) -> int:
+        """lightest() over live `loads` that have only grown since they were pushed (keys are only
+        added, e.g. RangeRouter.node_counts): out-of-date entries reaching the top are re-pushed
+        with their current load, so a lookup only touches the nodes that changed."""
+        while True:
+            load, n = self._min[0]
+            if load == loads[n]:
+                return n
+            heapq.heappop(self._min)
+            self.update(n, loads[n])
+
+    def heaviest(self) -> int:
+        while -self._max[0][0] != self.loads[self._max[0][1]]:
+            heapq.heappop(self._max)
+        return self._max[0][1]
+
+
+def simulate_numpy(strategy: str, shards: int, n_keys: int, splits: List[int] | None, hash_scheme: str = "sha1", trace: KeySource | None = None) -> Dict[str, List[int]]:
+    """Array-batch version of simulate: same histograms, keys routed BATCH_SIZE at a time."""
+    result: Dict[str, List[int]] = {}
+    for name, mode in key_orders(trace):
+        counts = np.zeros(shards, dtype=np.int64)
+        for keys in profile_batches(key_batches(n_keys, mode, trace)):
+            assigns = route_batch(strategy, keys, shards, splits, hash_scheme)
+            with profile_phase("histogram", len(keys)):
+                counts += np.bincount(assigns, minlength=shards)
+        result[name] = counts.tolist()
+    return result
+
+
+@profiled
+def simulate(strategy: str, shards: int, n_keys: int, splits: List[int] | None, engine: str = "python", workers: int = 0, hash_scheme: str = "sha1", trace: KeySource | None = None) -> Dict[str, List[int]]:
+    """Overall histograms: sequential_all and random_all over 1..n_keys, or trace_all for a trace."""
+    if workers > 0:
+        return simulate_parallel(strategy, shards, n_keys, splits, workers, engine=engine, hash_scheme=hash_scheme, trace=trace)
+    if resolve_engine(engine) == "numpy":
+        return simulate_numpy(strategy, shards, n_keys, splits, hash_scheme=hash_scheme, trace=trace)
     result: Dict[str, List[int]] = {}
-    # Sequential overall
-    seq_keys = gen_keys(n_keys, mode="sequential")
+    for name, mode in key_orders(trace):
+        counts = [0] * shards
+        for _, counts in route_chunks(strategy, shards, n_keys, splits, mode=mode, hash_scheme=hash_scheme, trace=trace):
+            pass
+        result[name] = counts
+    return result
+
+
+def simulate_progress_numpy(strategy: str, shards: int, n_keys: int, splits: List[int] | None, steps: int = 5, hash_scheme: str = "sha1", trace: KeySource | None = None) -> List[Tuple[int, List[int]]]:
+    """Array-batch version of simulate_progress: one pass, batches are cut at the checkpoints."""
+    checkpoints = progress_checkpoints(n_keys, steps)
+    counts = np.zeros(shards, dtype=np.int64)
+    out: List[Tuple[int, List[int]]] = []
+    seen = 0
+    for keys in profile_batches(key_batches(n_keys, "sequential", trace)):
+        assigns = route_batch(strategy, keys, shards, splits, hash_scheme)
+        lo = 0
+        while len(out) < steps and checkpoints[len(out)] <= seen + len(assigns):
+            cut = checkpoints[len(out)] - seen
+            with profile_phase("histogram", cut - lo):
+                counts += np.bincount(assigns[lo:cut], minlength=shards)
+            lo = cut
+            with profile_phase("snapshot"):
+                out.append((int(100 * (len(out) + 1) / steps), counts.tolist()))
+        with profile_phase("histogram", len(assigns) - lo):
+            counts += np.bincount(assigns[lo:], minlength=shards)
+        seen += len(assigns)
+    # Checkpoints beyond the key space (n_keys < steps) see the final counts
+    while len(out) < steps:
+        out.append((int(100 * (len(out) + 1) / steps), counts.tolist()))
+    return out
+
+
+def route_chunks(strategy: str, shards: int, n_keys: int, splits: List[int] | None, mode: str = "sequential",
+                 cuts: Iterable[int] = (), hash_scheme: str = "sha1", trace: KeySource | None = None) -> Iterator[Tuple[int, List[int]]]:
+    """Pure-Python routing of BATCH_SIZE chunks (also cut at `cuts`), with key generation, hashing,
+    routing and counting as separate phases when profiling. Yields (keys routed so far, running
+    counts) after each chunk.
+    """
+    keys = key_stream(n_keys, mode, trace)
+    counts = [0] * shards
     if strategy == "hash":
-        assigns = [sha1_mod(k, shards) for k in seq_keys]
+        digest, place = PARTITIONERS[hash_scheme].digest, PARTITIONERS[hash_scheme].place
     else:
         assert splits is not None
-        assigns = [assign_range(k, splits) for k in seq_keys]
-    result["sequential_all"] = histogram(assigns, shards)
+    for start, size in plan_chunks(n_keys, cuts, chunk=BATCH_SIZE):
+        with profile_phase("keygen", size):
+            chunk = list(islice(keys, size))
+        if strategy == "hash":
+            with profile_phase("hashing", size):
+                digests = list(map(digest, chunk))
+            with profile_phase("routing", size):
+                assigns = [place(h, shards) for h in digests]
+        else:
+            with profile_phase("routing", size):
+                assigns = [bisect.bisect_left(splits, k) for k in chunk]
+        with profile_phase("histogram", size):
+            for a in assigns:
+                counts[a] += 1
+        yield start + size, counts
+
+
+@profiled
+def simulate_progress(strategy: str, shards: int, n_keys: int, splits: List[int] | None, steps: int = 5, engine: str = "python", workers: int = 0, hash_scheme: str = "sha1", trace: KeySource | None = None) -> List[Tuple[int, List[int]]]:
+    """Sequential ingest progress: after t% of keys inserted (or replayed), what's the shard distribution so far?"""
+    if workers > 0:
+        return simulate_progress_parallel(strategy, shards, n_keys, splits, steps, workers, engine=engine, hash_scheme=hash_scheme, trace=trace)
+    if resolve_engine(engine) == "numpy":
+        return simulate_progress_numpy(strategy, shards, n_keys, splits, steps=steps, hash_scheme=hash_scheme, trace=trace)
+    # Single pass over a lazy key stream, in chunks cut at the checkpoints; running counters are
+    # snapshotted there, so memory depends on shards x steps, not on the number of keys.
+    checkpoints = progress_checkpoints(n_keys, steps)
+    counts = [0] * shards
+    out: List[Tuple[int, List[int]]] = []
+    for seen, counts in route_chunks(strategy, shards, n_keys, splits, cuts=checkpoints, hash_scheme=hash_scheme, trace=trace):
+        while len(out) < steps and checkpoints[len(out)] == seen:
+            with profile_phase("snapshot"):
+                out.append((int(100 * (len(out) + 1) / steps), counts.copy()))
+    # Checkpoints beyond the key space (n_keys == 0) see the final counts
+    while len(out) < steps:
+        out.append((int(100 * (len(out) + 1) / steps), counts.copy()))
+    return out
 
-    # Random overall
-    rnd_keys = gen_keys(n_keys, mode="random")
-    if strategy == "hash":
-        assigns = [sha1_mod(k, shards) for k in rnd_keys]
+
+def plan_chunks(n_keys: int, cuts: Iterable[int] = (), chunk: int = PARALLEL_CHUNK) -> List[Tuple[int, int]]:
+    """Split 0..n_keys into (start, size) pieces on the `chunk` grid, also cut at `cuts`."""
+    bounds = set(range(0, n_keys, chunk)) | {c for c in cuts if 0 < c < n_keys}
+    edges = sorted(bounds) + [n_keys]
+    return [(lo, hi - lo) for lo, hi in zip(edges, edges[1:]) if hi > lo]
+
+
+def _count_chunk(task: Tuple) -> Tuple[List[int], List[int]]:
+    """Worker: route one chunk of keys, return (per-shard counts, per-bucket counts).
+    Keys are 1 + start .. start + size (sequential), the keys seeded_keys(seed) draws over
+    1..n_keys (random: the same keys as this chunk of iter_keys) or records start .. start + size
+    of a trace, so a chunk's result only depends on its task tuple.
+    """
+    n_keys, start, size, mode, seed, strategy, shards, splits, buckets, engine, hash_scheme, trace = task
+    width = len(splits) + 1 if strategy == "range" else shards
+    if engine == "numpy":
+        if trace is not None:
+            keys = np.concatenate([np.empty(0, dtype=np.int64), *trace.batches(start, start + size)])
+        elif mode == "sequential":
+            keys = np.arange(1 + start, 1 + start + size, dtype=np.int64)
+        else:
+            keys = np.fromiter(seeded_keys(seed, size, 1, n_keys), dtype=np.int64, count=size)
+        per_shard = np.bincount(route_batch(strategy, keys, shards, splits, hash_scheme), minlength=width).tolist()
+        per_bucket: List[int] = []
+        if buckets > 0:
+            per_bucket = np.bincount(salt_batch(keys, buckets, hash_scheme), minlength=buckets).tolist()
+        return per_shard, per_bucket
+    if trace is not None:
+        keys_it: Iterable[int] = list(trace.keys(start, start + size))
+    elif mode == "sequential":
+        keys_it = range(1 + start, 1 + start + size)
     else:
-        assert splits is not None
-        assigns = [assign_range(k, splits) for k in rnd_keys]
-    result["random_all"] = histogram(assigns, shards)
+        keys_it = list(seeded_keys(seed, size, 1, n_keys))
+    route = router_for(strategy, shards, splits, hash_scheme)
+    per_shard = histogram(map(route, keys_it), width)
+    per_bucket = histogram((salt_of(k, buckets, hash_scheme) for k in keys_it), buckets) if buckets > 0 else []
+    return per_shard, per_bucket
+
+
+POOL: ProcessPoolExecutor | None = None  # shared by run_chunks inside worker_pool()
+
+
+@contextlib.contextmanager
+def worker_pool(workers: int) -> Iterator[None]:
+    """Share one process pool between every run_chunks call in the block (main() wraps the
+    whole run; nested blocks reuse the open pool)."""
+    global POOL
+    if workers <= 1 or POOL is not None:
+        yield
+        return
+    POOL = ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield
+    finally:
+        POOL.shutdown()
+        POOL = None
+
+
+def run_chunks(tasks: List[Tuple], workers: int) -> List[Tuple[List[int], List[int]]]:
+    """Run chunk tasks in the process pool (in-process when workers <= 1); results keep task order."""
+    if workers <= 1 or len(tasks) <= 1:
+        return [_count_chunk(t) for t in tasks]
+    with worker_pool(workers):
+        return list(POOL.map(_count_chunk, tasks))
+
+
+def sum_counts(vectors: Iterable[List[int]], width: int) -> List[int]:
+    total = [0] * width
+    for vec in vectors:
+        for i, c in enumerate(vec):
+            total[i] += c
+    return total
+
+
+def chunk_tasks(n_keys: int, mode: str, pieces: List[Tuple[int, int]], strategy: str, shards: int,
+                splits: List[int] | None, buckets: int = 0, engine: str = "python", hash_scheme: str = "sha1",
+                trace: KeySource | None = None) -> List[Tuple]:
+    # Random mode: the pieces are the PARALLEL_CHUNK grid and take the seeds of iter_keys, so
+    # random.seed(x) gives the serial keys for any number of workers.
+    if trace is not None and not trace.sliceable:
+        raise ValueError("--workers replays binary traces without an op filter only")
+    if mode == "random":
+        assert pieces == plan_chunks(n_keys), "random keys are chunked on the PARALLEL_CHUNK grid"
+        seeds = random_chunk_seeds(n_keys)
+    else:
+        seeds = [0] * len(pieces)
+    return [(n_keys, start, size, mode, seed, strategy, shards, splits, buckets, engine, hash_scheme, trace)
+            for (start, size), seed in zip(pieces, seeds)]
+
 
+@profiled
+def simulate_parallel(strategy: str, shards: int, n_keys: int, splits: List[int] | None, workers: int, engine: str = "python", hash_scheme: str = "sha1", trace: KeySource | None = None) -> Dict[str, List[int]]:
+    """simulate() over a process pool: chunks return count vectors that are summed.
+    Identical to the serial histograms, random keys included (see iter_keys).
+    """
+    engine = resolve_engine(engine)
+    result: Dict[str, List[int]] = {}
+    with worker_pool(workers):
+        for name, mode in key_orders(trace):
+            tasks = chunk_tasks(n_keys, mode, plan_chunks(n_keys), strategy, shards, splits, engine=engine, hash_scheme=hash_scheme, trace=trace)
+            result[name] = sum_counts((c for c, _ in run_chunks(tasks, workers)), shards)
     return result
 
 
-def simulate_progress(strategy: str, shards: int, n_keys: int, splits: List[int] | None, steps: int = 5) -> List[Tuple[int, List[int]]]:
-    """Sequential ingest progress: after t% of keys inserted, what's the shard distribution so far?"""
-    seq_keys = gen_keys(n_keys, mode="sequential")
+@profiled
+def simulate_progress_parallel(strategy: str, shards: int, n_keys: int, splits: List[int] | None, steps: int, workers: int, engine: str = "python", hash_scheme: str = "sha1", trace: KeySource | None = None) -> List[Tuple[int, List[int]]]:
+    """simulate_progress() over a process pool: chunks are also cut at the checkpoints and
+    their count vectors are prefix-summed in key order. Identical to the serial result."""
+    engine = resolve_engine(engine)
+    checkpoints = progress_checkpoints(n_keys, steps)
+    pieces = plan_chunks(n_keys, cuts=checkpoints)
+    tasks = chunk_tasks(n_keys, "sequential", pieces, strategy, shards, splits, engine=engine, hash_scheme=hash_scheme, trace=trace)
+    counts = [0] * shards
     out: List[Tuple[int, List[int]]] = []
-    for frac in range(1, steps + 1):
-        upto = max(1, (n_keys * frac) // steps)
-        part = seq_keys[:upto]
-        if strategy == "hash":
-            assigns = [sha1_mod(k, shards) for k in part]
-        else:
-            assert splits is not None
-            assigns = [assign_range(k, splits) for k in part]
-        out.append((int(100 * frac / steps), histogram(assigns, shards)))
+    for (start, size), (vec, _) in zip(pieces, run_chunks(tasks, workers)):
+        for i, c in enumerate(vec):
+            counts[i] += c
+        while len(out) < steps and checkpoints[len(out)] == start + size:
+            out.append((int(100 * (len(out) + 1) / steps), counts.copy()))
+    while len(out) < steps:
+        out.append((int(100 * (len(out) + 1) / steps), counts.copy()))
     return out
 
 
-def simulate_progress_range_autosplit(n_keys: int, initial_splits: List[int], steps: int = 5, threshold: float = 0.4, autosplit_where: str = "current") -> List[Tuple[int, List[int], List[int]]]:
+def tail_autosplit(router: RangeRouter, idx: int, key: int, total: int, threshold: float,
+                   autosplit_where: str = "current", heap: NodeLoadHeap | None = None) -> bool:
+    """Split the last range once it holds more than `threshold` of the `total` keys seen so far.
+    `key` was just routed to range `idx`. The split point is that key ('current') or the middle of
+    the last range ('middle'). The left part keeps its node; with a `heap` over router.node_counts
+    (rebalance after split), the right part goes to the least loaded node. Returns True when a
+    split happened.
+    """
+    last_idx = len(router) - 1
+    if idx != last_idx or total <= 1 or router.counts[last_idx] / total <= threshold:
+        return False
+    splits = router.splits
+    last_start = (splits[-1] + 1) if splits else 1
+    split_key = key if autosplit_where == "current" else (last_start + key) // 2
+    # Only split if strictly increasing
+    if splits and split_key <= splits[-1]:
+        return False
+    with profile_phase("autosplit"):
+        target = heap.refresh_lightest(router.node_counts) if heap is not None else None
+        router.split(last_idx, split_key, node=target)
+    return True
+
+
+@profiled
+def simulate_progress_range_autosplit(n_keys: int, initial_splits: List[int], steps: int = 5, threshold: float = 0.4, autosplit_where: str = "current",
+                                      trace: KeySource | None = None) -> List[Tuple[int, List[int], List[int]]]:
     """
     Simulate sequential ingest with dynamic auto-splitting for range sharding.
     - Starts with given split points.
@@ -141,47 +1516,33 @@ def simulate_progress_range_autosplit(n_keys: int, initial_splits: List[int], st
     Notes:
     - The number of ranges grows over time. We report per-range counts (labelled as 'range').
     - This models a simple split policy focusing on the hotspot (tail) in monotonic inserts.
+    - With a trace, its keys arrive in file order instead of 1..N; splits still only move forward.
     """
     if threshold <= 0 or threshold >= 1:
         raise ValueError("threshold must be between 0 and 1 (e.g., 0.4)")
 
-    splits = list(initial_splits)
-    # counts per range = len(splits)+1
-    counts: List[int] = [0] * (len(splits) + 1)
+    router = RangeRouter(initial_splits)
     out: List[Tuple[int, List[int], List[int]]] = []
 
-    checkpoints = [max(1, (n_keys * frac) // steps) for frac in range(1, steps + 1)]
-    checkpoint_set = set(checkpoints)
-
-    for i in range(1, n_keys + 1):
-        # assign to current range
-        idx = assign_range(i, splits)
-        # ensure counts size matches splits
-        if len(counts) != len(splits) + 1:
-            # reinit counts shape if needed (shouldn't happen here)
-            counts = counts + [0] * (len(splits) + 1 - len(counts))
-        counts[idx] += 1
-
-        # auto-split only considers the last range (tail hotspot in sequential ingest)
-        last_idx = len(splits)  # index of last range
-        total_so_far = i
-        if idx == last_idx and total_so_far > 1:
-            if counts[last_idx] / total_so_far > threshold:
-                # Determine split point
-                last_start = (splits[-1] + 1) if splits else 1
-                split_key = i if autosplit_where == "current" else (last_start + i) // 2
-                # Only split if strictly increasing
-                if not splits or split_key > splits[-1]:
-                    splits.append(split_key)
-                    counts.append(0)
+    checkpoint_set = set(progress_checkpoints(n_keys, steps))
 
-        if i in checkpoint_set:
-            pct = int(round(100 * i / n_keys))
-            out.append((pct, counts.copy(), splits.copy()))
+    # Per-key split checks are charged to routing; the splits themselves to autosplit
+    with profile_phase("routing", n_keys):
+        for i, k in enumerate(trace.keys() if trace is not None else range(1, n_keys + 1), start=1):
+            # assign to current range
+            idx = router.add(k)
+            # auto-split only considers the last range (tail hotspot in sequential ingest)
+            tail_autosplit(router, idx, k, i, threshold, autosplit_where)
+
+            if i in checkpoint_set:
+                pct = int(round(100 * i / n_keys))
+                with profile_phase("snapshot"):
+                    out.append((pct, router.counts.tolist(), router.splits.tolist()))
 
     return out
 
 
+@profiled
 def simulate_progress_range_autosplit_with_nodes(
     n_keys: int,
     initial_splits: List[int],
@@ -190,6 +1551,8 @@ def simulate_progress_range_autosplit_with_nodes(
     autosplit_where: str = "current",
     nodes: int = 0,
     rebalance_after_split: bool = False,
+    router: RangeRouter | None = None,
+    trace: KeySource | None = None,
 ) -> List[Tuple[int, List[int], List[int], List[int]]]:
     """
     Auto-split progression with range-to-node mapping and optional rebalance.
@@ -198,83 +1561,196 @@ def simulate_progress_range_autosplit_with_nodes(
         * left subrange keeps its node
         * right subrange goes to either the same node or to the least-loaded node if rebalance_after_split is True
     Returns a list of (percent, counts_per_range, splits, counts_per_node).
+    Pass `router` (built with the same nodes) to keep the final range table, e.g. for resharding.
     """
     if threshold <= 0 or threshold >= 1:
         raise ValueError("threshold must be between 0 and 1 (e.g., 0.4)")
     if nodes <= 0:
         nodes = 0
 
-    splits = list(initial_splits)
-    counts: List[int] = [0] * (len(splits) + 1)
-    node_counts: List[int] = [0] * nodes if nodes > 0 else []
-    # range -> node mapping
-    range_nodes: List[int] = []
-    if nodes > 0:
-        # Round-robin initial assignment across existing ranges
-        rngs = len(splits) + 1
-        range_nodes = [(i % nodes) for i in range(rngs)]
+    if router is None:
+        router = RangeRouter(initial_splits, nodes=nodes)
     out: List[Tuple[int, List[int], List[int], List[int]]] = []
 
-    checkpoints = [max(1, (n_keys * frac) // steps) for frac in range(1, steps + 1)]
-    checkpoint_set = set(checkpoints)
-
-    for i in range(1, n_keys + 1):
-        idx = assign_range(i, splits)
-        # ensure structure sizes match
-        if len(counts) != len(splits) + 1:
-            counts = counts + [0] * (len(splits) + 1 - len(counts))
-        if nodes > 0 and len(range_nodes) != len(splits) + 1:
-            # extend mapping for new range(s)
-            range_nodes += [range_nodes[-1] if range_nodes else 0] * ((len(splits) + 1) - len(range_nodes))
-
-        counts[idx] += 1
-        if nodes > 0:
-            node = range_nodes[idx]
-            node_counts[node] += 1
-
-        last_idx = len(splits)
-        total_so_far = i
-        if idx == last_idx and total_so_far > 1:
-            if counts[last_idx] / total_so_far > threshold:
-                last_start = (splits[-1] + 1) if splits else 1
-                split_key = i if autosplit_where == "current" else (last_start + i) // 2
-                if not splits or split_key > splits[-1]:
-                    # perform split
-                    splits.append(split_key)
-                    counts.append(0)
-                    if nodes > 0:
-                        # left stays on current node
-                        left_node = range_nodes[last_idx] if range_nodes else 0
-                        # right node choice
-                        if rebalance_after_split:
-                            # least loaded node by node_counts
-                            target = min(range(nodes), key=lambda n: node_counts[n]) if nodes > 0 else left_node
-                        else:
-                            target = left_node
-                        range_nodes.append(target)
-                        # Note: we do not reassign old ranges or retroactively move counts
+    checkpoint_set = set(progress_checkpoints(n_keys, steps))
+    # Least loaded node for the right part of each split, without a scan over the nodes
+    heap = NodeLoadHeap(router.node_counts) if (router.nodes > 0 and rebalance_after_split) else None
 
-        if i in checkpoint_set:
-            pct = int(round(100 * i / n_keys))
-            out.append((pct, counts.copy(), splits.copy(), node_counts.copy() if nodes > 0 else []))
+    with profile_phase("routing", n_keys):
+        for i, k in enumerate(trace.keys() if trace is not None else range(1, n_keys + 1), start=1):
+            idx = router.add(k)
+            # Note: we do not reassign old ranges or retroactively move counts
+            tail_autosplit(router, idx, k, i, threshold, autosplit_where, heap)
+
+            if i in checkpoint_set:
+                pct = int(round(100 * i / n_keys))
+                with profile_phase("snapshot"):
+                    out.append((pct, router.counts.tolist(), router.splits.tolist(), router.node_counts.tolist()))
 
     return out
 
 
-def simulate_range_with_salt(n_keys: int, splits: List[int], buckets: int) -> Dict[str, List[int]]:
+class LoadSplitStep(NamedTuple):
+    """Snapshot of the load-based split simulation at a progress checkpoint."""
+    pct: int
+    counts: List[int]  # keys per range
+    splits: List[int]
+    node_counts: List[int]  # keys per node
+    node_qps: List[float]  # ops/s per node over the last load window
+    splits_done: int  # load-based splits so far
+    moves: int  # ranges moved by the rebalancer so far
+
+
+def rebalance_ranges(router: RangeRouter, heap: NodeLoadHeap, tolerance: float, max_moves: int) -> int:
+    """Move ranges (by window hits) from the heaviest to the lightest node while the heaviest node
+    is more than `tolerance` above the mean and a move narrows the gap. Returns the number of moves."""
+    nodes = len(heap.loads)
+    mean = sum(heap.loads) / nodes if nodes else 0.0
+    by_node: List[List[int]] = [[] for _ in range(nodes)]
+    for r, owner in enumerate(router.owners):
+        by_node[owner].append(r)
+    moves = 0
+    while moves < max_moves:
+        hi, lo = heap.heaviest(), heap.lightest()
+        gap = heap.loads[hi] - heap.loads[lo]
+        if heap.loads[hi] <= mean * (1 + tolerance):
+            break
+        candidates = [r for r in by_node[hi] if 0 < router.hits[r] < gap]
+        if not candidates:
+            break
+        r = min(candidates, key=lambda c: abs(2 * router.hits[c] - gap))
+        h = router.hits[r]
+        router.move(r, lo)
+        by_node[hi].remove(r)
+        by_node[lo].append(r)
+        heap.update(hi, heap.loads[hi] - h)
+        heap.update(lo, heap.loads[lo] + h)
+        moves += 1
+    return moves
+
+
+@profiled
+def simulate_progress_range_loadsplit_with_nodes(
+    n_keys: int,
+    initial_splits: List[int],
+    steps: int = 5,
+    nodes: int = 3,
+    arrival_rate: float = 1000.0,
+    window_s: float = 1.0,
+    split_qps: float = 250.0,
+    rebalance_interval: int = 1,
+    rebalance_tolerance: float = 0.1,
+    rebalance_after_split: bool = False,
+    key_mode: str = "sequential",
+    sample_size: int = 32,
+    seed: int | None = None,
+    trace: KeySource | None = None,
+) -> List[LoadSplitStep]:
+    """
+    Load-based splitting and lease rebalancing (CockroachDB style) on a RangeRouter:
+    - One op per key arrives at `arrival_rate` ops/s; every `window_s` seconds the QPS of each range
+      is its hits in the window divided by the window length.
+    - Any range above `split_qps` (not only the tail) is split at the median of a reservoir sample
+      of the keys it served in the window; the right half takes the sampled share of keys and hits.
+      With rebalance_after_split the right half goes to the least loaded node.
+    - Every `rebalance_interval` windows, ranges move from the most to the least loaded node
+      (NodeLoadHeap priority queues) while the heaviest node is above mean * (1 + rebalance_tolerance).
+    Returns a LoadSplitStep per progress checkpoint, with per-node QPS of the last window.
+    """
+    if nodes < 1:
+        raise ValueError("nodes must be >= 1")
+    if arrival_rate <= 0 or window_s <= 0 or split_qps <= 0:
+        raise ValueError("arrival_rate, window_s and split_qps must be > 0")
+
+    router = RangeRouter(initial_splits, nodes=nodes)
+    rng = random.Random(seed)
+    window_ops = max(1, int(round(arrival_rate * window_s)))
+    checkpoint_set = set(progress_checkpoints(n_keys, steps))
+    samples: Dict[int, List[int]] = {}
+    node_qps = [0.0] * nodes
+    window_start = 0
+    windows = 0
+    splits_done = 0
+    moves = 0
+    out: List[LoadSplitStep] = []
+
+    # Per-key routing and sampling; split decisions and rebalancing run once per window
+    with profile_phase("routing", n_keys):
+        for i, k in enumerate(key_stream(n_keys, key_mode, trace), start=1):
+            idx = router.add(k)
+            sample = samples.get(idx)
+            if sample is None:
+                samples[idx] = [k]
+            elif len(sample) < sample_size:
+                sample.append(k)
+            else:
+                j = rng.randrange(router.hits[idx])
+                if j < sample_size:
+                    sample[j] = k
+
+            if i - window_start == window_ops or i == n_keys:
+                with profile_phase("autosplit"):
+                    elapsed = (i - window_start) / arrival_rate
+                    heap = NodeLoadHeap(router.node_hits())
+                    # Load-based splits, right to left so the pending indices stay valid
+                    for r in range(len(router) - 1, -1, -1):
+                        sample = samples.get(r)
+                        if router.hits[r] / elapsed <= split_qps or not sample or len(sample) < 2:
+                            continue
+                        ordered = sorted(sample)
+                        key = ordered[(len(ordered) - 1) // 2]
+                        lo, hi = router.lower(r), router.upper(r)
+                        if (lo is not None and key <= lo) or (hi is not None and key >= hi):
+                            continue
+                        share = sum(1 for x in sample if x > key) / len(sample)
+                        right_hits = int(router.hits[r] * share)
+                        left_node = router.owners[r]
+                        target = heap.lightest() if rebalance_after_split else left_node
+                        router.split(r, key, node=target, right_count=int(router.counts[r] * share), right_hits=right_hits)
+                        if target != left_node:
+                            heap.update(left_node, heap.loads[left_node] - right_hits)
+                            heap.update(target, heap.loads[target] + right_hits)
+                        splits_done += 1
+                    windows += 1
+                    if rebalance_interval > 0 and windows % rebalance_interval == 0:
+                        moves += rebalance_ranges(router, heap, rebalance_tolerance, max_moves=nodes)
+                    node_qps = [h / elapsed for h in heap.loads]
+                    router.reset_hits()
+                    samples = {}
+                    window_start = i
+
+            if i in checkpoint_set:
+                pct = int(round(100 * i / n_keys))
+                with profile_phase("snapshot"):
+                    out.append(LoadSplitStep(pct, router.counts.tolist(), router.splits.tolist(), router.node_counts.tolist(),
+                                             node_qps, splits_done, moves))
+
+    return out
+
+
+@profiled
+def simulate_range_with_salt(n_keys: int, splits: List[int], buckets: int, workers: int = 0, engine: str = "python", hash_scheme: str = "sha1",
+                             trace: KeySource | None = None) -> Dict[str, List[int]]:
     """
     Simulate range sharding using composite key (salt, key):
     - Routing is by (salt, key) in lexicographic order, with splits defined on the key only.
     - We show two distributions:
         * per_range: counts per range (like before)
         * per_bucket: counts per salt bucket (to show write spreading)
+    With workers > 0 the key space is split into chunks counted in a process pool.
     """
-    keys = gen_keys(n_keys, mode="sequential")
+    if workers > 0:
+        tasks = chunk_tasks(n_keys, "sequential", plan_chunks(n_keys), "range", 0, splits, buckets=max(1, buckets), engine=resolve_engine(engine), hash_scheme=hash_scheme, trace=trace)
+        results = run_chunks(tasks, workers)
+        return {
+            "per_range": sum_counts((r for r, _ in results), len(splits) + 1),
+            "per_bucket": sum_counts((b for _, b in results), max(1, buckets)),
+        }
     per_range = [0] * (len(splits) + 1)
     per_bucket = [0] * max(1, buckets)
 
-    for k in keys:
-        b = salt_of(k, buckets)
+    for k in key_stream(n_keys, "sequential", trace):
+        b = salt_of(k, buckets, hash_scheme)
         # Range routing uses key value for boundary, but because salt is the first sort key,
         # writes are interleaved across buckets; we simply reflect that by counting per bucket
         r = assign_range(k, splits)
@@ -284,18 +1760,18 @@ def simulate_range_with_salt(n_keys: int, splits: List[int], buckets: int) -> Di
     return {"per_range": per_range, "per_bucket": per_bucket}
 
 
-def simulate_progress_range_with_salt(n_keys: int, splits: List[int], buckets: int, steps: int = 5) -> List[Tuple[int, List[int], List[int]]]:
+@profiled
+def simulate_progress_range_with_salt(n_keys: int, splits: List[int], buckets: int, steps: int = 5, hash_scheme: str = "sha1",
+                                      trace: KeySource | None = None) -> List[Tuple[int, List[int], List[int]]]:
     """Progression for salted range: report counts per range and per bucket over time."""
-    keys = gen_keys(n_keys, mode="sequential")
     per_range = [0] * (len(splits) + 1)
     per_bucket = [0] * max(1, buckets)
     out: List[Tuple[int, List[int], List[int]]] = []
 
-    checkpoints = [max(1, (n_keys * frac) // steps) for frac in range(1, steps + 1)]
-    checkpoint_set = set(checkpoints)
+    checkpoint_set = set(progress_checkpoints(n_keys, steps))
 
-    for i, k in enumerate(keys, start=1):
-        b = salt_of(k, buckets)
+    for i, k in enumerate(key_stream(n_keys, "sequential", trace), start=1):
+        b = salt_of(k, buckets, hash_scheme)
         r = assign_range(k, splits)
         per_range[r] += 1
         per_bucket[b] += 1
@@ -306,10 +1782,1012 @@ def simulate_progress_range_with_salt(n_keys: int, splits: List[int], buckets: i
     return out
 
 
+LOAD_STRATEGIES = ("range", "hash", "salted", "autosplit")
+
+
+def placement_for(
+    strategy: str,
+    nodes: int,
+    n_keys: int,
+    splits: List[int] | None = None,
+    buckets: int = 8,
+    hash_scheme: str = "sha1",
+    threshold: float = 0.4,
+    autosplit_where: str = "current",
+    rebalance_after_split: bool = False,
+) -> Callable[[int], int]:
+    """Key -> node function for the load simulator (stateful for 'autosplit').
+    - range: static ranges (splits, default even over 1..n_keys), range i on node i % nodes
+    - hash: hash_shard(key, nodes)
+    - salted: composite key (salt, key) with ranges cut on the salt prefix, so bucket b lives on
+      node b * nodes // buckets
+    - autosplit: RangeRouter with tail auto-splitting as in simulate_progress_range_autosplit_with_nodes
+    """
+    if strategy == "hash":
+        return lambda k: hash_shard(k, nodes, hash_scheme)
+    if strategy == "salted":
+        b = max(1, buckets)
+        return lambda k: salt_of(k, b, hash_scheme) * nodes // b
+    rsplits = list(splits) if splits is not None else even_splits(nodes, n_keys)
+    if strategy == "range":
+        return lambda k: assign_range(k, rsplits) % nodes
+    if strategy == "autosplit":
+        router = RangeRouter(rsplits, nodes=nodes)
+        heap = NodeLoadHeap(router.node_counts) if (nodes > 0 and rebalance_after_split) else None
+        seen = [0]
+
+        def place(k: int) -> int:
+            idx = router.add(k)
+            seen[0] += 1
+            node = router.owners[idx]
+            tail_autosplit(router, idx, k, seen[0], threshold, autosplit_where, heap)
+            return node
+        return place
+    raise ValueError(f"strategy must be one of {', '.join(LOAD_STRATEGIES)}")
+
+
+def load_placements(
+    strategy: str,
+    nodes: int,
+    n_keys: int,
+    splits: List[int] | None = None,
+    buckets: int = 8,
+    hash_scheme: str = "sha1",
+    threshold: float = 0.4,
+    autosplit_where: str = "current",
+    rebalance_after_split: bool = False,
+    engine: str = "python",
+    trace: KeySource | None = None,
+) -> Iterator[int]:
+    """Node of each op, in op order, for simulate_load. Nodes are computed a batch at a time,
+    through route_batch/salt_batch for the static strategies with the numpy engine, so the event
+    loop itself never hashes or routes a key."""
+    if strategy in ("range", "hash", "salted") and resolve_engine(engine) == "numpy":
+        rsplits = list(splits) if splits is not None else even_splits(nodes, n_keys)
+        b = max(1, buckets)
+        for keys in profile_batches(key_batches(n_keys, "sequential", trace)):
+            with profile_phase("routing", len(keys)):
+                if strategy == "hash":
+                    placed = hash_shard_batch(keys, nodes, hash_scheme)
+                elif strategy == "salted":
+                    placed = salt_batch(keys, b, hash_scheme) * nodes // b
+                else:
+                    placed = assign_range_batch(keys, rsplits) % nodes
+                placed = placed.tolist()
+            yield from placed
+        return
+    place = placement_for(strategy, nodes, n_keys, splits=splits, buckets=buckets, hash_scheme=hash_scheme, threshold=threshold,
+                          autosplit_where=autosplit_where, rebalance_after_split=rebalance_after_split)
+    keys = key_stream(n_keys, "sequential", trace)
+    for chunk in profile_batches(iter(lambda: list(islice(keys, BATCH_SIZE)), [])):
+        with profile_phase("routing", len(chunk)):
+            placed = list(map(place, chunk))
+        yield from placed
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadWindow(NamedTuple):
+    """Per-window results of the discrete-event load simulation."""
+    t_end: float  # seconds
+    ops_per_s: List[float]  # completed ops/s per node
+    max_queue: List[int]  # max ops in system (queued + in service) per node
+    p50_ms: float
+    p99_ms: float
+    node_p99_ms: List[float]
+
+
+@profiled
+def simulate_load(
+    placed: Iterable[int],
+    nodes: int,
+    arrival_rate: float,
+    capacity: float | List[float],
+    window_s: float,
+    service: str = "exp",
+    seed: int | None = None,
+    arrivals: Iterable[float] | None = None,
+) -> List[LoadWindow]:
+    """
+    Discrete-event simulation of ops arriving as a Poisson stream at `arrival_rate` ops/s
+    (or at the `arrivals` times of a trace, in seconds from its first op), each sent to the node
+    given by `placed` (see load_placements) among `nodes` FIFO single-server nodes serving
+    `capacity` ops/s each (exponential or deterministic service times).
+    Arrivals come in time order, so only departures go through the event queue: a heap of
+    (time, seq, node, arrival_time) holding the in-service op of each node (at most `nodes`
+    events). A departure due at an arrival's time is processed first.
+    Returns one LoadWindow per `window_s` seconds of simulated time.
+    """
+    if arrival_rate <= 0 or window_s <= 0:
+        raise ValueError("arrival_rate and window_s must be > 0")
+    caps = list(capacity) if isinstance(capacity, (list, tuple)) else [float(capacity)] * nodes
+    if len(caps) != nodes or min(caps) <= 0:
+        raise ValueError("capacity must be > 0, one value or one per node")
+    rng = random.Random(seed)
+    expovariate = rng.expovariate
+    if service == "exp":
+        service_time = [lambda c=c: expovariate(c) for c in caps]
+    elif service == "const":
+        service_time = [lambda c=c: 1.0 / c for c in caps]
+    else:
+        raise ValueError("service must be 'exp' or 'const'")
+    if arrivals is None:
+        def next_arrival(t: float) -> float:
+            return t + expovariate(arrival_rate)
+    else:
+        arrival_it = iter(arrivals)
+        origin: List[float] = []
+
+        def next_arrival(t: float) -> float:
+            a = next(arrival_it)
+            if not origin:
+                origin.append(a)
+            # Out-of-order timestamps arrive with the previous op
+            return max(t, a - origin[0])
+
+    events: List[Tuple[float, int, int, float]] = []
+    seq = 0
+    waiting: List[List[float]] = [[] for _ in range(nodes)]  # FIFO of arrival times (head index below)
+    head = [0] * nodes
+    busy = [False] * nodes
+    in_system = [0] * nodes
+
+    out: List[LoadWindow] = []
+    w_end = window_s
+    w_done = [0] * nodes
+    w_maxq = [0] * nodes
+    w_lat: List[List[float]] = [[] for _ in range(nodes)]
+
+    def close_window() -> None:
+        every = sorted(x for lat in w_lat for x in lat)
+        out.append(LoadWindow(
+            w_end,
+            [d / window_s for d in w_done],
+            list(w_maxq),
+            percentile(every, 50) * 1000.0,
+            percentile(every, 99) * 1000.0,
+            [percentile(sorted(lat), 99) * 1000.0 for lat in w_lat],
+        ))
+        for n in range(nodes):
+            w_done[n] = 0
+            w_maxq[n] = in_system[n]
+            w_lat[n] = []
+
+    heappush, heappop = heapq.heappush, heapq.heappop
+
+    def depart_until(until: float) -> None:
+        """Process the departures due at or before `until`."""
+        nonlocal seq, w_end
+        while events and events[0][0] <= until:
+            t, _, node, arrived = heappop(events)
+            while t > w_end:
+                close_window()
+                w_end += window_s
+            in_system[node] -= 1
+            w_done[node] += 1
+            w_lat[node].append(t - arrived)
+            q = waiting[node]
+            if head[node] < len(q):
+                start_arrival = q[head[node]]
+                head[node] += 1
+                if head[node] > 4096 and head[node] * 2 > len(q):
+                    del q[:head[node]]
+                    head[node] = 0
+                seq += 1
+                heappush(events, (t + service_time[node](), seq, node, start_arrival))
+            else:
+                busy[node] = False
+
+    t = 0.0
+    for node in placed:
+        t = next_arrival(t)
+        if events and events[0][0] <= t:
+            depart_until(t)
+        while t > w_end:
+            close_window()
+            w_end += window_s
+        in_system[node] += 1
+        if in_system[node] > w_maxq[node]:
+            w_maxq[node] = in_system[node]
+        if busy[node]:
+            waiting[node].append(t)
+        else:
+            busy[node] = True
+            seq += 1
+            heappush(events, (t + service_time[node](), seq, node, t))
+    depart_until(math.inf)
+    if any(w_done) or not out:
+        close_window()
+    return out
+
+
+RESHARD_STRATEGIES = ("modulo", "jump", "yb16", "range")
+
+
+class MoveReport(NamedTuple):
+    """Data movement caused by changing the node count under one placement strategy."""
+    strategy: str
+    keys_moved: int
+    bytes_moved: int
+    ingress: List[int]  # keys received per node
+    egress: List[int]  # keys sent per node
+
+
+def move_report(strategy: str, flows: List[List[int]], row_bytes: int) -> MoveReport:
+    """Summarize a flow matrix (flows[src][dst] = keys moving from node src to node dst)."""
+    size = len(flows)
+    ingress = [sum(flows[src][dst] for src in range(size) if src != dst) for dst in range(size)]
+    egress = [sum(flows[src][dst] for dst in range(size) if dst != src) for src in range(size)]
+    moved = sum(ingress)
+    return MoveReport(strategy, moved, moved * row_bytes, ingress, egress)
+
+
+def hash_move_flows(n_keys: int, before: int, after: int, placement: str, hash_scheme: str = "sha1", engine: str = "python") -> List[List[int]]:
+    """Flow matrix for per-key hash placement (modulo or jump) of keys 1..n_keys.
+    Each key is placed under both node counts and only the (before, after) pair is counted,
+    so memory is O(nodes^2) whatever the key count.
+    """
+    size = max(before, after)
+    if resolve_engine(engine) == "numpy":
+        flat = np.zeros(size * size, dtype=np.int64)
+        for keys in gen_key_batches(n_keys, mode="sequential"):
+            if placement == "jump":
+                h = xxh64_batch(keys)
+                src, dst = jump_hash_batch(h, before), jump_hash_batch(h, after)
+            else:
+                # salt_batch is exactly digest % n for the chosen hash
+                src, dst = salt_batch(keys, before, hash_scheme), salt_batch(keys, after, hash_scheme)
+            flat += np.bincount(src * size + dst, minlength=size * size)
+        return flat.reshape(size, size).tolist()
+    flows = [[0] * size for _ in range(size)]
+    digest = xxh64_digest if placement == "jump" else PARTITIONERS[hash_scheme].digest
+    place = jump_hash if placement == "jump" else mod_place
+    for k in iter_keys(n_keys, mode="sequential"):
+        h = digest(k)
+        flows[place(h, before)][place(h, after)] += 1
+    return flows
+
+
+def rebalance_units(loads: List[int], owners: List[int], nodes: int, by: str = "load") -> List[int]:
+    """New owner per unit (tablet or range) after resizing the cluster to `nodes` nodes.
+    Units of removed nodes go first (largest first) to the lightest node, then units move
+    from the heaviest to the lightest node while that narrows the gap.
+    by='count' evens out units per node (YugabyteDB tablet balancer) and moves the smallest
+    tablets; by='load' evens out keys per node and moves the range closest to half the gap.
+    """
+    weight = (lambda u: 1) if by == "count" else loads.__getitem__
+    new = list(owners)
+    node_w = [0] * nodes
+    per_node: List[List[int]] = [[] for _ in range(nodes)]
+    orphans = []
+    for u, owner in enumerate(owners):
+        if owner < nodes:
+            node_w[owner] += weight(u)
+            per_node[owner].append(u)
+        else:
+            orphans.append(u)
+    heap = [(w, n) for n, w in enumerate(node_w)]
+    heapq.heapify(heap)
+    for u in sorted(orphans, key=lambda u: -loads[u]):
+        _, n = heapq.heappop(heap)
+        new[u] = n
+        per_node[n].append(u)
+        node_w[n] += weight(u)
+        heapq.heappush(heap, (node_w[n], n))
+    # Each move of w < gap strictly lowers the sum of squared node weights, so this terminates
+    while nodes > 1:
+        hi = max(range(nodes), key=node_w.__getitem__)
+        lo = min(range(nodes), key=node_w.__getitem__)
+        gap = node_w[hi] - node_w[lo]
+        candidates = [u for u in per_node[hi] if 0 < weight(u) < gap]
+        if not candidates:
+            break
+        if by == "count":
+            u = min(candidates, key=loads.__getitem__)
+        else:
+            u = min(candidates, key=lambda c: abs(2 * weight(c) - gap))
+        per_node[hi].remove(u)
+        per_node[lo].append(u)
+        node_w[hi] -= weight(u)
+        node_w[lo] += weight(u)
+        new[u] = lo
+    return new
+
+
+def unit_move_flows(loads: List[int], owners: List[int], new_owners: List[int], size: int) -> List[List[int]]:
+    flows = [[0] * size for _ in range(size)]
+    for load, src, dst in zip(loads, owners, new_owners):
+        flows[src][dst] += load
+    return flows
+
+
+def range_counts(n_keys: int, splits: List[int]) -> List[int]:
+    """Keys 1..n_keys per range, computed from the bounds (no per-key pass)."""
+    bounds = [0] + [min(max(s, 0), n_keys) for s in splits] + [n_keys]
+    return [max(0, hi - lo) for lo, hi in zip(bounds, bounds[1:])]
+
+
+@profiled
+def simulate_reshard(
+    n_keys: int,
+    before: int,
+    after: int,
+    units: int,
+    strategies: Iterable[str] = RESHARD_STRATEGIES,
+    row_bytes: int = 256,
+    hash_scheme: str = "sha1",
+    engine: str = "python",
+    range_router: RangeRouter | None = None,
+) -> List[MoveReport]:
+    """
+    Keys and bytes moved when the cluster goes from `before` to `after` nodes:
+    - modulo: node = digest(key) % nodes (--hash digest), almost every key moves
+    - jump: jump consistent hash, only ~|after-before|/max(after, before) of the keys move
+    - yb16: `units` tablets over the 16-bit hash space stay fixed; whole tablets move between nodes
+    - range: `units` even ranges (or the ranges of `range_router`, e.g. after auto-split with
+      rebalance) owned round-robin; whole ranges move to even out keys per node
+    """
+    if before < 1 or after < 1:
+        raise ValueError("node counts must be >= 1")
+    size = max(before, after)
+    reports: List[MoveReport] = []
+    for strategy in strategies:
+        if strategy in ("modulo", "jump"):
+            flows = hash_move_flows(n_keys, before, after, strategy, hash_scheme=hash_scheme, engine=engine)
+        elif strategy == "yb16":
+            if resolve_engine(engine) == "numpy":
+                loads = [0] * units
+                for keys in gen_key_batches(n_keys, mode="sequential"):
+                    loads = [a + b for a, b in zip(loads, np.bincount(hash_shard_batch(keys, units, "yb16"), minlength=units).tolist())]
+            else:
+                loads = histogram((hash_shard(k, units, "yb16") for k in iter_keys(n_keys, mode="sequential")), units)
+            owners = [i % before for i in range(units)]
+            flows = unit_move_flows(loads, owners, rebalance_units(loads, owners, after, by="count"), size)
+        elif strategy == "range":
+            if range_router is not None:
+                loads, owners = range_router.counts.tolist(), range_router.owners.tolist()
+            else:
+                loads = range_counts(n_keys, even_splits(units, n_keys))
+                owners = [i % before for i in range(len(loads))]
+            flows = unit_move_flows(loads, owners, rebalance_units(loads, owners, after, by="load"), size)
+        else:
+            raise ValueError(f"strategy must be one of {', '.join(RESHARD_STRATEGIES)}")
+        reports.append(move_report(strategy, flows, row_bytes))
+    return reports
+
+
+SCAN_STRATEGIES = ("range", "hash", "hash-prefix", "salted")
+SCAN_KINDS = ("range", "prefix")
+
+
+class ScanLayout(NamedTuple):
+    """Placement of the ordered key space, as seen by scans (see simulate_scans)."""
+    strategy: str
+    shards: int
+    splits: List[int]  # range/salted: interval index, range i covers (splits[i-1], splits[i]]
+    buckets: int = 1  # salted: sub-scans per range, one per salt bucket
+    prefix_width: int = 1  # hash-prefix: keys per prefix (posts per author)
+    hash_scheme: str = "sha1"
+
+
+class ScanCost(NamedTuple):
+    """Scatter-gather latency model. A query costs one round trip, plus its slowest shard
+    (seek_ms per sub-scan and row_us per row read), plus jitter: each shard adds an exponential
+    delay of mean jitter_ms, and the expected max over k shards is jitter_ms * H(k)."""
+    rtt_ms: float = 0.5
+    seek_ms: float = 0.05
+    row_us: float = 1.0
+    jitter_ms: float = 0.2
+
+
+class ScanReport(NamedTuple):
+    strategy: str
+    queries: int
+    fanout: List[int]  # queries touching k shards, k = 0..shards
+    requests: int  # sub-scans sent (one per touched shard, per salt bucket)
+    rows: float  # rows read by all queries (expected values where rows are spread by a hash)
+    shard_rows: List[float]
+    shard_requests: List[int]
+    latency_ms: List[float]  # mean, p50, p99, max
+
+
+def gen_scan_queries(n_queries: int, n_keys: int, kind: str = "range", length: int = 100, prefix_width: int = 100) -> Tuple[array, array]:
+    """Inclusive key bounds (lo, hi) of each query, drawn from `random`:
+    - range: `length` consecutive keys starting anywhere in 1..n_keys
+    - prefix: every key of one prefix (keys are grouped in prefixes of prefix_width consecutive
+      keys, like the posts of one author ordered by created_at in posts_author_created_idx)
+    """
+    if n_keys < 1 or length < 1 or prefix_width < 1:
+        raise ValueError("n_keys, length and prefix_width must be >= 1")
+    randint = random.randint
+    los, his = array("q"), array("q")
+    if kind == "range":
+        span = min(length, n_keys)
+        for _ in range(n_queries):
+            lo = randint(1, n_keys - span + 1)
+            los.append(lo)
+            his.append(lo + span - 1)
+    elif kind == "prefix":
+        last = (n_keys - 1) // prefix_width
+        for _ in range(n_queries):
+            lo = randint(0, last) * prefix_width + 1
+            los.append(lo)
+            his.append(min(n_keys, lo + prefix_width - 1))
+    else:
+        raise ValueError(f"kind must be one of {', '.join(SCAN_KINDS)}")
+    return los, his
+
+
+def scan_layouts(strategies: Iterable[str], shards: int, n_keys: int, splits: List[int] | None = None, buckets: int = 8,
+                 prefix_width: int = 100, hash_scheme: str = "sha1") -> List[ScanLayout]:
+    """Scan layouts over keys 1..n_keys:
+    - range: ranges on the key (splits, default even), a scan reads only the ranges it overlaps
+    - hash: hash of the whole key; only a single-key query can be routed, anything wider goes
+      to every shard, each holding ~1/shards of the rows in the interval
+    - hash-prefix: hash of the prefix, keys ordered within it (author_id HASH, created_at DESC):
+      a query within one prefix reads one shard, a query across prefixes reads every shard
+    - salted: ranges on the key with `buckets` salt buckets inside each range, as in
+      simulate_range_with_salt; every overlapped range is read once per bucket
+    """
+    rsplits = list(splits) if splits is not None else even_splits(shards, n_keys)
+    out = []
+    for strategy in strategies:
+        if strategy in ("range", "salted"):
+            out.append(ScanLayout(strategy, len(rsplits) + 1, rsplits, max(1, buckets) if strategy == "salted" else 1))
+        elif strategy in ("hash", "hash-prefix"):
+            out.append(ScanLayout(strategy, shards, [], prefix_width=prefix_width, hash_scheme=hash_scheme))
+        else:
+            raise ValueError(f"strategy must be one of {', '.join(SCAN_STRATEGIES)}")
+    return out
+
+
+def percentile_of_counts(counts: List[int], q: float) -> int:
+    """Nearest-rank percentile of values given as counts[value] (0 when empty)."""
+    total = sum(counts)
+    if not total:
+        return 0
+    rank, seen = max(1, math.ceil(q / 100.0 * total)), 0
+    for value, c in enumerate(counts):
+        seen += c
+        if seen >= rank:
+            return value
+    return len(counts) - 1
+
+
+def harmonic_numbers(n: int) -> List[float]:
+    out = [0.0]
+    for k in range(1, n + 1):
+        out.append(out[-1] + 1.0 / k)
+    return out
+
+
+def _scan_report(layout: ScanLayout, fanout: List[int], requests: int, shard_rows: List[float],
+                 shard_requests: List[int], latencies: List[float]) -> ScanReport:
+    ordered = sorted(latencies)
+    stats = [math.fsum(ordered) / len(ordered) if ordered else 0.0, percentile(ordered, 50), percentile(ordered, 99),
+             ordered[-1] if ordered else 0.0]
+    return ScanReport(layout.strategy, len(latencies), fanout, requests, math.fsum(shard_rows), shard_rows, shard_requests, stats)
+
+
+@profiled
+def simulate_scans(layout: ScanLayout, los: array, his: array, limit: int = 0, cost: ScanCost = ScanCost(), engine: str = "python") -> ScanReport:
+    """
+    Shards touched, rows read per shard and scatter-gather latency of each query [lo, hi].
+    With limit > 0 (ORDER BY key DESC LIMIT n) a range layout reads only the top `limit` keys
+    of the interval, salted ranges the top limit * buckets keys (n rows from each bucket), and
+    every shard of a scattered query returns up to `limit` rows for the coordinator to merge.
+    Range lookups go through the split points (interval index): O(log ranges) per query plus
+    the ranges it overlaps; hashed placements are closed-form. The numpy engine evaluates all
+    queries at once with the same results.
+    """
+    if resolve_engine(engine) == "numpy":
+        return simulate_scans_numpy(layout, los, his, limit, cost)
+    nshards = layout.shards
+    harmonic = harmonic_numbers(nshards)
+    fanout = [0] * (nshards + 1)
+    shard_rows = [0] * nshards
+    shard_requests = [0] * nshards
+    spread = 0  # rows scattered evenly over every shard, times nshards
+    requests = 0
+    latencies = array("d")
+    row_ms = cost.row_us / 1000.0
+    bisect_left = bisect.bisect_left
+    with profile_phase("routing", len(los)):
+        if layout.strategy in ("range", "salted"):
+            splits, seeks = layout.splits, layout.buckets
+            seek_ms = cost.rtt_ms + seeks * cost.seek_ms
+            last = nshards - 1
+            for lo, hi in zip(los, his):
+                if limit:
+                    lo = max(lo, hi - limit * seeks + 1)
+                a, b = bisect_left(splits, lo), bisect_left(splits, hi)
+                max_rows = 0
+                for r in range(a, b + 1):
+                    rows = (hi if r == last else min(hi, splits[r])) - (lo if r == 0 else max(lo, splits[r - 1] + 1)) + 1
+                    shard_rows[r] += rows
+                    shard_requests[r] += seeks
+                    if rows > max_rows:
+                        max_rows = rows
+                touched = b - a + 1
+                fanout[touched] += 1
+                requests += touched * seeks
+                latencies.append(seek_ms + max_rows * row_ms + cost.jitter_ms * harmonic[touched])
+        else:
+            width = layout.prefix_width
+            scattered = 0
+            single_ms = cost.rtt_ms + cost.seek_ms + cost.jitter_ms * harmonic[1]
+            scatter_ms = cost.rtt_ms + cost.seek_ms + cost.jitter_ms * harmonic[nshards]
+            for lo, hi in zip(los, his):
+                n = hi - lo + 1
+                if layout.strategy == "hash" and n == 1:
+                    owner = hash_shard(lo, nshards, layout.hash_scheme)
+                elif layout.strategy == "hash-prefix" and (lo - 1) // width == (hi - 1) // width:
+                    owner = hash_shard((lo - 1) // width, nshards, layout.hash_scheme)
+                else:
+                    owner = -1
+                if owner >= 0:
+                    rows = min(limit, n) if limit else n
+                    shard_rows[owner] += rows
+                    shard_requests[owner] += 1
+                    fanout[1] += 1
+                    requests += 1
+                    latencies.append(single_ms + rows * row_ms)
+                else:
+                    rows_each = min(limit, n / nshards) if limit else n / nshards
+                    spread += min(limit * nshards, n) if limit else n
+                    scattered += 1
+                    fanout[nshards] += 1
+                    requests += nshards
+                    latencies.append(scatter_ms + rows_each * row_ms)
+            for s in range(nshards):
+                shard_requests[s] += scattered
+    rows_out = [r + spread / nshards for r in shard_rows]
+    with profile_phase("histogram", len(latencies)):
+        return _scan_report(layout, fanout, requests, rows_out, shard_requests, latencies)
+
+
+def _range_max(values: "np.ndarray", a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+    """max(values[a[i]:b[i]]) for every i with a[i] < b[i] (sparse table, O(1) per query)."""
+    table = [values]
+    while 2 ** len(table) <= len(values):
+        prev, step = table[-1], 2 ** (len(table) - 1)
+        table.append(np.maximum(prev[:-step], prev[step:]))
+    k = np.log2(b - a).astype(np.int64)
+    out = np.empty(len(a), dtype=values.dtype)
+    for level in np.unique(k):
+        sel = k == level
+        t = table[level]
+        out[sel] = np.maximum(t[a[sel]], t[b[sel] - 2 ** level])
+    return out
+
+
+def simulate_scans_numpy(layout: ScanLayout, los: array, his: array, limit: int = 0, cost: ScanCost = ScanCost()) -> ScanReport:
+    """Array version of simulate_scans: every query at once (searchsorted on the split points)."""
+    nshards = layout.shards
+    harmonic = np.asarray(harmonic_numbers(nshards))
+    lo = np.frombuffer(los, dtype=np.int64) if len(los) else np.zeros(0, dtype=np.int64)
+    hi = np.frombuffer(his, dtype=np.int64) if len(his) else np.zeros(0, dtype=np.int64)
+    row_ms = cost.row_us / 1000.0
+    with profile_phase("routing", len(lo)):
+        if layout.strategy in ("range", "salted"):
+            seeks = layout.buckets
+            if limit:
+                lo = np.maximum(lo, hi - limit * seeks + 1)
+            bounds = np.asarray(layout.splits, dtype=np.int64)
+            a = np.searchsorted(bounds, lo, side="left")
+            b = np.searchsorted(bounds, hi, side="left")
+            big = np.iinfo(np.int64).max
+            upper = np.concatenate((bounds, [big]))
+            lower = np.concatenate(([-big], bounds + 1))  # first key of each range
+            first = np.minimum(hi, upper[a]) - np.maximum(lo, lower[a]) + 1
+            last = hi - np.maximum(lo, lower[b]) + 1
+            multi = b > a
+            max_rows = np.where(multi, np.maximum(first, last), first)
+            inner = b > a + 1
+            widths = np.concatenate(([0], np.diff(bounds)))  # keys per range, for the interior ranges 1..R-2
+            if inner.any():
+                max_rows[inner] = np.maximum(max_rows[inner], _range_max(widths, a[inner] + 1, b[inner]))
+            touched = b - a + 1
+            with profile_phase("histogram", len(lo)):
+                rows = np.bincount(a, weights=first, minlength=nshards)
+                rows += np.bincount(b[multi], weights=last[multi], minlength=nshards)
+                cover = np.cumsum(np.bincount(a[inner] + 1, minlength=nshards + 1) - np.bincount(b[inner], minlength=nshards + 1))[:nshards]
+                if nshards > 2:
+                    rows[1:-1] += cover[1:-1] * widths[1:]
+                hit = np.cumsum(np.bincount(a, minlength=nshards + 1) - np.bincount(b + 1, minlength=nshards + 1))[:nshards]
+                shard_requests = (hit * seeks).tolist()
+                fanout = np.bincount(touched, minlength=nshards + 1).tolist()
+            requests = int(touched.sum()) * seeks
+            latency = (cost.rtt_ms + seeks * cost.seek_ms) + max_rows * row_ms + cost.jitter_ms * harmonic[touched]
+            shard_rows = rows.tolist()
+        else:
+            n = hi - lo + 1
+            if layout.strategy == "hash":
+                single = n == 1
+                owners = hash_shard_batch(lo[single], nshards, layout.hash_scheme)
+            else:
+                pref = (lo - 1) // layout.prefix_width
+                single = pref == (hi - 1) // layout.prefix_width
+                owners = hash_shard_batch(pref[single], nshards, layout.hash_scheme)
+            rows_single = np.minimum(limit, n[single]) if limit else n[single]
+            scattered = n[~single]
+            rows_each = np.minimum(limit, scattered / nshards) if limit else scattered / nshards
+            spread = int((np.minimum(limit * nshards, scattered) if limit else scattered).sum())
+            with profile_phase("histogram", len(lo)):
+                rows = np.bincount(owners, weights=rows_single, minlength=nshards)
+                single_requests = np.bincount(owners, minlength=nshards)
+            n_scatter = len(scattered)
+            shard_requests = (single_requests + n_scatter).tolist()
+            fanout = [0] * (nshards + 1)
+            fanout[1] += len(owners)
+            fanout[nshards] += n_scatter
+            requests = len(owners) + n_scatter * nshards
+            latency = np.empty(len(lo))
+            latency[single] = (cost.rtt_ms + cost.seek_ms + cost.jitter_ms * harmonic[1]) + rows_single * row_ms
+            latency[~single] = (cost.rtt_ms + cost.seek_ms + cost.jitter_ms * harmonic[nshards]) + rows_each * row_ms
+            shard_rows = [r + spread / nshards for r in rows.tolist()]
+    with profile_phase("histogram", len(latency)):
+        return _scan_report(layout, fanout, requests, shard_rows, shard_requests, latency.tolist())
+
+
+SQL_DIALECTS = ("cockroach", "yugabyte", "yugabyte-index")
+SQL_DIALECT_TITLES = {"cockroach": "CockroachDB", "yugabyte": "YugabyteDB", "yugabyte-index": "YugabyteDB range index (splits the index, not the table)"}
+
+# Columns of the tables in yuga/init/schema.sql, for the range-sharded CREATE TABLE
+YSQL_COLUMNS = {
+    "users": ("id BIGSERIAL", "username VARCHAR(255) UNIQUE NOT NULL", "password VARCHAR(255) NOT NULL"),
+    "post": ("id BIGSERIAL", "user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE", "image_path VARCHAR(255) NOT NULL",
+             "description VARCHAR(255)", "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
+    "follower_followee": ("id BIGSERIAL", "follower_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE",
+                          "followee_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE"),
+}
+
+
+class SplitPlan(NamedTuple):
+    """Pre-split plan from a quantile sketch, next to the even splits it replaces."""
+    splits: List[int]
+    predicted: List[int]  # keys per range, estimated from the sketch
+    even_splits: List[int]  # even_splits over the observed key range
+    even_predicted: List[int]
+    sketch_items: int
+
+
+def balanced_splits(sketch: QuantileSketch, ranges: int) -> List[int]:
+    """N-1 split points at the i/N quantiles (bumped to stay strictly increasing: a hot key
+    cannot be split, so its range takes the whole key)."""
+    splits: List[int] = []
+    for i in range(1, ranges):
+        v = sketch.quantile(i / ranges)
+        if splits and v <= splits[-1]:
+            v = splits[-1] + 1
+        splits.append(v)
+    return splits
+
+
+def predicted_counts(sketch: QuantileSketch, splits: List[int]) -> List[int]:
+    """Keys per range (shard i holds keys <= splits[i], like assign_range), from sketch ranks."""
+    edges = [0] + [sketch.rank(s) for s in splits] + [sketch.n]
+    return [b - a for a, b in zip(edges, edges[1:])]
+
+
+@profiled
+def plan_splits(ranges: int, n_keys: int, k: int = 200, engine: str = "python", trace: KeySource | None = None) -> SplitPlan:
+    """Stream the keys (1..n_keys, or a trace or workload) through a QuantileSketch and cut them
+    into `ranges` ranges of equal predicted size. One pass, memory bounded by the sketch."""
+    sketch = QuantileSketch(k, engine=engine)
+    if sketch.engine == "numpy":
+        batches = key_batches(n_keys, "sequential", trace)
+    else:
+        keys = key_stream(n_keys, "sequential", trace)
+        batches = iter(lambda: list(islice(keys, BATCH_SIZE)), [])
+    for batch in profile_batches(batches):
+        with profile_phase("sketch", len(batch)):
+            sketch.add(batch)
+    if not sketch.n:
+        raise ValueError("no keys to plan splits from")
+    splits = balanced_splits(sketch, ranges)
+    even = even_splits(ranges, sketch.max, sketch.min)
+    return SplitPlan(splits, predicted_counts(sketch, splits), even, predicted_counts(sketch, even), len(sketch))
+
+
+def presplit_sql(dialect: str, table: str, column: str, splits: List[int]) -> List[str]:
+    """Statements that pre-split `table` on `column` at `splits`."""
+    if not splits:
+        return []
+    if dialect == "cockroach":  # same statements as cockroach/init/splits.sql
+        return [f"ALTER TABLE {table} SPLIT AT VALUES ({v});" for v in splits] + [f"ALTER TABLE {table} SCATTER;"]
+    values = ", ".join(f"({v})" for v in splits)
+    if dialect == "yugabyte":  # tablets of a range-sharded table are only split when it is created
+        if table in YSQL_COLUMNS:
+            # id stays in the key after a non-unique split column, e.g. post on user_id
+            note = f"-- recreates {table} of yuga/init/schema.sql range-sharded on {column}: drop it first"
+            defs, key = ", ".join(YSQL_COLUMNS[table]), f"{column} ASC" + (", id" if column != "id" else "")
+        else:
+            note = f"-- add the other columns of {table} before the PRIMARY KEY"
+            defs, key = f"{column} BIGINT NOT NULL", f"{column} ASC"
+        return [note, f"CREATE TABLE {table} ({defs}, PRIMARY KEY ({key})) SPLIT AT VALUES ({values});"]
+    if dialect == "yugabyte-index":
+        return [f"CREATE INDEX {table}_{column}_range_idx ON {table} ({column} ASC) SPLIT AT VALUES ({values});"]
+    raise ValueError(f"dialect must be one of {', '.join(SQL_DIALECTS)}")
+
+
+def imbalance(counts: List[int]) -> Tuple[float, float]:
+    """(max / mean, min / mean) of per-range counts."""
+    mean = sum(counts) / len(counts) if counts else 0.0
+    return (max(counts) / mean, min(counts) / mean) if mean else (0.0, 0.0)
+
+
+def fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(n) < 1000 or unit == "TB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{int(n)} B"
+        n /= 1000
+    return f"{n:.1f} TB"
+
+
+Title = str | Callable[[], str]
+
+
+def resolve_title(title: Title) -> str:
+    return title() if callable(title) else title
+
+
+class Emitter:
+    """Results of a run, rendered as text (ASCII bars, the default), JSON or CSV.
+
+    Callers hand over plain values tagged with a `view` and context fields (strategy, pct, ...):
+    series (counts per shard, node, bucket or range), split lists and rows of scalars. Text is
+    formatted only as it is written, and row text is a callable the structured formats never call.
+    Titles (a string, or a callable for titles that embed long lists) only appear in text output.
+    CSV is streamed in long format, one line per series element or field. JSON is one document,
+    {"params", "records", "profile"}, written by close().
+    """
+
+    CSV_COLUMNS = ("record", "type", "view", "strategy", "pct", "field", "index", "value")
+
+    def __init__(self, fmt: str = "text", params: Dict[str, Any] | None = None, stream: TextIO | None = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self.stream = stream or sys.stdout
+        self.params = dict(params or {})
+        self.records: List[Dict[str, Any]] = []
+        self._writer = None
+        self._n = 0
+        if fmt == "csv":
+            self._writer = csv.writer(self.stream, lineterminator="\n")
+            self._writer.writerow(self.CSV_COLUMNS)
+            self._emit({"type": "params", "view": "params", **self.params})
+
+    def series(self, view: str, title: Title, counts: List[int], label: str = "shard", bars: bool = True, **fields: Any) -> None:
+        """Counts per `label` (shard, node, bucket or range); text shows the title alone when not bars."""
+        with profile_phase("output"):
+            if self.fmt != "text":
+                self._emit({"type": "series", "view": view, **fields, "label": label, "counts": list(counts)})
+            elif bars:
+                self.stream.writelines(format_hist(resolve_title(title), counts, label))
+            else:
+                self.stream.write(f"\n{resolve_title(title)}\n")
+
+    def splits(self, view: str, title: Title, splits: List[int], **fields: Any) -> None:
+        with profile_phase("output"):
+            if self.fmt == "text":
+                self.stream.write(f"{resolve_title(title)}: {splits}\n")
+            else:
+                self._emit({"type": "splits", "view": view, **fields, "splits": list(splits)})
+
+    def row(self, view: str, text: Callable[[], str], **fields: Any) -> None:
+        with profile_phase("output"):
+            if self.fmt == "text":
+                self.stream.write(text() + "\n")
+            else:
+                self._emit({"type": "row", "view": view, **fields})
+
+    def note(self, text: str) -> None:
+        """Headers and other decoration: text output only."""
+        if self.fmt == "text":
+            self.stream.write(text + "\n")
+
+    def close(self, profile: List[PhaseStats] | None = None) -> None:
+        phases = [dict(p._asdict(), keys_per_s=p.keys_per_s) for p in profile or []]
+        for p in phases:
+            if p["keys_per_s"] == float("inf"):
+                p["keys_per_s"] = None
+        if self.fmt == "json":
+            json.dump({"params": self.params, "records": self.records, "profile": phases}, self.stream)
+            self.stream.write("\n")
+        elif self.fmt == "csv":
+            for p in phases:
+                self._emit({"type": "profile", "view": p.pop("phase"), **p})
+        elif profile:
+            self.stream.writelines(format_profile(profile))
+        self.stream.flush()
+
+    def _emit(self, record: Dict[str, Any]) -> None:
+        self._n += 1
+        if self._writer is None:
+            self.records.append(record)
+            return
+        # strategy and pct get their own columns, except in the params record where they are fields
+        if record["type"] == "params":
+            columns: Tuple[str, ...] = ()
+            fixed = (self._n, "params", record["view"], "", "")
+        else:
+            columns = ("strategy", "pct")
+            fixed = (self._n, record["type"], record["view"], record.get("strategy", ""), record.get("pct", ""))
+        rows = []
+        for field, value in record.items():
+            if field in ("type", "view", "label") or field in columns:
+                continue
+            if field == "counts":
+                field = record["label"]
+            if isinstance(value, (list, tuple)):
+                rows.extend((*fixed, field, i, v) for i, v in enumerate(value))
+            else:
+                rows.append((*fixed, field, "", "" if value is None else value))
+        self._writer.writerows(rows)
+
+
+def format_profile(profile: List[PhaseStats]) -> Iterator[str]:
+    total = sum(p.seconds for p in profile)
+    width = max([5] + [len(p.phase) for p in profile])
+    yield f"\nProfile: exclusive wall time per phase (total {total:.3f}s)\n"
+    yield f"  {'phase':<{width}} {'calls':>8} {'keys':>12} {'seconds':>9} {'share':>6} {'keys/s':>14} {'peak RSS':>10} {'alloc peak':>10}\n"
+    for p in profile:
+        share = (100.0 * p.seconds / total) if total else 0.0
+        rate = f"{p.keys_per_s:14,.0f}" if p.keys_per_s is not None else f"{'-':>14}"
+        rss = fmt_bytes(p.peak_rss_bytes) if p.peak_rss_bytes is not None else "-"
+        alloc = fmt_bytes(p.alloc_peak_bytes) if p.alloc_peak_bytes is not None else "-"
+        yield f"  {p.phase:<{width}} {p.calls:8d} {p.keys:12d} {p.seconds:9.3f} {share:5.1f}% {rate} {rss:>10} {alloc:>10}\n"
+
+
+@profiled
+def bench_partitioners(n_keys: int, shards: int, engine: str = "python") -> List[Tuple[str, float]]:
+    """Throughput (keys/s) of shard placement for keys 1..n_keys under each partitioner."""
+    engine = resolve_engine(engine)
+    out: List[Tuple[str, float]] = []
+    for name in PARTITIONERS:
+        t0 = time.perf_counter()
+        if engine == "numpy":
+            for keys in gen_key_batches(n_keys, mode="sequential"):
+                hash_shard_batch(keys, shards, name)
+        else:
+            route = router_for("hash", shards, None, name)
+            for k in iter_keys(n_keys, mode="sequential"):
+                route(k)
+        elapsed = time.perf_counter() - t0
+        out.append((name, n_keys / elapsed if elapsed > 0 else float("inf")))
+    return out
+
+
+@contextlib.contextmanager
+def replay_rate(out: Emitter, trace: KeySource | None, simulator: str) -> Iterator[None]:
+    """Time the body (one replay of `trace` through `simulator`) and report its keys/s."""
+    if trace is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - t0
+    n = len(trace)
+    rate = n / elapsed if elapsed > 0 else float("inf")
+    out.row("replay", lambda: f"\nReplayed {n:,} {trace.label} keys through {simulator} in {elapsed:.3f}s ({rate:,.0f} keys/s)",
+            simulator=simulator, source=trace.kind, keys=n, seconds=elapsed, keys_per_s=rate)
+
+
+def print_loadsplit_progress(args: argparse.Namespace, splits: List[int], out: Emitter, trace: KeySource | None = None) -> None:
+    nodes = args.nodes if args.nodes > 0 else args.shards
+    with replay_rate(out, trace, "load-based split"):
+        prog = simulate_progress_range_loadsplit_with_nodes(
+            args.n_keys, splits, steps=args.progress_steps, nodes=nodes, arrival_rate=args.arrival_rate,
+            window_s=args.qps_window, split_qps=args.split_qps, rebalance_interval=args.rebalance_interval,
+            rebalance_tolerance=args.rebalance_tolerance, rebalance_after_split=args.rebalance_after_split,
+            key_mode=args.load_keys, trace=trace,
+        )
+    for st in prog:
+        mean = sum(st.node_qps) / len(st.node_qps)
+        skew = (max(st.node_qps) / mean) if mean else 0.0
+        title = f"Load-based split progression: {st.pct}% of keys | ranges={len(st.counts)} splits={st.splits_done} moves={st.moves}"
+        out.series("loadsplit_ranges", title, st.counts, label="range", bars=len(st.counts) <= 32,
+                   strategy="range", pct=st.pct, splits=st.splits, splits_done=st.splits_done, moves=st.moves)
+        out.series("loadsplit_node_qps", f"Per-node QPS, last {args.qps_window:g}s window (nodes={nodes}) | skew max/mean={skew:.2f}",
+                   [round(q) for q in st.node_qps], label="node", strategy="range", pct=st.pct, skew=skew)
+
+
+def emit_overall(out: Emitter, strategy: str, sim: Dict[str, List[int]], trace: KeySource | None = None) -> None:
+    if trace is not None:
+        title = f"{trace.label[:1].upper()}{trace.label[1:]} keys (overall)"
+        out.series("overall", title, sim["trace_all"], label="shard", strategy=strategy, key_order=trace.kind)
+        return
+    out.series("overall", "Sequential keys (overall)", sim["sequential_all"], label="shard", strategy=strategy, key_order="sequential")
+    out.series("overall", "Random keys (overall)", sim["random_all"], label="shard", strategy=strategy, key_order="random")
+
+
+def ingest_label(trace: KeySource | None) -> str:
+    if trace is None:
+        return "Sequential ingest"
+    return "Trace replay" if isinstance(trace, KeyTrace) else f"{trace.label[:1].upper()}{trace.label[1:]} workload"
+
+
+def emit_progress(out: Emitter, strategy: str, prog: List[Tuple[int, List[int]]], ingest: str = "Sequential ingest") -> None:
+    for pct, counts in prog:
+        out.series("progress", f"{ingest} progression: {pct}% of keys", counts, label="shard", strategy=strategy, pct=pct)
+
+
+def emit_autosplit_progress(args: argparse.Namespace, splits: List[int], out: Emitter, trace: KeySource | None = None) -> None:
+    ingest = ingest_label(trace)
+    if args.nodes and args.nodes > 0:
+        with replay_rate(out, trace, "auto-split"):
+            prog2n = simulate_progress_range_autosplit_with_nodes(
+                args.n_keys, splits, steps=args.progress_steps,
+                threshold=args.autosplit_threshold, autosplit_where=args.autosplit_where,
+                nodes=args.nodes, rebalance_after_split=args.rebalance_after_split, trace=trace,
+            )
+        for pct, counts, sp, nodec in prog2n:
+            out.series("autosplit_ranges", lambda: f"{ingest} progression (auto-split): {pct}% of keys | splits={sp}",
+                       counts, label="range", strategy="range", pct=pct, splits=sp)
+            out.series("autosplit_nodes", f"Per-node load (nodes={args.nodes})", nodec, label="node", strategy="range", pct=pct)
+    else:
+        with replay_rate(out, trace, "auto-split"):
+            prog2 = simulate_progress_range_autosplit(args.n_keys, splits, steps=args.progress_steps, threshold=args.autosplit_threshold,
+                                                      autosplit_where=args.autosplit_where, trace=trace)
+        for pct, counts, sp in prog2:
+            out.series("autosplit_ranges", lambda: f"{ingest} progression (auto-split): {pct}% of keys | splits={sp}",
+                       counts, label="range", strategy="range", pct=pct, splits=sp)
+
+def emit_hot_keys(args: argparse.Namespace, out: Emitter, engine: str, strategies: List[Tuple[str, List[int] | None]],
+                  trace: KeySource | None = None) -> None:
+    """Stream the keys (the trace or workload, else --n-keys uniform random keys) through
+    HeavyHitters and report the hottest ones with the shard each one pins per strategy. A key
+    alone worth --hot-threshold of a balanced shard's load is a salting candidate; a range
+    whose hot keys together reach that much is a split candidate."""
+    hh = HeavyHitters(capacity=max(1024, 8 * args.hot_keys), engine=engine)
+    with replay_rate(out, trace, "hot-key detection"):
+        if engine == "numpy":
+            batches = key_batches(args.n_keys, "random", trace)
+        else:
+            keys = key_stream(args.n_keys, "random", trace)
+            batches = iter(lambda: list(islice(keys, BATCH_SIZE)), [])
+        for batch in profile_batches(batches):
+            hh.add(batch)
+    hot = hh.top(args.hot_keys)
+    fair = hh.total / args.shards if args.shards else 0
+    routes = [(strat, router_for(strat, args.shards, splits, args.hash_scheme)) for strat, splits in strategies]
+    hot_load = {strat: [0] * args.shards for strat, _ in routes}
+    for h in hot:
+        for strat, route in routes:
+            hot_load[strat][route(h.key)] += h.count
+    source = trace.label if trace is not None else "uniform random"
+    out.note(f"\nHot keys: top {len(hot)} of {hh.total:,} {source} ops | count-min estimates overcount by <= {hh.error_bound:,}, "
+             f"{len(hh.candidates)} candidates tracked")
+    out.note(f"  {'rank':>4} {'key':>12} {'ops':>10} {'share':>7} {'x shard':>8}  " + "  ".join(f"{strat + ' shard':>11}" for strat, _ in routes) + "  candidate")
+    for rank, h in enumerate(hot, start=1):
+        shards = {strat: route(h.key) for strat, route in routes}
+        load = h.count / fair if fair else 0.0  # this key alone, in balanced-shard loads
+        if load >= args.hot_threshold:
+            candidate = "salt"
+        elif "range" in shards and hot_load["range"][shards["range"]] >= args.hot_threshold * fair:
+            candidate = "split"
+        else:
+            candidate = "-"
+        out.row("hot_keys", lambda: f"  {rank:4d} {h.key:12d} {h.count:10d} {100 * h.share:6.2f}% {load:8.3f}  "
+                                    + "  ".join(f"{shards[strat]:11d}" for strat, _ in routes) + f"  {candidate}",
+                rank=rank, key=h.key, ops=h.count, share=h.share, shard_load=load, candidate=candidate,
+                **{f"{strat}_shard": shard for strat, shard in shards.items()})
+    for strat, _ in routes:
+        out.series("hot_shard_load", f"{strat}: ops on the top {len(hot)} keys per shard", hot_load[strat], label="shard", strategy=strat)
+
+
 def parse_splits(text: str) -> List[int]:
     parts = [int(p.strip()) for p in text.split(",") if p.strip()]
-    if sorted(parts) != parts:
-        raise ValueError("splits must be ascending integers")
+    if any(b <= a for a, b in zip(parts, parts[1:])):
+        raise ValueError("splits must be strictly ascending integers")
     return parts
 
 
@@ -327,81 +2805,323 @@ def main():
     ap.add_argument("--nodes", type=int, default=0, help="When >0 and using range+auto-split: number of nodes to show per-node load distribution")
     ap.add_argument("--rebalance-after-split", action="store_true", help="When using range+auto-split with nodes>0: assign the new right range to the least loaded node")
     ap.add_argument("--progress-steps", type=int, default=5, help="Steps to show for sequential ingest progression")
+    ap.add_argument("--split-policy", choices=["size", "load"], default="size", help="With --auto-split: 'size' splits the tail range by key share (threshold); 'load' splits any range above --split-qps and rebalances ranges across --nodes")
+    ap.add_argument("--split-qps", type=float, default=250.0, help="With --split-policy load: per-range QPS above which a range is split")
+    ap.add_argument("--qps-window", type=float, default=1.0, help="With --split-policy load: seconds of simulated time per load window")
+    ap.add_argument("--rebalance-interval", type=int, default=1, help="With --split-policy load: rebalance every N windows (0 disables)")
+    ap.add_argument("--rebalance-tolerance", type=float, default=0.1, help="With --split-policy load: move ranges while the busiest node exceeds the mean QPS by this fraction")
+    ap.add_argument("--load-keys", choices=["sequential", "random"], default="sequential", help="With --split-policy load: key order of the ingest")
+    ap.add_argument("--engine", choices=ENGINES, default="python", help="Key routing engine: pure Python or NumPy array batches (falls back to python without NumPy)")
+    ap.add_argument("--workers", type=int, default=0, help="When >0: split the key space into chunks counted by a pool of N processes (static and non-auto-split progression views)")
+    ap.add_argument("--hash", dest="hash_scheme", choices=list(PARTITIONERS), default="sha1", help="Hash partitioner for hash sharding and salt buckets (default: sha1)")
+    ap.add_argument("--bench-hash", action="store_true", help="Measure keys/s of each hash partitioner over --n-keys keys and exit")
+    ap.add_argument("--reshard", type=str, default="", help="BEFORE:AFTER node counts (e.g. 4:5): report keys/bytes moved per strategy (modulo, jump, yb16, range) and exit")
+    ap.add_argument("--reshard-units", type=int, default=0, help="With --reshard: tablets/ranges for yb16 and range (default: 8 per node of the larger cluster)")
+    ap.add_argument("--row-bytes", type=int, default=256, help="With --reshard: average bytes per key, to convert moved keys into rebalance traffic")
+    ap.add_argument("--load-sim", action="store_true", help="Discrete-event load simulation of --n-keys sequential inserts: per-node ops/s, queue depth and p50/p99 latency over time, then exit")
+    ap.add_argument("--arrival-rate", type=float, default=1000.0, help="With --load-sim or --split-policy load: offered load in ops/s")
+    ap.add_argument("--node-capacity", type=str, default="500", help="With --load-sim: service capacity in ops/s per node (one value, or comma-separated per node)")
+    ap.add_argument("--service", choices=["exp", "const"], default="exp", help="With --load-sim: exponential or constant service times")
+    ap.add_argument("--scan-sim", action="store_true", help="Range/prefix scan cost per placement (range, hash, hash-prefix, salted): shards touched, rows read per shard and scatter-gather latency, then exit")
+    ap.add_argument("--scan-queries", type=int, default=100000, help="With --scan-sim: number of queries")
+    ap.add_argument("--scan-kind", choices=SCAN_KINDS, default="range", help="With --scan-sim: 'range' scans of --scan-length keys, or 'prefix' queries reading one whole prefix of --prefix-width keys")
+    ap.add_argument("--scan-length", type=int, default=100, help="With --scan-sim: keys per range scan")
+    ap.add_argument("--prefix-width", type=int, default=100, help="With --scan-sim: consecutive keys sharing a prefix (e.g. posts per author); hash-prefix hashes the prefix")
+    ap.add_argument("--scan-limit", type=int, default=0, help="With --scan-sim: ORDER BY key DESC LIMIT n (0: read every key in the interval)")
+    ap.add_argument("--scan-rtt-ms", type=float, default=0.5, help="With --scan-sim: round trip of a query")
+    ap.add_argument("--scan-seek-ms", type=float, default=0.05, help="With --scan-sim: cost of each sub-scan on a shard")
+    ap.add_argument("--scan-row-us", type=float, default=1.0, help="With --scan-sim: cost per row read")
+    ap.add_argument("--scan-jitter-ms", type=float, default=0.2, help="With --scan-sim: mean exponential delay per shard (the slowest of k shards adds jitter * H(k))")
+    ap.add_argument("--trace", type=str, default="", help="Replay the keys of a captured trace (binary int64 records or CSV, streamed) instead of 1..N; --n-keys becomes the trace length")
+    ap.add_argument("--trace-format", choices=TRACE_FORMATS, default="auto", help="With --trace: 'bin' (little-endian int64 records) or 'csv'; auto picks csv for *.csv files")
+    ap.add_argument("--trace-fields", type=str, default="key", help="With a binary --trace: comma-separated names of the int64 fields of each record, e.g. key,ts,op")
+    ap.add_argument("--trace-key", type=str, default="key", help="With --trace: field holding the key (default 'key', else the first field)")
+    ap.add_argument("--trace-time", type=str, default="", help="With --trace: field holding the op time (seconds or ISO 8601); paces --load-sim instead of --arrival-rate")
+    ap.add_argument("--trace-time-scale", type=float, default=1.0, help="With --trace-time: seconds per time unit (e.g. 1e-6 for microseconds)")
+    ap.add_argument("--trace-op", type=str, default="op", help="With --trace-ops: field holding the op type")
+    ap.add_argument("--trace-ops", type=str, default="", help="With --trace: comma-separated op types to replay (e.g. insert,update), others are skipped")
+    ap.add_argument("--workload", choices=WORKLOADS, default=None, help="Replay --n-keys ops drawn from a skewed workload instead of the keys 1..N: zipf (celebrity authors), hotspot (a viral window of keys) or decay (recent posts are hot)")
+    ap.add_argument("--zipf-s", type=float, default=1.1, help="With --workload zipf: exponent s (rank r has weight 1/r^s)")
+    ap.add_argument("--hot-fraction", type=float, default=0.001, help="With --workload hotspot: fraction of the key space in the hot window")
+    ap.add_argument("--hot-share", type=float, default=0.5, help="With --workload hotspot: fraction of the ops hitting the hot window")
+    ap.add_argument("--decay-keys", type=float, default=1000.0, help="With --workload decay: mean age, in keys, of the key each op reads")
+    ap.add_argument("--hot-keys", type=int, default=0, help="When >0: report the N hottest keys (streaming count-min sketch, bounded memory) and the shard each one pins")
+    ap.add_argument("--hot-threshold", type=float, default=0.5, help="With --hot-keys: flag a key (salt) or its range (split) once it carries this fraction of a balanced shard's load")
+    ap.add_argument("--plan-splits", action="store_true", help="Stream the keys (1..N, --trace or --workload) through a quantile sketch and print --shards - 1 split points that balance them, their predicted imbalance against even splits, and the pre-split SQL, then exit")
+    ap.add_argument("--sketch-k", type=int, default=200, help="With --plan-splits: sketch accuracy (about 3 x k keys kept, rank error O(1/k))")
+    ap.add_argument("--sql-dialect", choices=SQL_DIALECTS + ("both",), default="both",
+                    help="With --plan-splits: emit CockroachDB ALTER TABLE ... SPLIT AT, YugabyteDB CREATE TABLE ... SPLIT AT VALUES, "
+                         "both of them, or (yugabyte-index) a range index split at the same points")
+    ap.add_argument("--sql-table", type=str, default="post", help="With --plan-splits: table to pre-split")
+    ap.add_argument("--sql-column", type=str, default="id", help="With --plan-splits: its range-sharded key column")
+    ap.add_argument("--sql-out", type=str, default="", help="With --plan-splits: also write the statements to this .sql file")
+    ap.add_argument("--format", choices=FORMATS, default="text", help="Output: ASCII histograms (text), or every series, split list and row as one JSON document or long-format CSV")
+    ap.add_argument("--profile", action="store_true", help="Report wall time, keys/s and peak RSS per phase (keygen, hashing, routing, histogram, autosplit, output, ...) after the results")
+    ap.add_argument("--profile-alloc", action="store_true", help="With --profile: also trace the Python heap peak of each phase (tracemalloc, several times slower)")
     args = ap.parse_args()
 
     if args.shards < 1:
         raise SystemExit("--shards must be >= 1")
+    if args.shards > 0xFFFF and (args.hash_scheme == "yb16" or args.bench_hash):
+        raise SystemExit(f"--shards: the yb16 hash supports at most {0xFFFF} tablets")
+    if args.split_policy == "load" and not args.auto_split:
+        raise SystemExit("--split-policy load applies to --auto-split runs: add --auto-split")
+    if args.splits:
+        try:
+            parse_splits(args.splits)
+        except ValueError as exc:
+            raise SystemExit(f"--splits: {exc}")
+    if args.load_sim:
+        nodes = args.nodes if args.nodes > 0 else args.shards
+        try:
+            caps = [float(c) for c in args.node_capacity.split(",") if c.strip()]
+        except ValueError:
+            caps = []
+        if len(caps) not in (1, nodes) or min(caps) <= 0:
+            raise SystemExit(f"--node-capacity must be one value > 0 or one per node ({nodes} nodes)")
+        if args.arrival_rate <= 0:
+            raise SystemExit("--arrival-rate must be > 0")
+    engine = resolve_engine(args.engine)
+    if engine != args.engine:
+        print(f"NumPy is not installed: using the {engine} engine", file=sys.stderr)
+    trace = None
+    if args.trace and args.workload:
+        raise SystemExit("--trace and --workload are alternative key sources")
+    if (args.trace or args.workload) and (args.bench_hash or args.reshard or args.scan_sim):
+        raise SystemExit(f"--{'trace' if args.trace else 'workload'} replays through the static, progression, auto-split, salted and load simulators and --plan-splits only")
+    if args.plan_splits and args.sketch_k < 8:
+        raise SystemExit("--sketch-k must be >= 8")
+    if args.workload:
+        try:
+            trace = Workload(args.workload, args.n_keys, zipf_s=args.zipf_s, hot_fraction=args.hot_fraction,
+                             hot_share=args.hot_share, decay_keys=args.decay_keys)
+        except ValueError as exc:
+            raise SystemExit(f"--workload: {exc}")
+    if args.trace:
+        try:
+            trace = KeyTrace(args.trace, fmt=args.trace_format, fields=[f.strip() for f in args.trace_fields.split(",")],
+                             key_field=args.trace_key, time_field=args.trace_time or None, op_field=args.trace_op,
+                             ops=[o.strip() for o in args.trace_ops.split(",") if o.strip()], time_scale=args.trace_time_scale)
+            if args.workers > 0 and not trace.sliceable:
+                raise ValueError("--workers replays binary traces without --trace-ops only")
+            args.n_keys = len(trace)
+            if not args.n_keys:
+                raise ValueError(f"{args.trace} has no keys to replay")
+        except (OSError, ValueError) as exc:
+            raise SystemExit(f"--trace: {exc}")
+    global PROFILER
+    if args.profile or args.profile_alloc:
+        PROFILER = Profiler(trace_alloc=args.profile_alloc)
+    out = Emitter(args.format, params=dict(vars(args), engine=engine))
+    with worker_pool(args.workers):
+        run(args, engine, out, trace)
+    out.close(PROFILER.report() if PROFILER is not None else None)
+
+
+def run(args: argparse.Namespace, engine: str, out: Emitter, trace: KeySource | None = None) -> None:
+    if args.bench_hash:
+        out.note(f"Hash partitioner throughput ({args.n_keys} keys, {args.shards} shards, engine={engine})")
+        for name, rate in bench_partitioners(args.n_keys, args.shards, engine=engine):
+            out.row("bench_hash", lambda: f"  {name:<13} {rate:14,.0f} keys/s  ({PARTITIONERS[name].description})",
+                    hash=name, keys_per_s=rate)
+        return
+
+    if args.reshard:
+        try:
+            before, after = (int(p) for p in args.reshard.split(":"))
+        except ValueError:
+            raise SystemExit("--reshard must look like BEFORE:AFTER, e.g. 4:5")
+        units = args.reshard_units or 8 * max(before, after)
+        if units > 0xFFFF:
+            raise SystemExit(f"--reshard-units: yb16 supports at most {0xFFFF} tablets")
+        router = None
+        if args.auto_split:
+            # Ranges produced by auto-split ingest on the `before` cluster, starting from the
+            # --splits/--shards ranges (honours --rebalance-after-split)
+            router = RangeRouter(parse_splits(args.splits) if args.splits else even_splits(args.shards, args.n_keys), nodes=before)
+            simulate_progress_range_autosplit_with_nodes(
+                args.n_keys, [], steps=1, threshold=args.autosplit_threshold, autosplit_where=args.autosplit_where,
+                nodes=before, rebalance_after_split=args.rebalance_after_split, router=router,
+            )
+        reports = simulate_reshard(args.n_keys, before, after, units, row_bytes=args.row_bytes,
+                                   hash_scheme=args.hash_scheme, engine=engine, range_router=router)
+        out.note(f"Resharding {before} -> {after} nodes: {args.n_keys} keys x {args.row_bytes} B, {units} tablets/ranges")
+        for r in reports:
+            pct = (100.0 * r.keys_moved / args.n_keys) if args.n_keys else 0.0
+            peak = max(range(len(r.ingress)), key=r.ingress.__getitem__)
+            out.row("reshard", lambda: f"  {r.strategy:<7} moved {r.keys_moved:10d} keys ({pct:5.1f}%) {fmt_bytes(r.bytes_moved):>10} | "
+                                       f"peak ingress node {peak:02d}: {r.ingress[peak]} keys ({fmt_bytes(r.ingress[peak] * args.row_bytes)})",
+                    strategy=r.strategy, keys_moved=r.keys_moved, moved_pct=pct, bytes_moved=r.bytes_moved,
+                    peak_node=peak, ingress=r.ingress, egress=r.egress)
+        for r in reports:
+            out.series("reshard_ingress", f"{r.strategy}: per-node ingress (keys received)", r.ingress, label="node", strategy=r.strategy)
+        return
+
+    if args.load_sim:
+        nodes = args.nodes if args.nodes > 0 else args.shards
+        caps = [float(c) for c in args.node_capacity.split(",") if c.strip()]
+        capacity: float | List[float] = caps[0] if len(caps) == 1 else caps
+        if args.compare:
+            strategies = list(LOAD_STRATEGIES)
+        elif args.auto_split:
+            strategies = ["autosplit"]
+        elif args.strategy == "range" and args.salt_buckets > 0:
+            strategies = ["salted"]
+        else:
+            strategies = [args.strategy]
+        duration = args.n_keys / args.arrival_rate
+        arrivals = None
+        if trace is not None and trace.time_field:
+            st = trace.stats()
+            duration = (st.last_time - st.first_time) if st.keys and st.last_time > st.first_time else duration
+        window = duration / max(1, args.progress_steps)
+        for strat in strategies:
+            splits = None
+            if args.splits and strat in ("range", "autosplit"):
+                splits = parse_splits(args.splits)
+            elif trace is not None:
+                splits = domain_splits(nodes, args.n_keys, trace)
+            if trace is not None and trace.time_field:
+                arrivals = trace.times()
+            placed = load_placements(
+                strat, nodes, args.n_keys,
+                splits=splits,
+                buckets=args.salt_buckets or 8, hash_scheme=args.hash_scheme,
+                threshold=args.autosplit_threshold, autosplit_where=args.autosplit_where,
+                rebalance_after_split=args.rebalance_after_split, engine=engine, trace=trace,
+            )
+            offered = "trace timestamps" if arrivals is not None else f"{args.arrival_rate:g} ops/s offered"
+            out.note(f"\nLoad simulation: {strat} on {nodes} nodes | {offered}, "
+                     f"capacity {args.node_capacity} ops/s per node, {args.service} service, {args.n_keys} ops")
+            with replay_rate(out, trace, f"{strat} load simulation"):
+                windows = simulate_load(placed, nodes, args.arrival_rate, capacity, window, service=args.service, arrivals=arrivals)
+            out.note(f"  {'t(s)':>8} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9}  max queue per node")
+            for w in windows:
+                out.row("load_window", lambda: f"  {w.t_end:8.2f} {sum(w.ops_per_s):10.1f} {w.p50_ms:9.2f} {w.p99_ms:9.2f}  {w.max_queue}",
+                        strategy=strat, t_end=w.t_end, ops_per_s=sum(w.ops_per_s), p50_ms=w.p50_ms, p99_ms=w.p99_ms,
+                        max_queue=w.max_queue, node_ops_per_s=w.ops_per_s, node_p99_ms=w.node_p99_ms)
+            total = [sum(w.ops_per_s[n] for w in windows) * window for n in range(nodes)]
+            out.series("load_node_ops", f"{strat}: ops completed per node", [round(c) for c in total], label="node", strategy=strat)
+        return
+
+    if args.scan_sim:
+        if args.compare:
+            strategies = list(SCAN_STRATEGIES)
+        elif args.strategy == "range" and args.salt_buckets > 0:
+            strategies = ["salted"]
+        else:
+            strategies = [args.strategy]
+        layouts = scan_layouts(strategies, args.shards, args.n_keys, parse_splits(args.splits) if args.splits else None,
+                               buckets=args.salt_buckets or 8, prefix_width=args.prefix_width, hash_scheme=args.hash_scheme)
+        cost = ScanCost(args.scan_rtt_ms, args.scan_seek_ms, args.scan_row_us, args.scan_jitter_ms)
+        with profile_phase("keygen", args.scan_queries):
+            los, his = gen_scan_queries(args.scan_queries, args.n_keys, args.scan_kind, args.scan_length, args.prefix_width)
+        size = f"{min(args.scan_length, args.n_keys)} keys" if args.scan_kind == "range" else f"prefixes of {args.prefix_width} keys"
+        out.note(f"Scan cost: {args.scan_queries} {args.scan_kind} queries ({size}) over {args.n_keys} keys | "
+                 f"limit {args.scan_limit or 'none'} | rtt {args.scan_rtt_ms:g} ms, seek {args.scan_seek_ms:g} ms, "
+                 f"{args.scan_row_us:g} us/row, jitter {args.scan_jitter_ms:g} ms")
+        out.note(f"  {'strategy':<12} {'shards':>6} {'touched':>8} {'p99':>5} {'scans/q':>8} {'rows/q':>9} "
+                 f"{'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        reports = [simulate_scans(layout, los, his, args.scan_limit, cost, engine=engine) for layout in layouts]
+        for r in reports:
+            q = max(1, r.queries)
+            touched = sum(k * c for k, c in enumerate(r.fanout)) / q
+            p99_touched = percentile_of_counts(r.fanout, 99)
+            mean, p50, p99, top = r.latency_ms
+            out.row("scan", lambda: f"  {r.strategy:<12} {len(r.shard_rows):6d} {touched:8.2f} {p99_touched:5d} {r.requests / q:8.2f} "
+                                    f"{r.rows / q:9.1f} {mean:8.3f} {p50:8.3f} {p99:8.3f} {top:8.3f}",
+                    strategy=r.strategy, shards=len(r.shard_rows), queries=r.queries, touched_mean=touched, touched_p99=p99_touched,
+                    requests=r.requests, rows=r.rows, mean_ms=mean, p50_ms=p50, p99_ms=p99, max_ms=top)
+        for r in reports:
+            used = max((k for k, c in enumerate(r.fanout) if c), default=0)
+            out.series("scan_fanout", f"{r.strategy}: queries by shards touched", r.fanout[:used + 1], label="shards", strategy=r.strategy)
+            out.series("scan_shard_rows", f"{r.strategy}: rows read per shard", [round(x) for x in r.shard_rows], label="shard", strategy=r.strategy)
+        return
+
+    if args.plan_splits:
+        plan = plan_splits(args.shards, args.n_keys, k=args.sketch_k, engine=engine, trace=trace)
+        source = f"keys 1..{args.n_keys}" if trace is None else f"{args.n_keys} keys ({trace.label})"
+        out.note(f"Pre-split plan: {args.shards} ranges from {source} | quantile sketch k={args.sketch_k}, "
+                 f"{plan.sketch_items} keys kept")
+        out.splits("plan_splits", "Planned splits (equal predicted keys per range)", plan.splits)
+        out.splits("plan_even_splits", "Even splits over the same key range", plan.even_splits)
+        for name, counts in (("planned", plan.predicted), ("even", plan.even_predicted)):
+            worst, least = imbalance(counts)
+            out.row("plan_imbalance", lambda: f"  {name:<8} predicted max/mean {worst:6.2f}  min/mean {least:5.2f}",
+                    splits=name, max_over_mean=worst, min_over_mean=least)
+        for name, counts in (("planned", plan.predicted), ("even", plan.even_predicted)):
+            out.series("plan_range_keys", f"{name} splits: predicted keys per range", counts, label="range", splits=name)
+        statements = []
+        for dialect in (("cockroach", "yugabyte") if args.sql_dialect == "both" else (args.sql_dialect,)):
+            sql = presplit_sql(dialect, args.sql_table, args.sql_column, plan.splits)
+            header = f"-- {SQL_DIALECT_TITLES[dialect]}"
+            out.note("\n" + header)
+            for stmt in sql:
+                out.row("presplit_sql", lambda: stmt, dialect=dialect, statement=stmt)
+            statements += [header] + sql
+        if args.sql_out:
+            with open(args.sql_out, "w") as f:
+                f.write("\n".join(statements) + "\n")
+        return
 
     if args.compare:
         # Determine splits automatically for range based on uniform domain
-        splits = even_splits(args.shards, args.n_keys)
-        print(f"Auto range splits for compare: {splits}")
+        splits = domain_splits(args.shards, args.n_keys, trace)
+        out.splits("range_splits", "Auto range splits for compare", splits, strategy="range")
         for strat in ("range", "hash"):
-            print("\n" + "=" * 12 + f" {strat.upper()} " + "=" * 12)
-            sim = simulate(strat, args.shards, args.n_keys, splits if strat == "range" else None)
-            print_hist("Sequential keys (overall)", sim["sequential_all"], label="shard")
-            print_hist("Random keys (overall)", sim["random_all"], label="shard")
+            title = strat.upper() if strat == "range" or args.hash_scheme == "sha1" else f"HASH ({args.hash_scheme})"
+            out.note("\n" + "=" * 12 + f" {title} " + "=" * 12)
+            with replay_rate(out, trace, f"{strat} static"):
+                sim = simulate(strat, args.shards, args.n_keys, splits if strat == "range" else None, engine=engine, workers=args.workers, hash_scheme=args.hash_scheme, trace=trace)
+            emit_overall(out, strat, sim, trace)
 
             # Ingest progression (sequential only)
-            if strat == "range" and args.auto_split:
-                if args.nodes and args.nodes > 0:
-                    prog2n = simulate_progress_range_autosplit_with_nodes(
-                        args.n_keys, splits, steps=args.progress_steps,
-                        threshold=args.autosplit_threshold, autosplit_where=args.autosplit_where,
-                        nodes=args.nodes, rebalance_after_split=args.rebalance_after_split,
-                    )
-                    for pct, counts, sp, nodec in prog2n:
-                        print_hist(f"Sequential ingest progression (auto-split): {pct}% of keys | splits={sp}", counts, label="range")
-                        print_hist(f"Per-node load (nodes={args.nodes})", nodec, label="node")
-                else:
-                    prog2 = simulate_progress_range_autosplit(args.n_keys, splits, steps=args.progress_steps, threshold=args.autosplit_threshold, autosplit_where=args.autosplit_where)
-                    for pct, counts, sp in prog2:
-                        print_hist(f"Sequential ingest progression (auto-split): {pct}% of keys | splits={sp}", counts, label="range")
+            if strat == "range" and args.auto_split and args.split_policy == "load":
+                print_loadsplit_progress(args, splits, out, trace)
+            elif strat == "range" and args.auto_split:
+                emit_autosplit_progress(args, splits, out, trace)
             else:
-                prog = simulate_progress(strat, args.shards, args.n_keys, splits if strat == "range" else None, steps=args.progress_steps)
-                for pct, counts in prog:
-                    print_hist(f"Sequential ingest progression: {pct}% of keys", counts, label="shard")
+                with replay_rate(out, trace, f"{strat} progression"):
+                    prog = simulate_progress(strat, args.shards, args.n_keys, splits if strat == "range" else None, steps=args.progress_steps, engine=engine, workers=args.workers, hash_scheme=args.hash_scheme, trace=trace)
+                emit_progress(out, strat, prog, ingest_label(trace))
+        if args.hot_keys > 0:
+            emit_hot_keys(args, out, engine, [("range", splits), ("hash", None)], trace)
         return
 
     # Single strategy mode
     splits = None
     if args.strategy == "range":
-        splits = parse_splits(args.splits) if args.splits else even_splits(args.shards, args.n_keys)
+        splits = parse_splits(args.splits) if args.splits else domain_splits(args.shards, args.n_keys, trace)
         if len(splits) != max(0, args.shards - 1):
             raise SystemExit(f"For {args.shards} shards, need {args.shards - 1} split points (got {len(splits)}): {splits}")
-        print(f"Range splits: {splits}")
+        out.splits("range_splits", "Range splits", splits, strategy="range")
 
-    sim = simulate(args.strategy, args.shards, args.n_keys, splits)
-    print_hist("Sequential keys (overall)", sim["sequential_all"], label="shard")
-    print_hist("Random keys (overall)", sim["random_all"], label="shard")
+    with replay_rate(out, trace, f"{args.strategy} static"):
+        sim = simulate(args.strategy, args.shards, args.n_keys, splits, engine=engine, workers=args.workers, hash_scheme=args.hash_scheme, trace=trace)
+    emit_overall(out, args.strategy, sim, trace)
 
     if args.strategy == "range":
         if args.salt_buckets and args.salt_buckets > 0:
-            salted = simulate_range_with_salt(args.n_keys, splits, args.salt_buckets)
-            print_hist(f"Salted range: per-range distribution (buckets={args.salt_buckets})", salted["per_range"], label="range")
-            print_hist(f"Salted range: per-bucket distribution (buckets={args.salt_buckets})", salted["per_bucket"], label="bucket")
-            prog_s = simulate_progress_range_with_salt(args.n_keys, splits, args.salt_buckets, steps=args.progress_steps)
+            b = args.salt_buckets
+            with replay_rate(out, trace, "salted static"):
+                salted = simulate_range_with_salt(args.n_keys, splits, b, workers=args.workers, engine=engine, hash_scheme=args.hash_scheme, trace=trace)
+            out.series("salted_ranges", f"Salted range: per-range distribution (buckets={b})", salted["per_range"], label="range", strategy="range", buckets=b)
+            out.series("salted_buckets", f"Salted range: per-bucket distribution (buckets={b})", salted["per_bucket"], label="bucket", strategy="range", buckets=b)
+            with replay_rate(out, trace, "salted progression"):
+                prog_s = simulate_progress_range_with_salt(args.n_keys, splits, b, steps=args.progress_steps, hash_scheme=args.hash_scheme, trace=trace)
             for pct, pr, pb in prog_s:
-                print_hist(f"Salted range progression: {pct}% of keys (per-range)", pr, label="range")
-                print_hist(f"Salted range progression: {pct}% of keys (per-bucket)", pb, label="bucket")
+                out.series("salted_progress_ranges", f"Salted range progression: {pct}% of keys (per-range)", pr, label="range", strategy="range", pct=pct, buckets=b)
+                out.series("salted_progress_buckets", f"Salted range progression: {pct}% of keys (per-bucket)", pb, label="bucket", strategy="range", pct=pct, buckets=b)
+        elif args.auto_split and args.split_policy == "load":
+            print_loadsplit_progress(args, splits, out, trace)
         elif args.auto_split:
-            if args.nodes and args.nodes > 0:
-                prog2n = simulate_progress_range_autosplit_with_nodes(
-                    args.n_keys, splits, steps=args.progress_steps,
-                    threshold=args.autosplit_threshold, autosplit_where=args.autosplit_where,
-                    nodes=args.nodes, rebalance_after_split=args.rebalance_after_split,
-                )
-                for pct, counts, sp, nodec in prog2n:
-                    print_hist(f"Sequential ingest progression (auto-split): {pct}% of keys | splits={sp}", counts, label="range")
-                    print_hist(f"Per-node load (nodes={args.nodes})", nodec, label="node")
-            else:
-                prog2 = simulate_progress_range_autosplit(args.n_keys, splits, steps=args.progress_steps, threshold=args.autosplit_threshold, autosplit_where=args.autosplit_where)
-                for pct, counts, sp in prog2:
-                    print_hist(f"Sequential ingest progression (auto-split): {pct}% of keys | splits={sp}", counts, label="range")
+            emit_autosplit_progress(args, splits, out, trace)
         else:
-            prog = simulate_progress(args.strategy, args.shards, args.n_keys, splits, steps=args.progress_steps)
-            for pct, counts in prog:
-                print_hist(f"Sequential ingest progression: {pct}% of keys", counts, label="shard")
+            with replay_rate(out, trace, "range progression"):
+                prog = simulate_progress(args.strategy, args.shards, args.n_keys, splits, steps=args.progress_steps, engine=engine, workers=args.workers, hash_scheme=args.hash_scheme, trace=trace)
+            emit_progress(out, args.strategy, prog, ingest_label(trace))
+    if args.hot_keys > 0:
+        emit_hot_keys(args, out, engine, [(args.strategy, splits)], trace)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,398 @@
+"""
+Engine parity checks for sharding_demo: the numpy engine, the process pool and the key sources
+must give exactly the counts of the pure-Python reference.
+
+  python -m pytest -q sharding_demo
+"""
+import argparse
+import io
+import random
+from array import array
+from collections import Counter
+
+import pytest
+
+import bench
+import sharding_demo as sd
+
+np = pytest.importorskip("numpy")
+
+SCHEMES = list(sd.PARTITIONERS)
+
+
+@pytest.mark.parametrize("scheme", SCHEMES)
+@pytest.mark.parametrize("shards", [1, 7, 64])
+def test_hash_partitioner_batch_matches_per_key(scheme, shards):
+    keys = list(range(1, 3000)) + [2**40 + 17, 2**62 - 1]
+    batch = sd.hash_shard_batch(np.array(keys, dtype=np.int64), shards, scheme).tolist()
+    assert batch == [sd.hash_shard(k, shards, scheme) for k in keys]
+
+
+@pytest.mark.parametrize("scheme", SCHEMES)
+def test_salt_batch_matches_per_key(scheme):
+    keys = list(range(1, 3000))
+    assert sd.salt_batch(np.array(keys, dtype=np.int64), 8, scheme).tolist() == [sd.salt_of(k, 8, scheme) for k in keys]
+
+
+def test_assign_range_batch_matches_per_key():
+    splits = [10, 250, 251, 1000]
+    keys = list(range(-5, 1200))
+    assert sd.assign_range_batch(np.array(keys, dtype=np.int64), splits).tolist() == [sd.assign_range(k, splits) for k in keys]
+
+
+@pytest.mark.parametrize("strategy,scheme", [("range", "sha1"), ("hash", "sha1"), ("hash", "murmur3"), ("hash", "jump")])
+def test_simulate_engines_match(strategy, scheme):
+    n = 3 * sd.BATCH_SIZE // 2
+    splits = sd.even_splits(5, n) if strategy == "range" else None
+    random.seed(7)
+    py = sd.simulate(strategy, 5, n, splits, engine="python", hash_scheme=scheme)
+    random.seed(7)
+    assert sd.simulate(strategy, 5, n, splits, engine="numpy", hash_scheme=scheme) == py
+
+
+@pytest.mark.parametrize("strategy", ["range", "hash"])
+@pytest.mark.parametrize("n", [3, 1000, sd.BATCH_SIZE + 5])
+def test_progress_checkpoints_engines_match(strategy, n):
+    splits = [n // 4, n // 2] if strategy == "range" else None
+    py = sd.simulate_progress(strategy, 3, n, splits, steps=5, engine="python")
+    assert sd.simulate_progress(strategy, 3, n, splits, steps=5, engine="numpy") == py
+    assert [pct for pct, _ in py] == [20, 40, 60, 80, 100]
+    assert sum(py[-1][1]) == n
+
+
+def test_parse_splits_rejects_repeated_points():
+    assert sd.parse_splits("5, 9,12") == [5, 9, 12]
+    for text in ("5,5", "9,5"):
+        with pytest.raises(ValueError):
+            sd.parse_splits(text)
+
+
+def test_range_router_invariants_under_random_splits_merges_and_moves():
+    rng = random.Random(11)
+    router = sd.RangeRouter([100, 200, 300], nodes=3)
+    n = 0
+    for _ in range(3000):
+        op = rng.random()
+        if op < 0.5:
+            k = rng.randint(-50, 500)
+            assert router.add(k) == sd.assign_range(k, list(router.splits))
+            n += 1
+        elif op < 0.7:
+            idx = rng.randrange(len(router))
+            lo = router.lower(idx) if router.lower(idx) is not None else -100
+            hi = router.upper(idx) if router.upper(idx) is not None else 600
+            if hi - lo >= 2:
+                right = router.split(idx, rng.randint(lo + 1, hi - 1), node=rng.randrange(3),
+                                     right_count=rng.randint(0, router.counts[idx]), right_hits=rng.randint(0, router.hits[idx]))
+                assert right == idx + 1
+        elif op < 0.85 and len(router) > 1:
+            router.merge(rng.randrange(len(router) - 1))
+        else:
+            router.move(rng.randrange(len(router)), rng.randrange(3))
+        splits = list(router.splits)
+        assert all(a < b for a, b in zip(splits, splits[1:]))
+        assert len(router.counts) == len(router.owners) == len(router.hits) == len(splits) + 1
+        assert sum(router.counts) == n and sum(router.hits) == n
+        assert list(router.node_counts) == [sum(c for c, o in zip(router.counts, router.owners) if o == i) for i in range(3)]
+        assert router.node_hits() == [sum(h for h, o in zip(router.hits, router.owners) if o == i) for i in range(3)]
+    for k in range(-60, 620, 7):
+        assert router.lookup(k) == sd.assign_range(k, list(router.splits))
+    with pytest.raises(ValueError):
+        router.split(0, router.splits[0])  # the upper bound itself is not inside range 0
+
+
+@pytest.mark.parametrize("engine,strategy", [("python", "range"), ("numpy", "hash")])
+def test_workers_match_serial_including_seeded_random(engine, strategy):
+    n = sd.PARALLEL_CHUNK + 3000  # two chunks, so the pool is used
+    splits = [n // 5, n // 2, n - 10] if strategy == "range" else None
+    runs = []
+    for workers in (0, 2):
+        random.seed(1)
+        runs.append(sd.simulate(strategy, 4, n, splits, engine=engine, workers=workers, hash_scheme="xxhash-style"))
+    assert runs[0] == runs[1]
+    assert sum(runs[0]["random_all"]) == n
+
+
+def test_progress_workers_match_serial():
+    n = sd.PARALLEL_CHUNK + 3000
+    splits = [n // 3, n // 2]
+    serial = sd.simulate_progress("range", 3, n, splits, steps=4, engine="numpy")
+    assert sd.simulate_progress("range", 3, n, splits, steps=4, engine="numpy", workers=2) == serial
+
+
+@pytest.mark.parametrize("strategy", ["range", "hash", "salted"])
+def test_load_placements_engines_match(strategy):
+    n = sd.BATCH_SIZE + 10
+    py = list(sd.load_placements(strategy, 5, n, buckets=8, engine="python"))
+    assert list(sd.load_placements(strategy, 5, n, buckets=8, engine="numpy")) == py
+    assert py[:3] == [sd.placement_for(strategy, 5, n, buckets=8)(k) for k in (1, 2, 3)]
+
+
+def test_simulate_load_fifo_queue():
+    # Three ops at t=0 on one node serving 10 ops/s: they leave at 0.1, 0.2 and 0.3 s
+    (w,) = sd.simulate_load([0, 0, 0], 1, 1.0, 10.0, 1.0, service="const", arrivals=[5.0, 5.0, 5.0])
+    assert w.ops_per_s == [3.0] and w.max_queue == [3]
+    assert (w.p50_ms, w.p99_ms) == pytest.approx((200.0, 300.0))
+
+
+def test_refresh_lightest_matches_scan():
+    rng = random.Random(3)
+    loads = [0] * 7
+    heap = sd.NodeLoadHeap(loads)
+    for _ in range(2000):
+        loads[rng.randrange(7) if rng.random() < 0.3 else 6] += rng.randrange(1, 4)
+        assert heap.refresh_lightest(loads) == min(range(7), key=loads.__getitem__)
+
+
+@pytest.mark.parametrize("strategy", ["range", "hash"])
+def test_profiled_python_run_matches_unprofiled(monkeypatch, strategy):
+    n = sd.BATCH_SIZE + 7
+    splits = sd.even_splits(4, n) if strategy == "range" else None
+    plain = sd.simulate_progress(strategy, 4, n, splits, steps=3)
+    monkeypatch.setattr(sd, "PROFILER", sd.Profiler())
+    assert sd.simulate_progress(strategy, 4, n, splits, steps=3) == plain
+    phases = {p.phase: p.keys for p in sd.PROFILER.report()}
+    assert phases["keygen"] == phases["routing"] == phases["histogram"] == n
+
+
+def write_traces(tmp_path, records):
+    """The same key,ts,op records as a binary trace and as a CSV trace with a header."""
+    bin_path, csv_path = tmp_path / "t.bin", tmp_path / "t.csv"
+    np.array(records, dtype="<i8").tofile(bin_path)
+    csv_path.write_text("key,ts,op\n" + "".join(f"{k},{t},{op}\n" for k, t, op in records))
+    return str(bin_path), str(csv_path)
+
+
+@pytest.mark.parametrize("strategy", ["range", "hash"])
+def test_trace_replay_matches_across_formats_engines_and_workers(tmp_path, strategy):
+    rng = random.Random(4)
+    n = sd.BATCH_SIZE + 11
+    records = [(rng.randint(1, 10**6), i, rng.randint(0, 2)) for i in range(n)]
+    bin_path, csv_path = write_traces(tmp_path, records)
+    keys = [k for k, _, _ in records]
+    splits = [250_000, 500_000, 750_000] if strategy == "range" else None
+    expected = [0] * 4
+    for k in keys:
+        expected[sd.assign_range(k, splits) if splits else sd.hash_shard(k, 4, "sha1")] += 1
+    fields = ("key", "ts", "op")
+    for trace in (sd.KeyTrace(bin_path, fields=fields), sd.KeyTrace(csv_path)):
+        assert len(trace) == n and list(trace.keys()) == keys
+        for engine in ("python", "numpy"):
+            assert sd.simulate(strategy, 4, n, splits, engine=engine, trace=trace) == {"trace_all": expected}
+    with sd.worker_pool(2):
+        parallel = sd.simulate(strategy, 4, n, splits, engine="numpy", workers=2, trace=sd.KeyTrace(bin_path, fields=fields))
+    assert parallel == {"trace_all": expected}
+    kept = [k for k, _, op in records if op in (0, 2)]
+    assert list(sd.KeyTrace(bin_path, fields=fields, ops=["0", "2"]).keys()) == kept
+    assert list(sd.KeyTrace(csv_path, ops=["0", "2"]).keys()) == kept
+    assert list(sd.KeyTrace(csv_path, time_field="ts", time_scale=0.5).times())[:3] == [0.0, 0.5, 1.0]
+
+
+@pytest.mark.parametrize("body,error", [
+    ("1,5\n2\n3,6\n", r"t.csv:3: 1 column\(s\), field 'ts' needs 2"),
+    ("1,5\nx,6\n", r"t.csv:3: bad 'key' value 'x'"),
+    ("1,5\n\n2,yesterday\n", r"t.csv:4: bad 'ts' value 'yesterday'"),
+])
+def test_malformed_csv_trace_names_the_line(tmp_path, body, error):
+    path = tmp_path / "t.csv"
+    path.write_text("key,ts\n" + body)
+    with pytest.raises(ValueError, match=error):
+        len(sd.KeyTrace(str(path), time_field="ts"))
+
+
+@pytest.mark.parametrize("kind", sd.WORKLOADS)
+def test_workload_replay_matches_across_engines_slices_and_workers(kind):
+    n = sd.BATCH_SIZE + 500
+    load = sd.Workload(kind, n, seed=9, hot_fraction=0.01, decay_keys=50.0)
+    keys = list(load.keys())
+    assert len(keys) == n and 1 <= min(keys) and max(keys) <= n
+    assert np.concatenate(list(load.batches())).tolist() == keys
+    assert list(load.keys(100, sd.BATCH_SIZE + 20)) == keys[100:sd.BATCH_SIZE + 20]
+    assert list(sd.Workload(kind, n, seed=9, hot_fraction=0.01, decay_keys=50.0).keys()) == keys
+    splits = sd.even_splits(4, n)
+    serial = sd.simulate("range", 4, n, splits, engine="python", trace=load)
+    assert serial == {"trace_all": [sum(1 for k in keys if sd.assign_range(k, splits) == s) for s in range(4)]}
+    assert sd.simulate("range", 4, n, splits, engine="numpy", trace=load) == serial
+    with sd.worker_pool(2):
+        assert sd.simulate("range", 4, n, splits, engine="numpy", workers=2, trace=load) == serial
+
+
+def test_hotspot_workload_sends_its_share_to_the_window():
+    load = sd.Workload("hotspot", 100_000, seed=2, hot_fraction=0.01, hot_share=0.5)
+    keys = list(load.keys())
+    hot = sum(1 for k in keys if load._start <= k < load._start + load._width)
+    assert 0.5 < hot / len(keys) < 0.52  # plus the uniform ops that fall in the window
+
+
+@pytest.mark.parametrize("source", ["sequential", "uniform"])
+def test_planned_splits_of_uniform_keys_are_close_to_even(source):
+    n = 1_000_000
+    trace = sd.Workload("hotspot", n, seed=3, hot_fraction=1.0, hot_share=0.0) if source == "uniform" else None
+    random.seed(0)
+    plan = sd.plan_splits(16, n, engine="numpy", trace=trace)
+    assert 2 * 200 < plan.sketch_items <= 3 * 200
+    assert max(abs(a - b) for a, b in zip(plan.splits, plan.even_splits)) <= 0.005 * n
+    assert max(plan.predicted) / (n / 16) < 1.1
+
+
+def test_quantile_sketch_engines_keep_the_same_items():
+    n = 3 * sd.BATCH_SIZE + 17
+    load = sd.Workload("zipf", n, seed=1)
+    sketches = [sd.QuantileSketch(64, engine=engine, seed=5) for engine in ("python", "numpy")]
+    for batch in load.batches():
+        sketches[0].add(batch.tolist())
+        sketches[1].add(batch)
+    levels = [[sorted(level) for level in s.levels] for s in sketches]
+    assert levels[0] == [sorted(level.tolist()) for level in sketches[1].levels]
+    assert sum(len(level) << h for h, level in enumerate(sketches[0].levels)) == n
+    assert len(sketches[0]) <= sum(map(sketches[0].capacity, range(len(sketches[0].levels))))
+
+
+def test_presplit_sql_yugabyte_creates_the_range_sharded_table():
+    table = sd.presplit_sql("yugabyte", "post", "id", [10, 20])[-1]
+    assert table.startswith("CREATE TABLE post (id BIGSERIAL, user_id BIGINT")
+    assert table.endswith("PRIMARY KEY (id ASC)) SPLIT AT VALUES ((10), (20));")
+    assert "PRIMARY KEY (user_id ASC, id))" in sd.presplit_sql("yugabyte", "post", "user_id", [10])[-1]
+    assert sd.presplit_sql("yugabyte-index", "t", "k", [5]) == ["CREATE INDEX t_k_range_idx ON t (k ASC) SPLIT AT VALUES ((5));"]
+
+
+@pytest.mark.parametrize("placement", ["modulo", "jump"])
+def test_hash_move_flows_sum_to_n_and_match_engines(placement):
+    n = sd.BATCH_SIZE + 123
+    flows = sd.hash_move_flows(n, 4, 5, placement, hash_scheme="murmur3", engine="python")
+    assert sd.hash_move_flows(n, 4, 5, placement, hash_scheme="murmur3", engine="numpy") == flows
+    assert sum(map(sum, flows)) == n
+    moved = sum(flows[s][d] for s in range(5) for d in range(5) if s != d)
+    report = sd.move_report(placement, flows, 100)
+    assert report.keys_moved == moved == sum(report.egress) and report.bytes_moved == 100 * moved
+    expected = n / 5 if placement == "jump" else 4 * n / 5
+    assert abs(moved - expected) < 0.02 * n
+
+
+def test_reshard_reports_match_engines():
+    n = sd.BATCH_SIZE + 123
+    py = sd.simulate_reshard(n, 4, 5, 40, hash_scheme="xxhash-style", engine="python")
+    assert sd.simulate_reshard(n, 4, 5, 40, hash_scheme="xxhash-style", engine="numpy") == py
+    moved = {r.strategy: r.keys_moved for r in py}
+    assert moved["yb16"] < moved["modulo"] and moved["range"] < moved["modulo"]
+
+
+@pytest.mark.parametrize("after", [3, 5, 7])
+def test_rebalance_units_evens_out_nodes_to_one_unit(after):
+    loads = [50] * 40  # equal units: a one-unit spread is the best possible
+    owners = [i % 4 for i in range(40)]
+    for by in ("count", "load"):
+        new = sd.rebalance_units(loads, owners, after, by=by)
+        assert all(0 <= o < after for o in new)
+        per_node = [sum(l for l, o in zip(loads, new) if o == n) for n in range(after)]
+        assert max(per_node) - min(per_node) <= 50
+        flows = sd.unit_move_flows(loads, owners, new, max(4, after))
+        assert sum(map(sum, flows)) == sum(loads)
+
+
+def test_loadsplit_splits_a_hot_inner_range_at_a_key_inside_it():
+    n = 20_000
+    splits = sd.even_splits(4, n)
+    load = sd.Workload("hotspot", n, seed=3, hot_fraction=0.01, hot_share=0.8)
+    hot = range(load._start, load._start + load._width)
+    assert sd.assign_range(hot[0], splits) == sd.assign_range(hot[-1], splits) == 1  # not the tail range
+    step = sd.simulate_progress_range_loadsplit_with_nodes(n, splits, steps=1, nodes=3, arrival_rate=1000.0, split_qps=500.0,
+                                                          rebalance_interval=0, seed=1, trace=load)[-1]
+    new = sorted(set(step.splits) - set(splits))
+    assert step.splits_done == len(new) > 0
+    assert all(k in hot for k in new)
+    assert sum(step.counts) == sum(step.node_counts) == n
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rebalance_ranges_never_raises_node_skew(seed):
+    rng = random.Random(seed)
+    router = sd.RangeRouter(sorted(rng.sample(range(1, 1000), 15)), nodes=4)
+    for r in range(len(router)):
+        router.move(r, rng.randrange(4))
+    for _ in range(5000):
+        router.add(int(rng.paretovariate(1.2) * 50) % 1000)
+    heap = sd.NodeLoadHeap(router.node_hits())
+    before = max(heap.loads) - min(heap.loads)
+    assert sd.rebalance_ranges(router, heap, tolerance=0.1, max_moves=10) > 0
+    assert heap.loads == router.node_hits()
+    assert max(heap.loads) - min(heap.loads) <= before
+    assert list(router.node_counts) == [sum(c for c, o in zip(router.counts, router.owners) if o == i) for i in range(4)]
+
+
+def test_bench_compare_reports_only_drops_beyond_the_tolerance():
+    baseline = {"a@10": {"keys_per_s": 1000.0}, "b@10": {"keys_per_s": 1000.0}, "c@10": {"keys_per_s": 0}}
+    results = {"a@10": {"keys_per_s": 700.0}, "b@10": {"keys_per_s": 850.0}, "c@10": {"keys_per_s": 1.0}, "d@10": {"keys_per_s": 1.0}}
+    regressions = bench.compare(results, baseline, tolerance=0.2)
+    assert [key for key, _ in regressions] == ["a@10"]  # b is within 20%; c and d have no usable baseline
+    assert regressions[0][1] == pytest.approx(-0.3)
+
+
+@pytest.mark.parametrize("kind,limit", [("range", 0), ("range", 30), ("prefix", 0), ("prefix", 5)])
+def test_scan_engines_match(kind, limit):
+    n = 50_000
+    random.seed(4)
+    los, his = sd.gen_scan_queries(2000, n, kind, length=400, prefix_width=100)
+    uneven = sorted(random.sample(range(1, n), 20))
+    for layout in sd.scan_layouts(sd.SCAN_STRATEGIES, 8, n, buckets=4) + sd.scan_layouts(["range", "salted"], 8, n, splits=uneven):
+        py = sd.simulate_scans(layout, los, his, limit=limit, engine="python")
+        vec = sd.simulate_scans_numpy(layout, los, his, limit=limit)
+        assert (vec.fanout, vec.requests, vec.shard_requests) == (py.fanout, py.requests, py.shard_requests)
+        assert vec.shard_rows == pytest.approx(py.shard_rows) and vec.rows == pytest.approx(py.rows)
+        assert vec.latency_ms == pytest.approx(py.latency_ms)
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_scan_fanout_is_pinned_per_layout(engine):
+    n, shards, buckets = 10_000, 8, 4
+    rng, hashed, hash_prefix, salted = sd.scan_layouts(sd.SCAN_STRATEGIES, shards, n, buckets=buckets, prefix_width=100)
+    scan = lambda layout, lo, hi, limit=0: sd.simulate_scans(layout, array("q", [lo]), array("q", [hi]), limit=limit, engine=engine)
+    inside = scan(rng, 1260, 1300)  # inside the range (1250, 2500]
+    assert inside.fanout[1] == inside.requests == 1 and inside.rows == 41
+    across = scan(rng, 1200, 2600)  # three ranges
+    assert across.fanout[3] == 1 and across.requests == 3 and across.rows == 1401
+    for length in (1, shards, 1000):
+        assert scan(hashed, 500, 500 + length - 1).fanout[min(length, shards)] == 1
+    assert scan(hashed, 500, 501).fanout[shards] == 1  # an interval on a hashed key cannot be routed: it scatters
+    assert scan(hash_prefix, 101, 200).fanout[1] == 1 and scan(hash_prefix, 150, 250).fanout[shards] == 1
+    assert scan(salted, 1260, 1300).requests == buckets and scan(salted, 1200, 2600).requests == 3 * buckets
+    # limit caps the rows read: a range layout reads the top `limit` keys, salted `limit` per bucket
+    assert scan(rng, 1200, 2600, limit=10).rows == 10
+    assert scan(salted, 1200, 2600, limit=10).rows == 10 * buckets
+    assert scan(hash_prefix, 101, 200, limit=10).rows == 10
+    assert scan(hashed, 1, 1000, limit=10).rows == 10 * shards
+
+
+def zipf_heavy_hitters(engine, n=100_000, capacity=64):
+    load = sd.Workload("zipf", n, seed=7)
+    hh = sd.HeavyHitters(capacity=capacity, width=4096, engine=engine)
+    for batch in load.batches():
+        hh.add(batch if engine == "numpy" else batch.tolist())
+    return load, hh
+
+
+def test_heavy_hitters_engines_match_and_never_undercount():
+    load, py = zipf_heavy_hitters("python")
+    _, vec = zipf_heavy_hitters("numpy")
+    assert [list(row) for row in py.table] == vec.table.tolist()
+    assert py.candidates == vec.candidates and (py.floor, py.total) == (vec.floor, vec.total)
+    assert len(py.candidates) <= 2 * py.capacity
+    true = Counter(load.keys())
+    assert all(py.estimate(k) >= c for k, c in true.items())
+
+
+def test_heavy_hitters_top_are_the_hottest_zipf_ranks():
+    load, hh = zipf_heavy_hitters("numpy")
+    ranks = [(r - 1) * load._step % load.n_keys + 1 for r in range(1, 6)]
+    assert [h.key for h in hh.top(5)] == ranks
+
+
+def test_hot_threshold_flags_exactly_the_keys_above_the_share():
+    n, shards, threshold = 100_000, 4, 0.2
+    args = argparse.Namespace(n_keys=n, hot_keys=8, shards=shards, hot_threshold=threshold, hash_scheme="sha1")
+    out = sd.Emitter("json", stream=io.StringIO())
+    sd.emit_hot_keys(args, out, "numpy", [("hash", None)], sd.Workload("zipf", n, seed=7))
+    rows = [r for r in out.records if r["view"] == "hot_keys"]
+    assert len(rows) == 8
+    above = {k for k, c in Counter(sd.Workload("zipf", n, seed=7).keys()).items() if c >= threshold * n / shards}
+    assert {r["key"] for r in rows if r["candidate"] == "salt"} == above and len(above) == 2
@@ -0,0 +1,240 @@
+"""
+In-process stand-in for a cassandra-driver Session (no cluster required)
+
+Understands the small CQL subset used by the YCQL examples:
+  INSERT INTO t (a, b, ...) VALUES (?, ?, ...)
+  SELECT cols FROM t WHERE partition_col = ? [LIMIT n]
+  DELETE FROM t WHERE partition_col = ? [AND col = ? ...]
+Every call completes after a simulated latency on a background "reactor" thread, like the
+driver's event loop, so concurrency and paging behave as they would against a real cluster.
+Writes can fail with FakeWriteTimeout at a configurable rate to exercise retry paths.
+"""
+import heapq
+import random
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class TableSpec(NamedTuple):
+    partition: str  # partition key column (rows are looked up by it)
+    primary_key: Tuple[str, ...]  # full primary key: inserts with the same key overwrite
+    order_desc: Optional[str] = None  # clustering column returned in descending order
+
+
+# Mirrors schema_ycql.cql
+YCQL_TABLES: Dict[str, TableSpec] = {
+    "users": TableSpec("id", ("id",)),
+    "user_stats": TableSpec("user_id", ("user_id",)),
+    "posts": TableSpec("id", ("id",)),
+    "posts_by_author": TableSpec("author_id", ("author_id", "created_at", "post_id"), "created_at"),
+    "follows": TableSpec("follower_id", ("follower_id", "followee_id")),
+    "followers": TableSpec("followee_id", ("followee_id", "follower_id")),
+    "timeline": TableSpec("user_id", ("user_id", "created_at", "post_id"), "created_at"),
+}
+
+INSERT_RE = re.compile(r"INSERT\s+INTO\s+(\w+)\s*\(([^)]*)\)", re.I | re.S)
+SELECT_RE = re.compile(r"SELECT\s+(.+?)\s+FROM\s+(\w+)\s+WHERE\s+(\w+)\s*=\s*\?(?:\s+LIMIT\s+(\d+))?", re.I | re.S)
+DELETE_RE = re.compile(r"DELETE\s+FROM\s+(\w+)\s+WHERE\s+(.+)", re.I | re.S)
+
+
+class FakeWriteTimeout(TimeoutError):
+    """Simulated coordinator write timeout (the write was not applied)."""
+
+
+class FakePrepared:
+    def __init__(self, query: str):
+        self.query = query
+        insert, select, delete = INSERT_RE.search(query), SELECT_RE.search(query), DELETE_RE.search(query)
+        if insert:
+            self.kind, self.table = "insert", insert.group(1)
+            self.columns = [c.strip() for c in insert.group(2).split(",")]
+        elif select:
+            self.kind, self.table = "select", select.group(2)
+            cols = select.group(1).strip()
+            self.columns = None if cols == "*" else [c.strip() for c in cols.split(",")]
+            self.where = [select.group(3)]
+            self.limit = int(select.group(4)) if select.group(4) else None
+        elif delete:
+            self.kind, self.table = "delete", delete.group(1)
+            self.where = [w.split("=")[0].strip() for w in re.split(r"\s+AND\s+", delete.group(2), flags=re.I)]
+        else:
+            raise ValueError(f"unsupported statement for the fake session: {query.strip()[:60]}")
+
+    def bind(self, params: Sequence[Any]) -> "FakeBound":
+        return FakeBound(self, tuple(params))
+
+
+class FakeBound:
+    def __init__(self, prepared: FakePrepared, params: Tuple[Any, ...]):
+        self.prepared = prepared
+        self.params = params
+        self.fetch_size: Optional[int] = None
+
+
+class FakeResultSet:
+    """Iterates rows page by page; fetching each page after the first costs one simulated round trip."""
+
+    def __init__(self, session: "FakeSession", rows: List[SimpleNamespace], fetch_size: Optional[int]):
+        self.session = session
+        self.rows = rows
+        self.fetch_size = fetch_size or len(rows) or 1
+
+    def __iter__(self) -> Iterator[SimpleNamespace]:
+        for start in range(0, len(self.rows), self.fetch_size):
+            if start:
+                self.session.calls["page"] += 1
+                time.sleep(self.session.latency())
+            yield from self.rows[start:start + self.fetch_size]
+
+    def one(self) -> Optional[SimpleNamespace]:
+        return self.rows[0] if self.rows else None
+
+    def all(self) -> List[SimpleNamespace]:
+        return list(self)
+
+
+class FakeFuture:
+    """Subset of cassandra.cluster.ResponseFuture: result() and add_callbacks()."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result: Any = None
+        self._exc: Optional[BaseException] = None
+        self._callbacks: List[Tuple[Callable, Tuple, Callable, Tuple]] = []
+        self._lock = threading.Lock()
+
+    def _set(self, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._result, self._exc = result, exc
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for cb in callbacks:
+            self._fire(*cb)
+
+    def _fire(self, callback, callback_args, errback, errback_args) -> None:
+        if self._exc is None:
+            callback(self._result, *callback_args)
+        elif errback is not None:
+            errback(self._exc, *errback_args)
+
+    def add_callbacks(self, callback: Callable, errback: Optional[Callable] = None,
+                      callback_args: Tuple = (), errback_args: Tuple = ()) -> None:
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append((callback, callback_args, errback, errback_args))
+                return
+        self._fire(callback, callback_args, errback, errback_args)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        if not self._done.wait(timeout):
+            raise TimeoutError("fake request did not complete in time")
+        if self._exc is not None:
+            raise self._exc
+        return self._result
+
+
+class FakeSession:
+    """Drop-in for cassandra.cluster.Session in the fanout examples.
+
+    latency_ms: base round-trip time of every call; jitter_ms: extra uniform random delay;
+    timeout_rate: probability that a write fails with FakeWriteTimeout.
+    `calls` counts requests per statement kind (insert/select/delete/page), per table in `writes`.
+    """
+
+    def __init__(self, latency_ms: float = 1.0, jitter_ms: float = 0.0, timeout_rate: float = 0.0,
+                 seed: Optional[int] = None, tables: Dict[str, TableSpec] = YCQL_TABLES):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.timeout_rate = timeout_rate
+        self.specs = dict(tables)
+        self.data: Dict[str, Dict[Any, Dict[Tuple, Dict[str, Any]]]] = {name: {} for name in tables}
+        self.calls: Counter = Counter()
+        self.writes: Counter = Counter()  # applied writes per table
+        self.rng = random.Random(seed)
+        self._events: List[Tuple[float, int, Callable[[], None]]] = []
+        self._seq = 0
+        self._cv = threading.Condition()
+        self._closed = False
+        self._reactor = threading.Thread(target=self._loop, name="fake-ycql-reactor", daemon=True)
+        self._reactor.start()
+
+    def latency(self) -> float:
+        """One simulated round trip, in seconds."""
+        extra = self.rng.uniform(0.0, self.jitter_ms) if self.jitter_ms else 0.0
+        return (self.latency_ms + extra) / 1000.0
+
+    def prepare(self, query: str) -> FakePrepared:
+        return FakePrepared(query)
+
+    def execute(self, statement, parameters: Optional[Sequence[Any]] = None) -> Any:
+        return self.execute_async(statement, parameters).result()
+
+    def execute_async(self, statement, parameters: Optional[Sequence[Any]] = None) -> FakeFuture:
+        if isinstance(statement, str):
+            statement = FakePrepared(statement)
+        if isinstance(statement, FakePrepared):
+            statement = statement.bind(parameters or ())
+        future = FakeFuture()
+        self.calls[statement.prepared.kind] += 1
+        fail = statement.prepared.kind != "select" and self.timeout_rate and self.rng.random() < self.timeout_rate
+        with self._cv:
+            self._seq += 1
+            heapq.heappush(self._events, (time.perf_counter() + self.latency(), self._seq,
+                                          lambda: self._complete(future, statement, fail)))
+            self._cv.notify()
+        return future
+
+    def shutdown(self) -> None:
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        self._reactor.join()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cv:
+                while not self._closed and (not self._events or self._events[0][0] > time.perf_counter()):
+                    self._cv.wait(self._events[0][0] - time.perf_counter() if self._events else None)
+                if self._closed:
+                    return
+                _, _, fn = heapq.heappop(self._events)
+            fn()
+
+    def _complete(self, future: FakeFuture, bound: FakeBound, fail: bool) -> None:
+        if fail:
+            future._set(exc=FakeWriteTimeout(f"write to {bound.prepared.table} timed out"))
+            return
+        try:
+            result = self._apply(bound)
+        except Exception as exc:  # surface bad statements through the future, like the driver
+            future._set(exc=exc)
+            return
+        future._set(result)
+
+    def _apply(self, bound: FakeBound) -> Optional[FakeResultSet]:
+        stmt, spec = bound.prepared, self.specs[bound.prepared.table]
+        partitions = self.data[stmt.table]
+        if stmt.kind == "insert":
+            row = dict(zip(stmt.columns, bound.params))
+            partitions.setdefault(row[spec.partition], {})[tuple(row[c] for c in spec.primary_key)] = row
+            self.writes[stmt.table] += 1
+            return None
+        where = dict(zip(stmt.where, bound.params))
+        part = partitions.get(where[spec.partition], {})
+        if stmt.kind == "delete":
+            for pk in [pk for pk, row in part.items() if all(row[c] == v for c, v in where.items())]:
+                del part[pk]
+            self.writes[stmt.table] += 1
+            return None
+        rows = list(part.values())
+        if spec.order_desc:
+            rows.sort(key=lambda r: r[spec.order_desc], reverse=True)
+        if stmt.limit is not None:
+            rows = rows[:stmt.limit]
+        cols = stmt.columns
+        return FakeResultSet(self, [SimpleNamespace(**(row if cols is None else {c: row[c] for c in cols})) for row in rows],
+                             bound.fetch_size)
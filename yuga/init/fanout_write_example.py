@@ -1,48 +1,245 @@
-# Example Python script for fanout-on-write in YCQL (Cassandra)
-# Requires: pip install cassandra-driver
+#!/usr/bin/env python3
+"""
+Fanout-on-write for the YCQL timeline (Cassandra API)
 
-from cassandra.cluster import Cluster
-import uuid
+A post is written once to `posts`, then copied into the timeline partition of the author and of
+every follower. Instead of one synchronous round trip per follower, FanoutWriter:
+- prepares each statement once per session,
+- reads followers in pages (fetch_size) and streams them straight into the write pipeline,
+- keeps at most `max_in_flight` timeline inserts outstanding (execute_async + callbacks),
+- retries timed-out writes with exponential backoff and full jitter (inserts are idempotent upserts),
+- reports fanout throughput (timeline writes/s).
+
+Requires: pip install cassandra-driver (not needed with --fake, which uses the in-process
+session from fake_ycql.py with a simulated per-call latency).
+
+Usage examples:
+  python3 fanout_write_example.py --fake --followers 100000 --latency-ms 2 --in-flight 256
+  python3 fanout_write_example.py --fake --followers 20000 --timeout-rate 0.01 --max-retries 5
+  python3 fanout_write_example.py --hosts localhost --author <UUID> --image /img/1.jpg --description "Hello world!"
+
+"""
+import argparse
 import datetime
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from cassandra import OperationTimedOut, WriteTimeout
+    from cassandra.cluster import Cluster
+    RETRYABLE_ERRORS: Tuple[type, ...] = (WriteTimeout, OperationTimedOut, TimeoutError)
+except ImportError:  # cassandra-driver is optional: --fake runs without it
+    Cluster = None
+    RETRYABLE_ERRORS = (TimeoutError,)
 
 KEYSPACE = "tinyinsta_ycql"
 
-cluster = Cluster(["localhost"], port=9042)
-session = cluster.connect(KEYSPACE)
-
-def create_post(author_id, image_path, description):
-    post_id = uuid.uuid4()
-    created_at = datetime.datetime.utcnow()
-    # Insert into posts
-    session.execute(
-        """
-        INSERT INTO posts (id, user_id, image_path, description, created_at)
-        VALUES (%s, %s, %s, %s, %s)
-        """,
-        (post_id, author_id, image_path, description, created_at)
-    )
-    # Get followers
-    followers = session.execute(
-        "SELECT follower_id FROM follows WHERE followee_id = %s", (author_id,)
-    )
-    # Fanout: insert into each follower's timeline
-    for row in followers:
-        session.execute(
-            """
-            INSERT INTO timeline (user_id, post_id, author_id, image_path, description, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """,
-            (row.follower_id, post_id, author_id, image_path, description, created_at)
-        )
-    # Author's own timeline
-    session.execute(
-        """
-        INSERT INTO timeline (user_id, post_id, author_id, image_path, description, created_at)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """,
-        (author_id, post_id, author_id, image_path, description, created_at)
-    )
-    print(f"Post {post_id} created and fanned out to timelines.")
-
-# Example usage:
-# create_post(uuid.UUID('...'), '/img/1.jpg', 'Hello world!')
+INSERT_POST = """
+    INSERT INTO posts (id, user_id, image_path, description, created_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+# `followers` is the reverse of `follows`, partitioned by followee so the read is a single-partition scan
+SELECT_FOLLOWERS = "SELECT follower_id FROM followers WHERE followee_id = ?"
+INSERT_TIMELINE = """
+    INSERT INTO timeline (user_id, post_id, author_id, image_path, description, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+class FanoutResult(NamedTuple):
+    post_id: uuid.UUID
+    followers: int
+    writes: int  # statements completed: the post, the author's timeline and one per follower
+    retries: int
+    failed: int  # writes given up after max_retries (or with a non-retryable error)
+    seconds: float
+
+    @property
+    def writes_per_s(self) -> float:
+        return self.writes / self.seconds if self.seconds > 0 else float("inf")
+
+
+class WritePipeline:
+    """Bounded-concurrency async writes with retry/backoff.
+
+    submit() blocks while max_in_flight requests are outstanding, so a producer (the follower
+    pager) never runs ahead of the cluster; wait() returns once every submitted write is settled.
+    """
+
+    def __init__(self, session, max_in_flight: int = 128, max_retries: int = 5, backoff_base: float = 0.01,
+                 backoff_max: float = 1.0, retryable: Tuple[type, ...] = RETRYABLE_ERRORS, rng: Optional[random.Random] = None):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+        self.session = session
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retryable = retryable
+        self.rng = rng or random.Random()
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.cv = threading.Condition()
+        self.pending = 0
+        self.completed = 0
+        self.retries = 0
+        self.errors: List[BaseException] = []
+
+    def submit(self, statement, params: Sequence[Any], on_done: Optional[Callable[[], None]] = None) -> None:
+        """Queue one write; on_done runs (on the driver thread) once it is acknowledged."""
+        self.slots.acquire()
+        with self.cv:
+            self.pending += 1
+        self._send(statement, params, 0, on_done)
+
+    def wait(self) -> None:
+        with self.cv:
+            self.cv.wait_for(lambda: self.pending == 0)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff: uniform in [0, min(max, base * 2^attempt)]."""
+        return self.rng.uniform(0.0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send(self, statement, params: Sequence[Any], attempt: int, on_done: Optional[Callable[[], None]]) -> None:
+        try:
+            future = self.session.execute_async(statement, params)
+        except Exception as exc:  # e.g. NoHostAvailable raised before the request is queued
+            self._failed(exc, statement, params, attempt, on_done)
+            return
+        future.add_callbacks(self._ok, self._failed, callback_args=(on_done,), errback_args=(statement, params, attempt, on_done))
+
+    def _ok(self, _result, on_done: Optional[Callable[[], None]]) -> None:
+        if on_done is not None:
+            on_done()
+        with self.cv:
+            self.completed += 1
+        self._settle()
+
+    def _failed(self, exc: BaseException, statement, params: Sequence[Any], attempt: int,
+                on_done: Optional[Callable[[], None]]) -> None:
+        if isinstance(exc, self.retryable) and attempt < self.max_retries:
+            with self.cv:
+                self.retries += 1
+            # keep the slot while backing off: retries count against the in-flight limit
+            timer = threading.Timer(self.backoff(attempt), self._send, (statement, params, attempt + 1, on_done))
+            timer.daemon = True
+            timer.start()
+            return
+        with self.cv:
+            self.errors.append(exc)
+        self._settle()
+
+    def _settle(self) -> None:
+        self.slots.release()
+        with self.cv:
+            self.pending -= 1
+            if self.pending == 0:
+                self.cv.notify_all()
+
+
+class FanoutWriter:
+    """Fanout-on-write of posts into follower timelines over one (real or fake) session."""
+
+    def __init__(self, session, max_in_flight: int = 128, page_size: int = 1000, max_retries: int = 5,
+                 backoff_base: float = 0.01, backoff_max: float = 1.0, seed: Optional[int] = None):
+        self.session = session
+        self.max_in_flight = max_in_flight
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rng = random.Random(seed)
+        self.insert_post = session.prepare(INSERT_POST)
+        self.select_followers = session.prepare(SELECT_FOLLOWERS)
+        self.insert_timeline = session.prepare(INSERT_TIMELINE)
+
+    def pipeline(self) -> WritePipeline:
+        return WritePipeline(self.session, self.max_in_flight, self.max_retries, self.backoff_base,
+                             self.backoff_max, rng=self.rng)
+
+    def followers(self, author_id: uuid.UUID):
+        """Follower rows of author_id, fetched page_size rows per round trip as they are iterated."""
+        bound = self.select_followers.bind((author_id,))
+        bound.fetch_size = self.page_size
+        return self.session.execute(bound)
+
+    def create_post(self, author_id: uuid.UUID, image_path: str, description: str,
+                    post_id: Optional[uuid.UUID] = None, created_at: Optional[datetime.datetime] = None) -> FanoutResult:
+        post_id = post_id or uuid.uuid4()
+        created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
+        t0 = time.perf_counter()
+        pipe = self.pipeline()
+        pipe.submit(self.insert_post, (post_id, author_id, image_path, description, created_at))
+        pipe.submit(self.insert_timeline, (author_id, post_id, author_id, image_path, description, created_at))
+        n_followers = 0
+        for row in self.followers(author_id):
+            pipe.submit(self.insert_timeline, (row.follower_id, post_id, author_id, image_path, description, created_at))
+            n_followers += 1
+        pipe.wait()
+        return FanoutResult(post_id, n_followers, pipe.completed, pipe.retries, len(pipe.errors), time.perf_counter() - t0)
+
+
+def connect(hosts: Sequence[str] = ("localhost",), port: int = 9042, keyspace: str = KEYSPACE):
+    if Cluster is None:
+        raise SystemExit("cassandra-driver is not installed (pip install cassandra-driver), or use --fake")
+    return Cluster(list(hosts), port=port).connect(keyspace)
+
+
+def seed_followers(session, author_id: uuid.UUID, n: int) -> None:
+    """Insert n random followers of author_id into `follows` and `followers` (setup for --fake runs)."""
+    pipe = WritePipeline(session, max_in_flight=512)
+    follows = session.prepare("INSERT INTO follows (follower_id, followee_id) VALUES (?, ?)")
+    followers = session.prepare("INSERT INTO followers (followee_id, follower_id) VALUES (?, ?)")
+    for _ in range(n):
+        follower = uuid.uuid4()
+        pipe.submit(follows, (follower, author_id))
+        pipe.submit(followers, (author_id, follower))
+    pipe.wait()
+
+
+def print_result(res: FanoutResult) -> None:
+    print(f"Post {res.post_id} fanned out to {res.followers} followers: {res.writes} writes in {res.seconds:.3f}s "
+          f"({res.writes_per_s:,.0f} writes/s), {res.retries} retries, {res.failed} failed")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fanout-on-write to YCQL timelines (prepared, paged, concurrent)")
+    ap.add_argument("--fake", action="store_true", help="Use the in-process fake session instead of a cluster")
+    ap.add_argument("--hosts", type=str, default="localhost", help="Comma-separated contact points")
+    ap.add_argument("--port", type=int, default=9042)
+    ap.add_argument("--keyspace", type=str, default=KEYSPACE)
+    ap.add_argument("--author", type=str, default="", help="Author UUID (default: a new author with --followers fake followers)")
+    ap.add_argument("--image", type=str, default="/img/1.jpg")
+    ap.add_argument("--description", type=str, default="Hello world!")
+    ap.add_argument("--in-flight", type=int, default=128, help="Max concurrent timeline writes")
+    ap.add_argument("--page-size", type=int, default=1000, help="Follower rows fetched per page")
+    ap.add_argument("--max-retries", type=int, default=5, help="Retries per write on timeout")
+    ap.add_argument("--backoff-ms", type=float, default=10.0, help="Base of the exponential retry backoff")
+    ap.add_argument("--followers", type=int, default=10000, help="Followers to create for the fake author")
+    ap.add_argument("--latency-ms", type=float, default=1.0, help="Fake session: base latency per call")
+    ap.add_argument("--jitter-ms", type=float, default=0.5, help="Fake session: extra random latency per call")
+    ap.add_argument("--timeout-rate", type=float, default=0.0, help="Fake session: probability a write times out")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.fake:
+        from fake_ycql import FakeSession
+        session = FakeSession(args.latency_ms, args.jitter_ms, args.timeout_rate, seed=args.seed)
+    else:
+        session = connect(args.hosts.split(","), args.port, args.keyspace)
+    author = uuid.UUID(args.author) if args.author else uuid.uuid4()
+    if args.fake and not args.author:
+        timeout_rate, session.timeout_rate = session.timeout_rate, 0.0
+        seed_followers(session, author, args.followers)
+        session.timeout_rate = timeout_rate
+    writer = FanoutWriter(session, args.in_flight, args.page_size, args.max_retries, args.backoff_ms / 1000.0, seed=args.seed)
+    print_result(writer.create_post(author, args.image, args.description))
+    if args.fake:
+        sequential = (args.followers + 2) * (args.latency_ms + args.jitter_ms / 2)
+        print(f"Sequential execute() estimate at the same latency: {sequential / 1000.0:.1f}s")
+        session.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Hybrid fanout-on-write / fanout-on-read timelines for YCQL, with a hot-timeline cache
+
+Pure fanout-on-write (fanout_write_example.py) costs one timeline write per follower, so a post
+by an author with millions of followers stalls the writer and floods the tablets owning those
+timeline partitions. HybridTimeline:
+- fans out on write only for authors below `threshold` followers (user_stats.followers),
+- always writes the post to the per-author index `posts_by_author`,
+- at read time merges the precomputed timeline with the latest posts of the celebrity
+  authors the reader follows (one single-partition query each, issued concurrently),
+- serves recently read timelines from a bounded LRU cache with a TTL; fanout writes
+  invalidate the followers' entries once acknowledged, and a celebrity post invalidates
+  the cached timelines that merged that author.
+
+The simulation harness (main) replays the same Zipf-like follow graph and post/read workload
+against the in-process fake session for each threshold and reports write amplification and
+read latency.
+
+Usage examples:
+  python3 hybrid_timeline.py
+  python3 hybrid_timeline.py --users 5000 --thresholds inf,1000,100,0 --latency-ms 1
+  python3 hybrid_timeline.py --cache-size 0    (no cache: every read hits the cluster)
+
+"""
+import argparse
+import datetime
+import heapq
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence
+
+from fanout_write_example import FanoutResult, FanoutWriter, WritePipeline
+
+INSERT_POST_BY_AUTHOR = """
+    INSERT INTO posts_by_author (author_id, created_at, post_id, image_path, description)
+    VALUES (?, ?, ?, ?, ?)
+"""
+SELECT_FOLLOWER_COUNT = "SELECT followers FROM user_stats WHERE user_id = ?"
+SELECT_FOLLOWEES = "SELECT followee_id FROM follows WHERE follower_id = ?"
+SELECT_TIMELINE = "SELECT post_id, author_id, image_path, description, created_at FROM timeline WHERE user_id = ? LIMIT {limit}"
+SELECT_AUTHOR_POSTS = "SELECT post_id, author_id, image_path, description, created_at FROM posts_by_author WHERE author_id = ? LIMIT {limit}"
+
+
+class TimelineEntry(NamedTuple):
+    created_at: datetime.datetime
+    post_id: uuid.UUID
+    author_id: uuid.UUID
+    image_path: str
+    description: str
+
+
+class CachedTimeline(NamedTuple):
+    entries: List[TimelineEntry]
+    celebrities: frozenset  # authors merged at read time (their new posts invalidate this entry)
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire `ttl_s` seconds after being stored.
+
+    A read that fills the cache takes a token() before querying and passes it to put(). Every
+    invalidation bumps the key's generation counter (invalidate_where bumps a global epoch), so a
+    fill whose data may predate an invalidation is dropped instead of being cached until the TTL.
+    Generations live in a fixed table indexed by hash(key): memory stays bounded, and a collision
+    only skips one fill.
+    """
+
+    GENERATION_SLOTS = 1 << 16
+
+    def __init__(self, maxsize: int = 10_000, ttl_s: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self.data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.generations = [0] * self.GENERATION_SLOTS
+        self.epoch = 0
+        self.hits = self.misses = self.evictions = self.invalidations = self.stale_fills = 0
+
+    def _slot(self, key: Hashable) -> int:
+        return hash(key) % self.GENERATION_SLOTS
+
+    def token(self, key: Hashable) -> tuple:
+        """Take before reading the data to cache under key; put() skips it if key was invalidated since."""
+        with self.lock:
+            return self.epoch, self.generations[self._slot(key)]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.lock:
+            item = self.data.get(key)
+            if item is None or item[0] <= self.clock():
+                if item is not None:
+                    del self.data[key]
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any, token: Optional[tuple] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            if token is not None and token != (self.epoch, self.generations[self._slot(key)]):
+                self.stale_fills += 1
+                return
+            self.data[key] = (self.clock() + self.ttl_s, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self.lock:
+            self.generations[self._slot(key)] += 1
+            if self.data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_where(self, pred: Callable[[Any], bool]) -> None:
+        """Drop every entry whose value matches pred (O(cache size))."""
+        with self.lock:
+            self.epoch += 1  # reads in flight cannot be matched against pred: none of them is cached
+            stale = [key for key, (_, value) in self.data.items() if pred(value)]
+            for key in stale:
+                del self.data[key]
+            self.invalidations += len(stale)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class HybridTimeline(FanoutWriter):
+    """Fanout-on-write below `threshold` followers, fanout-on-read (merged from posts_by_author) above it."""
+
+    def __init__(self, session, threshold: float = 10_000, limit: int = 50, cache_size: int = 10_000,
+                 cache_ttl_s: float = 30.0, stats_ttl_s: float = 300.0, **writer_kw):
+        super().__init__(session, **writer_kw)
+        self.threshold = threshold
+        self.limit = limit
+        self.cache = TTLCache(cache_size, cache_ttl_s)
+        self.follower_counts = TTLCache(max(cache_size, 1), stats_ttl_s)  # slow-changing, cached longer
+        self.insert_post_by_author = session.prepare(INSERT_POST_BY_AUTHOR)
+        self.select_follower_count = session.prepare(SELECT_FOLLOWER_COUNT)
+        self.select_followees = session.prepare(SELECT_FOLLOWEES)
+        self.select_timeline = session.prepare(SELECT_TIMELINE.format(limit=limit))
+        self.select_author_posts = session.prepare(SELECT_AUTHOR_POSTS.format(limit=limit))
+
+    def counts(self, user_ids: Sequence[uuid.UUID]) -> Dict[uuid.UUID, int]:
+        """Follower count of each user, from the cache or one concurrent user_stats read per miss."""
+        out, futures = {}, {}
+        for uid in user_ids:
+            cached = self.follower_counts.get(uid)
+            if cached is None:
+                futures[uid] = self.session.execute_async(self.select_follower_count, (uid,))
+            else:
+                out[uid] = cached
+        for uid, future in futures.items():
+            row = future.result().one()
+            out[uid] = row.followers if row is not None else 0
+            self.follower_counts.put(uid, out[uid])
+        return out
+
+    def is_celebrity(self, followers: int) -> bool:
+        return followers >= self.threshold
+
+    def create_post(self, author_id: uuid.UUID, image_path: str, description: str,
+                    post_id: Optional[uuid.UUID] = None, created_at: Optional[datetime.datetime] = None) -> FanoutResult:
+        post_id = post_id or uuid.uuid4()
+        created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
+        t0 = time.perf_counter()
+        celebrity = math.isfinite(self.threshold) and self.is_celebrity(self.counts([author_id])[author_id])
+        pipe = self.pipeline()
+        pipe.submit(self.insert_post, (post_id, author_id, image_path, description, created_at))
+        pipe.submit(self.insert_post_by_author, (author_id, created_at, post_id, image_path, description))
+        row = (post_id, author_id, image_path, description, created_at)
+        pipe.submit(self.insert_timeline, (author_id,) + row, lambda: self.cache.invalidate(author_id))
+        n_followers = 0
+        if celebrity:
+            # followers pick the post up at read time; only drop timelines that already merged this author
+            pipe.wait()
+            self.cache.invalidate_where(lambda entry: author_id in entry.celebrities)
+        else:
+            for follower in self.followers(author_id):
+                uid = follower.follower_id
+                pipe.submit(self.insert_timeline, (uid,) + row, lambda uid=uid: self.cache.invalidate(uid))
+                n_followers += 1
+            pipe.wait()
+        return FanoutResult(post_id, n_followers, pipe.completed, pipe.retries, len(pipe.errors), time.perf_counter() - t0)
+
+    def read_timeline(self, user_id: uuid.UUID) -> List[TimelineEntry]:
+        """Newest `limit` entries: precomputed timeline merged with followed celebrities' posts."""
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            return cached.entries
+        token = self.cache.token(user_id)  # a fanout write acknowledged from now on voids this fill
+        timeline = self.session.execute_async(self.select_timeline, (user_id,))
+        celebrities: List[uuid.UUID] = []
+        if math.isfinite(self.threshold):
+            followees = [row.followee_id for row in self.session.execute(self.select_followees, (user_id,))]
+            celebrities = [uid for uid, n in self.counts(followees).items() if self.is_celebrity(n)]
+        posts = [self.session.execute_async(self.select_author_posts, (uid,)) for uid in celebrities]
+        streams = [_entries(f.result()) for f in [timeline] + posts]
+        merged, seen = [], set()
+        for entry in heapq.merge(*streams, reverse=True):
+            if entry.post_id not in seen:  # a post can be in both if its author crossed the threshold
+                seen.add(entry.post_id)
+                merged.append(entry)
+                if len(merged) == self.limit:
+                    break
+        self.cache.put(user_id, CachedTimeline(merged, frozenset(celebrities)), token)
+        return merged
+
+
+def _entries(rows: Iterable[Any]) -> Iterable[TimelineEntry]:
+    return (TimelineEntry(r.created_at, r.post_id, r.author_id, r.image_path, r.description) for r in rows)
+
+
+# ---------------------------------------------------------------------------
+# Simulation harness (fake session)
+# ---------------------------------------------------------------------------
+
+def zipf_weights(n: int, s: float) -> List[float]:
+    return [1.0 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def follow_graph(users: int, follows_per_user: int, s: float, rng: random.Random) -> List[List[int]]:
+    """followees[u] for each user: follows_per_user distinct targets drawn with Zipf(s) popularity."""
+    weights = zipf_weights(users, s)
+    cum = list(_accumulate(weights))
+    followees = []
+    for u in range(users):
+        chosen = set()
+        while len(chosen) < min(follows_per_user, users - 1):
+            v = rng.choices(range(users), cum_weights=cum, k=1)[0]
+            if v != u:
+                chosen.add(v)
+        followees.append(sorted(chosen))
+    return followees
+
+
+def _accumulate(values: Iterable[float]) -> Iterable[float]:
+    total = 0.0
+    for v in values:
+        total += v
+        yield total
+
+
+def seed_graph(session, ids: List[uuid.UUID], followees: List[List[int]]) -> None:
+    """Write follows, followers and user_stats for the generated graph (at zero simulated latency)."""
+    latency, session.latency_ms, session.jitter_ms = (session.latency_ms, session.jitter_ms), 0.0, 0.0
+    pipe = WritePipeline(session, max_in_flight=1024)
+    follows = session.prepare("INSERT INTO follows (follower_id, followee_id) VALUES (?, ?)")
+    followers = session.prepare("INSERT INTO followers (followee_id, follower_id) VALUES (?, ?)")
+    stats = session.prepare("INSERT INTO user_stats (user_id, followers) VALUES (?, ?)")
+    counts = [0] * len(ids)
+    for u, targets in enumerate(followees):
+        for v in targets:
+            pipe.submit(follows, (ids[u], ids[v]))
+            pipe.submit(followers, (ids[v], ids[u]))
+            counts[v] += 1
+    for v, n in enumerate(counts):
+        pipe.submit(stats, (ids[v], n))
+    pipe.wait()
+    session.latency_ms, session.jitter_ms = latency
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+class SimReport(NamedTuple):
+    threshold: float
+    posts: int
+    celebrity_posts: int
+    writes_per_post: float  # write amplification: rows written per post
+    post_ms_mean: float
+    post_ms_p99: float
+    reads: int
+    read_ms_p50: float
+    read_ms_p99: float
+    read_calls: float  # requests sent to the cluster per timeline read
+    cache_hit_rate: float
+
+
+def simulate(threshold: float, args) -> SimReport:
+    """Replay the seeded graph and workload against a fresh fake session with this threshold."""
+    from fake_ycql import FakeSession
+
+    rng = random.Random(args.seed)
+    session = FakeSession(args.latency_ms, args.jitter_ms, seed=args.seed)
+    ids = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(args.users)]
+    seed_graph(session, ids, follow_graph(args.users, args.follows_per_user, args.zipf, rng))
+    seeded = sum(session.writes.values())
+    hybrid = HybridTimeline(session, threshold, limit=args.limit, cache_size=args.cache_size,
+                            cache_ttl_s=args.cache_ttl, max_in_flight=args.in_flight, seed=args.seed)
+
+    authors = list(_accumulate(zipf_weights(args.users, args.zipf)))  # popular accounts post more
+    readers = list(range(args.users))
+    rng.shuffle(readers)  # active readers are not the celebrities
+    reader_cum = list(_accumulate(zipf_weights(args.users, 0.8)))
+    clock = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    post_ms: List[float] = []
+    read_ms: List[float] = []
+    celebrity_posts = 0
+    read_calls = 0
+    n_ops = args.posts + args.reads
+    for i in range(n_ops):
+        if rng.random() < args.posts / n_ops:
+            author = ids[rng.choices(range(args.users), cum_weights=authors, k=1)[0]]
+            celebrity_posts += hybrid.is_celebrity(hybrid.counts([author])[author])
+            res = hybrid.create_post(author, f"/img/{i}.jpg", f"post {i}", created_at=clock + datetime.timedelta(seconds=i))
+            post_ms.append(1000.0 * res.seconds)
+        else:
+            user = ids[readers[rng.choices(range(args.users), cum_weights=reader_cum, k=1)[0]]]
+            before = session.calls["select"] + session.calls["page"]
+            t0 = time.perf_counter()
+            hybrid.read_timeline(user)
+            read_ms.append(1000.0 * (time.perf_counter() - t0))
+            read_calls += session.calls["select"] + session.calls["page"] - before
+    session.shutdown()
+    writes = sum(session.writes.values()) - seeded
+    return SimReport(threshold, len(post_ms), celebrity_posts, writes / max(1, len(post_ms)),
+                     sum(post_ms) / max(1, len(post_ms)), percentile(post_ms, 99),
+                     len(read_ms), percentile(read_ms, 50), percentile(read_ms, 99),
+                     read_calls / max(1, len(read_ms)), hybrid.cache.hit_rate)
+
+
+def print_reports(reports: List[SimReport]) -> None:
+    print(f"{'threshold':>10} {'posts':>6} {'celeb':>6} {'writes/post':>12} {'post ms':>8} {'post p99':>9} "
+          f"{'reads':>6} {'read p50':>9} {'read p99':>9} {'calls/read':>11} {'cache hit':>10}")
+    for r in reports:
+        print(f"{r.threshold:>10g} {r.posts:>6} {r.celebrity_posts:>6} {r.writes_per_post:>12.1f} {r.post_ms_mean:>8.2f} "
+              f"{r.post_ms_p99:>9.2f} {r.reads:>6} {r.read_ms_p50:>9.2f} {r.read_ms_p99:>9.2f} {r.read_calls:>11.2f} "
+              f"{100.0 * r.cache_hit_rate:>9.1f}%")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Hybrid fanout timeline: write amplification and read latency per celebrity threshold")
+    ap.add_argument("--thresholds", type=str, default="inf,200,50,10,0",
+                    help="Comma-separated follower thresholds (inf = pure fanout-on-write, 0 = pure fanout-on-read)")
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--follows-per-user", type=int, default=20)
+    ap.add_argument("--zipf", type=float, default=1.1, help="Skew of account popularity (followers and posting rate)")
+    ap.add_argument("--posts", type=int, default=50)
+    ap.add_argument("--reads", type=int, default=2000)
+    ap.add_argument("--limit", type=int, default=50, help="Timeline page size")
+    ap.add_argument("--cache-size", type=int, default=500, help="Cached timelines (0 disables the cache)")
+    ap.add_argument("--cache-ttl", type=float, default=30.0, help="Cache TTL in seconds")
+    ap.add_argument("--in-flight", type=int, default=128, help="Max concurrent fanout writes")
+    ap.add_argument("--latency-ms", type=float, default=0.5, help="Fake session: base latency per call")
+    ap.add_argument("--jitter-ms", type=float, default=0.2, help="Fake session: extra random latency per call")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    thresholds = [float(t) for t in args.thresholds.split(",") if t.strip()]
+    print_reports([simulate(t, args) for t in thresholds])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+FanoutWriter against the in-process fake session (no cluster, no cassandra-driver).
+
+  python -m pytest -q yuga/init
+"""
+import threading
+import uuid
+
+import pytest
+
+from fake_ycql import FakeSession
+from fanout_write_example import FanoutWriter, WritePipeline, seed_followers
+
+
+@pytest.fixture
+def session():
+    s = FakeSession(latency_ms=0.2, jitter_ms=0.2, seed=1)
+    yield s
+    s.shutdown()
+
+
+def timeline_posts(session, user_id):
+    return [row["post_id"] for row in session.data["timeline"].get(user_id, {}).values()]
+
+
+def test_post_reaches_every_follower_in_pages(session):
+    author = uuid.uuid4()
+    seed_followers(session, author, 250)
+    writer = FanoutWriter(session, max_in_flight=16, page_size=100, seed=1)
+    res = writer.create_post(author, "/img/1.jpg", "hi")
+    assert (res.followers, res.writes, res.retries, res.failed) == (250, 252, 0, 0)
+    assert session.calls["page"] == 2  # 3 pages of followers, the first comes with the query
+    followers = list(session.data["followers"][author].values())
+    assert all(timeline_posts(session, f["follower_id"]) == [res.post_id] for f in followers)
+    assert timeline_posts(session, author) == [res.post_id]
+
+
+def test_pipeline_bounds_requests_in_flight(session):
+    in_flight, peak, lock = [0], [0], threading.Lock()
+    execute_async = session.execute_async
+
+    def tracked(statement, params=None):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        future = execute_async(statement, params)
+        future.add_callbacks(lambda _: done(), lambda _: done())
+        return future
+
+    def done():
+        with lock:
+            in_flight[0] -= 1
+
+    session.execute_async = tracked
+    pipe = WritePipeline(session, max_in_flight=8)
+    insert = session.prepare("INSERT INTO users (id) VALUES (?)")
+    for i in range(200):
+        pipe.submit(insert, (i,))
+    pipe.wait()
+    assert pipe.completed == 200 and len(session.data["users"]) == 200
+    assert 1 < peak[0] <= 8
+
+
+def test_timeouts_are_retried_until_written(session):
+    author = uuid.uuid4()
+    seed_followers(session, author, 100)
+    session.timeout_rate = 0.3
+    writer = FanoutWriter(session, max_in_flight=32, max_retries=50, backoff_base=0.0005, backoff_max=0.002, seed=2)
+    res = writer.create_post(author, "/img/2.jpg", "retry")
+    assert res.retries > 0 and res.failed == 0 and res.writes == 102
+    assert all(timeline_posts(session, f["follower_id"]) == [res.post_id] for f in session.data["followers"][author].values())
+
+
+def test_writes_fail_once_retries_run_out(session):
+    session.timeout_rate = 1.0
+    pipe = WritePipeline(session, max_in_flight=4, max_retries=2, backoff_base=0.0005)
+    insert = session.prepare("INSERT INTO users (id) VALUES (?)")
+    for i in range(5):
+        pipe.submit(insert, (i,))
+    pipe.wait()
+    assert (pipe.completed, pipe.retries, len(pipe.errors)) == (0, 10, 5)
@@ -0,0 +1,83 @@
+"""
+HybridTimeline against the in-process fake session (no cluster, no cassandra-driver).
+
+  python -m pytest -q yuga/init
+"""
+import datetime
+import threading
+import uuid
+
+import pytest
+
+from fake_ycql import FakeSession
+from hybrid_timeline import HybridTimeline, TTLCache, seed_graph
+
+T0 = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def session():
+    s = FakeSession(latency_ms=0.2, jitter_ms=0.1, seed=1)
+    yield s
+    s.shutdown()
+
+
+def graph(session, followees):
+    ids = [uuid.UUID(int=i + 1) for i in range(len(followees))]
+    seed_graph(session, ids, followees)
+    return ids
+
+
+def test_celebrity_posts_are_merged_at_read_time(session):
+    # users 1 and 2 follow 0; 0 is a celebrity at threshold 2, 1 is not
+    star, fan, other = graph(session, [[], [0], [0, 1]])
+    hybrid = HybridTimeline(session, threshold=2, cache_size=0, seed=1)
+    a = hybrid.create_post(star, "/a.jpg", "star", created_at=T0)
+    b = hybrid.create_post(fan, "/b.jpg", "fan", created_at=T0 + datetime.timedelta(seconds=1))
+    assert a.followers == 0 and b.followers == 1  # only the non-celebrity fans out
+    assert [e.post_id for e in hybrid.read_timeline(other)] == [b.post_id, a.post_id]
+    assert [e.post_id for e in hybrid.read_timeline(fan)] == [b.post_id, a.post_id]
+
+
+def test_fill_racing_an_invalidation_is_not_cached(session):
+    author, reader = graph(session, [[], [0]])
+    hybrid = HybridTimeline(session, threshold=float("inf"), seed=1)
+    at_put, resume = threading.Event(), threading.Event()
+    put = hybrid.cache.put
+
+    def slow_put(key, value, token=None):
+        at_put.set()  # the reader has merged its (empty) timeline
+        resume.wait(5)
+        put(key, value, token)
+
+    hybrid.cache.put = slow_put
+    stale = []
+    reader_thread = threading.Thread(target=lambda: stale.extend(hybrid.read_timeline(reader)))
+    reader_thread.start()
+    assert at_put.wait(5)
+    # the fanout write is acknowledged (and invalidates) on the fake reactor while the read is in flight
+    post = hybrid.create_post(author, "/c.jpg", "new", created_at=T0)
+    resume.set()
+    reader_thread.join(5)
+    hybrid.cache.put = put
+    assert stale == [] and hybrid.cache.stale_fills == 1
+    assert [e.post_id for e in hybrid.read_timeline(reader)] == [post.post_id]
+
+
+def test_cache_lru_ttl_and_tokens():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl_s=10.0, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("c", 3)
+    assert cache.get("a") is None and cache.get("b") == 2 and cache.evictions == 1
+    token = cache.token("b")
+    cache.invalidate("b")
+    cache.put("b", 20, token)
+    assert cache.get("b") is None
+    token = cache.token("c")
+    cache.invalidate_where(lambda value: False)
+    cache.put("c", 30, token)
+    assert cache.get("c") == 3 and cache.stale_fills == 2
+    now[0] = 11.0
+    assert cache.get("c") is None